@@ -0,0 +1,269 @@
+import base64
+import hashlib
+import json
+from collections import namedtuple
+from datetime import datetime
+from types import FunctionType
+from flask import Blueprint, request, current_app
+from flask_login import current_user
+from sqlalchemy import select, func, case, tuple_
+from extension import db
+from models import User, Course, Class, Enrollment, Assignment, Submission, Notification
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder gives the same output, slower
+    orjson = None
+
+api_bp = Blueprint('api', __name__)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# `default=False` fields are only sent when asked for with ?fields=; a function
+# expr is called per request (for expressions that embed the current time)
+Field = namedtuple('Field', 'name expr default', defaults=(True,))
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.replace(microsecond=0).isoformat() + 'Z'
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    """Compact JSON bytes; naive datetimes are UTC and rendered as 2024-01-31T09:00:00Z."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_OMIT_MICROSECONDS)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+
+class Resource:
+    """Columns, joins and keyset order of one list endpoint, built once at import.
+
+    Only the requested fields are selected, so a sparse `fields=` also
+    shrinks the query. Rows are serialised straight from result tuples.
+    """
+
+    def __init__(self, model, fields, sort, descending=False, joins=()):
+        self.model = model
+        self.fields = {field.name: field.expr for field in fields}
+        self.default_fields = tuple(field.name for field in fields if field.default)
+        self.sort = sort
+        self.descending = descending
+        self.joins = joins
+
+    def select(self, names):
+        # The sort key and id ride along after the requested fields for the next cursor
+        exprs = (self.fields[name]() if isinstance(self.fields[name], FunctionType) else self.fields[name] for name in names)
+        stmt = select(*(expr.label(name) for expr, name in zip(exprs, names)), self.sort, self.model.id).select_from(self.model)
+        for target, onclause in self.joins:
+            stmt = stmt.join(target, onclause)
+        order = self.sort.desc() if self.descending else self.sort.asc()
+        if self.sort.nullable:
+            # NULL ranks above every value, as in a Postgres index, so the index still serves the order
+            order = order.nulls_first() if self.descending else order.nulls_last()
+        return stmt.order_by(order, self.model.id.desc() if self.descending else self.model.id)
+
+    def after(self, value, last_id):
+        beyond_id = self.model.id < last_id if self.descending else self.model.id > last_id
+        if value is None:
+            # The cursor is inside the NULL run: ascending, only NULLs remain; descending, every value does
+            same_run = self.sort.is_(None) & beyond_id
+            return (same_run | self.sort.isnot(None)) if self.descending else same_run
+        key, bound = tuple_(self.sort, self.model.id), tuple_(value, last_id)
+        if self.descending:
+            return key < bound
+        return ((key > bound) | self.sort.is_(None)) if self.sort.nullable else key > bound
+
+
+CLASSES = Resource(Class, [
+    Field('id', Class.id),
+    Field('name', Class.name),
+    Field('description', Class.description, False),
+    Field('course_id', Class.course_id),
+    Field('course_name', Course.name),
+    Field('teacher_id', Class.teacher_id),
+    Field('teacher_name', User.name),
+    Field('student_count', select(func.count()).where(Enrollment.class_id == Class.id).correlate(Class).scalar_subquery(), False),
+    Field('created_at', Class.created_at),
+], sort=Class.created_at, joins=[(Course, Course.id == Class.course_id), (User, User.id == Class.teacher_id)])
+
+ASSIGNMENTS = Resource(Assignment, [
+    Field('id', Assignment.id),
+    Field('title', Assignment.title),
+    Field('description', Assignment.description, False),
+    Field('due_date', Assignment.due_date),
+    Field('max_score', Assignment.max_score),
+    Field('class_id', Assignment.class_id),
+    Field('class_name', Class.name),
+    Field('teacher_id', Assignment.teacher_id),
+    Field('has_attachment', Assignment.attachment_path.isnot(None)),
+    Field('is_overdue', lambda: Assignment.is_overdue),
+    Field('updated_at', Assignment.updated_at),
+], sort=Assignment.due_date, joins=[(Class, Class.id == Assignment.class_id)])
+
+_submission_joins = [(Assignment, Assignment.id == Submission.assignment_id), (User, User.id == Submission.student_id)]
+
+SUBMISSIONS = Resource(Submission, [
+    Field('id', Submission.id),
+    Field('assignment_id', Submission.assignment_id),
+    Field('assignment_title', Assignment.title),
+    Field('student_id', Submission.student_id),
+    Field('student_name', User.name),
+    Field('submitted_at', Submission.submitted_at),
+    Field('is_late', Submission.is_late),
+    Field('has_file', Submission.file_path.isnot(None)),
+    Field('submission_text', Submission.submission_text, False),
+    Field('score', Submission.score),
+    Field('feedback', Submission.feedback),
+    Field('graded_at', Submission.graded_at),
+], sort=Submission.submitted_at, descending=True, joins=_submission_joins)
+
+GRADES = Resource(Submission, [
+    Field('id', Submission.id),
+    Field('assignment_id', Submission.assignment_id),
+    Field('assignment_title', Assignment.title),
+    Field('class_id', Assignment.class_id),
+    Field('student_id', Submission.student_id),
+    Field('student_name', User.name),
+    Field('score', Submission.score),
+    Field('max_score', Assignment.max_score),
+    Field('percent', case((Assignment.max_score > 0, Submission.score * 100.0 / Assignment.max_score))),
+    Field('feedback', Submission.feedback, False),
+    Field('graded_at', Submission.graded_at),
+], sort=Submission.graded_at, descending=True, joins=_submission_joins)
+
+NOTIFICATIONS = Resource(Notification, [
+    Field('id', Notification.id),
+    Field('message', Notification.message),
+    Field('link', Notification.link),
+    Field('type', Notification.type),
+    Field('is_read', Notification.is_read),
+    Field('timestamp', Notification.timestamp),
+], sort=Notification.timestamp, descending=True)
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _json(payload, status=200):
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
+
+
+@api_bp.errorhandler(ApiError)
+def handle_api_error(error):
+    return _json({'error': error.message}, error.status)
+
+
+@api_bp.before_request
+def require_login():
+    if not current_user.is_authenticated:
+        return _json({'error': 'Authentication required.'}, 401)
+
+
+def _encode_cursor(value, last_id):
+    # An empty sort key stands for NULL
+    value = '' if value is None else value.isoformat()
+    return base64.urlsafe_b64encode(f'{value}|{last_id}'.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        value, _, last_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().partition('|')
+        return (datetime.fromisoformat(value) if value else None), int(last_id)
+    except ValueError:
+        raise ApiError(400, 'Invalid cursor.')
+
+
+def _fields(resource):
+    requested = request.args.get('fields')
+    if not requested:
+        return resource.default_fields
+    names = tuple(dict.fromkeys(name.strip() for name in requested.split(',') if name.strip()))
+    unknown = [name for name in names if name not in resource.fields]
+    if unknown or not names:
+        raise ApiError(400, f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(resource.fields)}.')
+    return names
+
+
+def _page(resource, *criteria):
+    """One keyset page as {"data": [...], "next_cursor": ...}, with an ETag over the body."""
+    names = _fields(resource)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    stmt = resource.select(names).where(*criteria)
+    cursor = request.args.get('cursor')
+    if cursor:
+        stmt = stmt.where(resource.after(*_decode_cursor(cursor)))
+    rows = db.session.execute(stmt.limit(limit + 1)).all()
+    next_cursor = _encode_cursor(rows[limit - 1][-2], rows[limit - 1][-1]) if len(rows) > limit else None
+    data = [dict(zip(names, row)) for row in rows[:limit]]
+
+    response = _json({'data': data, 'next_cursor': next_cursor})
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _enrolled_class_ids():
+    return select(Enrollment.class_id).where(Enrollment.student_id == current_user.id)
+
+
+def _role_scope(teacher, student):
+    if current_user.is_teacher():
+        return teacher
+    if current_user.is_student():
+        return student
+    raise ApiError(403, 'Only available to teachers and students.')
+
+
+@api_bp.route('/me')
+def me():
+    return _json({'id': current_user.id, 'name': current_user.name, 'email': current_user.email,
+                  'role': current_user.role, 'course_id': current_user.course_id})
+
+
+@api_bp.route('/classes')
+def classes():
+    scope = _role_scope(Class.teacher_id == current_user.id, Class.id.in_(_enrolled_class_ids()))
+    return _page(CLASSES, scope)
+
+
+@api_bp.route('/assignments')
+def assignments():
+    criteria = [_role_scope(Assignment.teacher_id == current_user.id, Assignment.class_id.in_(_enrolled_class_ids()))]
+    class_id = request.args.get('class_id', type=int)
+    if class_id is not None:
+        criteria.append(Assignment.class_id == class_id)
+    return _page(ASSIGNMENTS, *criteria)
+
+
+def _submission_criteria():
+    criteria = [_role_scope(Assignment.teacher_id == current_user.id, Submission.student_id == current_user.id)]
+    assignment_id = request.args.get('assignment_id', type=int)
+    if assignment_id is not None:
+        criteria.append(Submission.assignment_id == assignment_id)
+    return criteria
+
+
+@api_bp.route('/submissions')
+def submissions():
+    return _page(SUBMISSIONS, *_submission_criteria())
+
+
+@api_bp.route('/grades')
+def grades():
+    return _page(GRADES, Submission.score.isnot(None), Submission.graded_at.isnot(None), *_submission_criteria())
+
+
+@api_bp.route('/notifications')
+def notifications():
+    criteria = [Notification.user_id == current_user.id]
+    if request.args.get('unread') in ('1', 'true'):
+        criteria.append(Notification.is_read.is_(False))
+    return _page(NOTIFICATIONS, *criteria)
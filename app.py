@@ -1,119 +1,151 @@
 
 import os
-import logging
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager
-from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from extension import db, login_manager
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
-
-class Base(DeclarativeBase):
-    pass
-
-'''db = SQLAlchemy(model_class=Base)
-login_manager = LoginManager()'''
-
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure the database
-
-DB_USER = os.environ.get("POSTGRES_USER", "learntrack")
-DB_PASS = os.environ.get("POSTGRES_PASSWORD", "makacha")
-DB_HOST = os.environ.get("POSTGRES_HOST", "db")
-DB_NAME = os.environ.get("POSTGRES_DB", "learntrack_db")
-app.config["SQLALCHEMY_DATABASE_URI"] = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:5432/{DB_NAME}"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-
-# File upload configuration
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
-
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# Initialize extensions
-db.init_app(app)
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'
-login_manager.login_message = 'Please log in to access this page.'
-login_manager.login_message_category = 'info'
-
-@login_manager.user_loader
-def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
-
-with app.app_context():
-    # Import models to ensure tables are created
-    import models
-    db.create_all()
-    # Ensure the real admin user exists
-    from models import create_default_admin
-    create_default_admin()
-    
-    # Create default admin user if none exists
-    from models import User
-    from werkzeug.security import generate_password_hash
-    
-    if not User.query.filter_by(email='admin@learntrack.com').first():
-        admin_user = User(
-            email='admin@learntrack.com',
-            name='Admin User',
-            role='teacher',
-            password_hash=generate_password_hash('admin123')
-        )
-        db.session.add(admin_user)
+from pool import engine_options
+from logging_setup import configure_logging, init_request_logging
+
+
+def configure_app(app, config=None):
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+    # X-Forwarded-For is only trusted with TRUSTED_PROXIES set to the number of proxies in
+    # front of the app; otherwise a client could pick its own remote_addr (and rate-limit bucket)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ.get('TRUSTED_PROXIES', 0)), x_proto=1, x_host=1)
+
+    # Configure the database
+    DB_USER = os.environ.get("POSTGRES_USER", "learntrack")
+    DB_PASS = os.environ.get("POSTGRES_PASSWORD", "makacha")
+    DB_HOST = os.environ.get("POSTGRES_HOST", "db")
+    DB_NAME = os.environ.get("POSTGRES_DB", "learntrack_db")
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
+        "DATABASE_URL", f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:5432/{DB_NAME}"
+    )
+
+    # File upload configuration
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+
+    # Overrides go in before anything derived from them, e.g. a test's sqlite:// URI
+    if config:
+        app.config.update(config)
+    # Pool size, overflow, timeout and PgBouncer mode come from DB_POOL_* env vars
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config["SQLALCHEMY_DATABASE_URI"]))
+
+
+def register_blueprints(app):
+    # Imported here so that importing app.py stays cheap; routes pull in models and forms
+    from routes import auth_bp, teacher_bp, student_bp, main_bp, admin_bp
+    from api import api_bp
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(teacher_bp, url_prefix='/teacher')
+    app.register_blueprint(student_bp, url_prefix='/student')
+    app.register_blueprint(main_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
+
+
+def register_notifications(app):
+    # --- Notification context processor and mark-as-read route ---
+    from flask import jsonify
+    from flask_login import current_user, login_required
+    from models import Notification
+    from utils import LazyList
+
+    @app.context_processor
+    def inject_notifications():
+        if hasattr(current_user, 'is_authenticated') and current_user.is_authenticated:
+            # Loaded on first use, so a cached navbar fragment skips the query entirely
+            user_id = current_user.id
+            notifications = LazyList(lambda: Notification.query.filter_by(user_id=user_id).order_by(Notification.timestamp.desc()).limit(10).all())
+            unread_notifications = LazyList(lambda: [n for n in notifications if not n.is_read])
+            return dict(
+                notifications=notifications,
+                unread_notifications=unread_notifications
+            )
+        return dict(notifications=[], unread_notifications=[])
+
+    @app.route('/notification/read/<int:notif_id>', methods=['POST'])
+    @login_required
+    def mark_notification_read(notif_id):
+        notif = Notification.query.filter_by(id=notif_id, user_id=current_user.id).first_or_404()
+        notif.is_read = True
         db.session.commit()
-        print("Default admin user created: admin@learntrack.com / admin123")
-
-# Import and register blueprints
-from routes import auth_bp, teacher_bp, student_bp, main_bp, admin_bp
-from utils import format_datetime, format_date
-
-# Add Jinja filters
-app.jinja_env.filters['format_date'] = format_date
-app.jinja_env.filters['format_datetime'] = format_datetime
-
-app.register_blueprint(auth_bp, url_prefix='/auth')
-app.register_blueprint(teacher_bp, url_prefix='/teacher')
-app.register_blueprint(student_bp, url_prefix='/student')
-app.register_blueprint(main_bp)
-app.register_blueprint(admin_bp)
-
-# --- Notification context processor and mark-as-read route ---
-from flask import current_app, jsonify, g
-from flask_login import current_user, login_required
-from models import Notification
-
-@app.context_processor
-def inject_notifications():
-    if hasattr(current_user, 'is_authenticated') and current_user.is_authenticated:
-        notifications = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.timestamp.desc()).limit(10).all()
-        unread_notifications = [n for n in notifications if not n.is_read]
-        return dict(
-            notifications=notifications,
-            unread_notifications=unread_notifications
-        )
-    return dict(notifications=[], unread_notifications=[])
-
-@app.route('/notification/read/<int:notif_id>', methods=['POST'])
-@login_required
-def mark_notification_read(notif_id):
-    notif = Notification.query.filter_by(id=notif_id, user_id=current_user.id).first_or_404()
-    notif.is_read = True
-    db.session.commit()
-    return jsonify({'success': True})
-
+        return jsonify({'success': True})
+
+
+def create_app(config=None):
+    """Build the Flask app without touching the database.
+
+    Schema creation and default users are handled by `flask bootstrap`.
+    """
+    # JSON logs written from a background thread; levels and sampling come from LOG_* env vars
+    configure_logging()
+    app = Flask(__name__)
+    configure_app(app, config)
+    init_request_logging(app)
+    # Prometheus metrics; registered early so every request is counted, even rate-limited ones
+    from metrics import init_metrics
+    from profiler import init_profiler
+    init_metrics(app)
+    init_profiler(app)
+
+    # Ensure upload directory exists
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    # Initialize extensions
+    db.init_app(app)
+    login_manager.init_app(app)
+    login_manager.login_view = 'auth.login'
+    login_manager.login_message = 'Please log in to access this page.'
+    login_manager.login_message_category = 'info'
+
+    @login_manager.user_loader
+    def load_user(user_id):
+        from models import User
+        user = User.query.get(int(user_id))
+        # Users being deleted in the background are logged out straight away
+        return user if user is not None and user.deleted_at is None else None
+
+    register_blueprints(app)
+    register_notifications(app)
+
+    # Add Jinja filters
+    from utils import format_datetime, format_date
+    app.jinja_env.filters['format_date'] = format_date
+    app.jinja_env.filters['format_datetime'] = format_datetime
+
+    # Fingerprinted static assets and negotiated response compression
+    from assets import init_assets
+    from compression import init_compression
+    init_assets(app)
+    init_compression(app)
+
+    # Template bytecode cache and {% cache %} fragments
+    from fragment_cache import init_fragment_cache
+    init_fragment_cache(app)
+
+    # Per-user/per-IP token buckets on chat, polling and write endpoints
+    from ratelimit import init_rate_limits
+    init_rate_limits(app)
+
+    # One-time schema and default user setup: `flask --app app bootstrap`
+    from bootstrap import bootstrap_command
+    from deletion import resume_deletions_command
+    from rollups import rollups_command
+    from reminders import reminders_command, register_deadline_notify
+    from history import prune_blobs_command
+    from similarity import index_similarity_command
+    app.cli.add_command(bootstrap_command)
+    app.cli.add_command(resume_deletions_command)
+    app.cli.add_command(rollups_command)
+    app.cli.add_command(reminders_command)
+    app.cli.add_command(prune_blobs_command)
+    app.cli.add_command(index_similarity_command)
+    register_deadline_notify()
+
+    return app
 
 
 if __name__ == "__main__":
-        app.run(host="0.0.0.0", port=5000, debug=True)
+        create_app().run(host="0.0.0.0", port=5000, debug=True)
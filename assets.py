@@ -0,0 +1,54 @@
+import json
+import mimetypes
+import os
+from flask import request, send_from_directory
+
+MANIFEST_NAME = 'manifest.json'
+DIST_DIR = 'dist'
+# Fingerprinted files never change, so browsers may keep them for a year
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# Pre-compressed variants written by build_assets.py, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def load_manifest(static_folder):
+    """Load the source -> fingerprinted path mapping written by build_assets.py."""
+    path = os.path.join(static_folder, MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_assets(app):
+    """Serve fingerprinted, pre-compressed static files when a manifest exists."""
+    manifest = load_manifest(app.static_folder)
+    app.extensions['asset_manifest'] = manifest
+    if not manifest:
+        return
+    fingerprinted = set(manifest.values())
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        # url_for('static', filename='css/style.css') -> /static/dist/css/style.<hash>.css
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = manifest.get(values['filename'], values['filename'])
+
+    def send_static(filename):
+        if filename not in fingerprinted:
+            return app.send_static_file(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = None
+        for encoding, suffix in ENCODINGS:
+            if encoding in request.accept_encodings and os.path.exists(os.path.join(app.static_folder, filename + suffix)):
+                response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(app.static_folder, filename, mimetype=mimetype)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.view_functions['static'] = send_static
@@ -0,0 +1,191 @@
+"""Compare gunicorn sync and gevent workers on the polling and download endpoints.
+
+Seeds a small dataset, starts gunicorn once per worker class and fires
+concurrent requests at /messages/*, /api/calendar-events and the download
+route, optionally while slow clients hold connections open.
+
+    DATABASE_URL=postgresql://... python -m benchmarks.concurrency --concurrency 200
+"""
+import argparse
+import http.client
+import os
+import re
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUDENT_EMAIL = 'bench-student@example.com'
+TEACHER_EMAIL = 'bench-teacher@example.com'
+PASSWORD = 'bench-password'
+DOWNLOAD_NAME = 'bench_download.bin'
+
+
+def seed(download_kb):
+    """Create a teacher, a student, a class with assignments, messages and a download file."""
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from bootstrap import bootstrap
+    from extension import db
+    from models import User, Course, Class, Enrollment, Assignment, Message
+
+    app = create_app()
+    with app.app_context():
+        bootstrap()
+        teacher = User.query.filter_by(email=TEACHER_EMAIL).first()
+        if teacher is None:
+            teacher = User(email=TEACHER_EMAIL, name='Bench Teacher', role='teacher')
+            student = User(email=STUDENT_EMAIL, name='Bench Student', role='student')
+            for user in (teacher, student):
+                user.set_password(PASSWORD)
+            course = Course.query.filter_by(name='Benchmark Course').first() or Course(name='Benchmark Course')
+            db.session.add_all([teacher, student, course])
+            db.session.flush()
+            class_obj = Class(name='Benchmark Class', teacher_id=teacher.id, course_id=course.id)
+            db.session.add(class_obj)
+            db.session.flush()
+            db.session.add(Enrollment(student_id=student.id, class_id=class_obj.id))
+            now = datetime.utcnow()
+            for i in range(50):
+                db.session.add(Assignment(title=f'Bench assignment {i}', description='Benchmark', due_date=now + timedelta(days=i - 25),
+                                          teacher_id=teacher.id, class_id=class_obj.id))
+            for i in range(100):
+                sender, receiver = (student, teacher) if i % 2 else (teacher, student)
+                db.session.add(Message(sender_id=sender.id, receiver_id=receiver.id, content=f'Benchmark message {i}'))
+            db.session.commit()
+        teacher_id = teacher.id
+    with open(os.path.join(ROOT, app.config['UPLOAD_FOLDER'], DOWNLOAD_NAME), 'wb') as f:
+        f.write(os.urandom(download_kb * 1024))
+    return teacher_id
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(worker_class, port, workers):
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS=str(workers),
+               GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_PRELOAD='true', RATE_LIMIT_ENABLED='false')
+    proc = subprocess.Popen(['gunicorn', '-c', 'gunicorn.conf.py', 'app:create_app()'], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f'gunicorn ({worker_class}) did not start on port {port}')
+
+
+def login(port):
+    """Log in as the benchmark student and return the session cookie header."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.request('GET', '/auth/login')
+    resp = conn.getresponse()
+    body = resp.read().decode()
+    cookie = resp.getheader('Set-Cookie', '').split(';')[0]
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', body).group(1)
+    form = urlencode({'csrf_token': token, 'email': STUDENT_EMAIL, 'password': PASSWORD})
+    conn.request('POST', '/auth/login', body=form, headers={
+        'Content-Type': 'application/x-www-form-urlencoded', 'Cookie': cookie})
+    resp = conn.getresponse()
+    resp.read()
+    conn.close()
+    return resp.getheader('Set-Cookie', cookie).split(';')[0]
+
+
+def hold_slow_clients(port, count, stop):
+    # Each socket sends an incomplete request, tying up a sync worker until it times out
+    sockets = []
+    for _ in range(count):
+        s = socket.create_connection(('127.0.0.1', port))
+        s.sendall(b'GET /auth/login HTTP/1.1\r\nHost: localhost\r\n')
+        sockets.append(s)
+    stop.wait()
+    for s in sockets:
+        s.close()
+
+
+def fetch(port, path, cookie):
+    start = time.perf_counter()
+    try:
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        conn.request('GET', path, headers={'Cookie': cookie, 'Accept-Encoding': 'identity'})
+        resp = conn.getresponse()
+        resp.read()
+        conn.close()
+        ok = resp.status == 200
+    except OSError:
+        ok = False
+    return path, time.perf_counter() - start, ok
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def run(worker_class, args, teacher_id):
+    port = free_port()
+    proc = start_gunicorn(worker_class, port, args.workers)
+    stop = threading.Event()
+    slow = None
+    try:
+        cookie = login(port)
+        if args.slow_clients:
+            slow = threading.Thread(target=hold_slow_clients, args=(port, args.slow_clients, stop), daemon=True)
+            slow.start()
+            time.sleep(0.5)
+        paths = ['/messages/users', f'/messages/{teacher_id}', '/api/calendar-events', f'/download/{DOWNLOAD_NAME}']
+        jobs = [paths[i % len(paths)] for i in range(args.requests)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            results = list(pool.map(lambda p: fetch(port, p, cookie), jobs))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+    print(f'\n== {worker_class} workers x{args.workers}: {len(results) / elapsed:.1f} req/s overall ({elapsed:.2f}s)')
+    print(f'{"endpoint":<32}{"ok":>6}{"errors":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for path in paths:
+        latencies = [t * 1000 for p, t, ok in results if p == path and ok]
+        errors = sum(1 for p, _, ok in results if p == path and not ok)
+        print(f'{path:<32}{len(latencies):>6}{errors:>8}{percentile(latencies, 50):>10.1f}'
+              f'{percentile(latencies, 95):>10.1f}{percentile(latencies, 99):>10.1f}')
+    return len(results) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--worker-classes', default='sync,gevent')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--slow-clients', type=int, default=0,
+                        help='connections that send an incomplete request and stay open during the run')
+    parser.add_argument('--download-kb', type=int, default=512)
+    args = parser.parse_args()
+
+    teacher_id = seed(args.download_kb)
+    throughput = {wc: run(wc, args, teacher_id) for wc in args.worker_classes.split(',')}
+    print('\nThroughput: ' + ', '.join(f'{wc}={rps:.1f} req/s' for wc, rps in throughput.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,316 @@
+"""Replay realistic traffic mixes against a synthetic school and report latency.
+
+Seeds the database configured by DATABASE_URL with a synthetic school, then
+drives the real routes through the Flask test client (default, which also
+counts SQL queries per request) or a running server via --url. Results can
+be compared against a stored JSON baseline to catch regressions.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python -m benchmarks.loadtest --students 1000
+    python -m benchmarks.loadtest --baseline benchmarks/baseline.json --update-baseline
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import sys
+import time
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.school import SchoolSize, generate_school  # noqa: E402
+
+CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+# Traffic mixes: (weight, role, operation); operations are defined in OPERATIONS
+MIXES = {
+    'student_dashboard': [(60, 'student', 'student_dashboard'), (25, 'student', 'student_assignments'),
+                          (15, 'student', 'calendar_events')],
+    'chat_polling': [(70, 'student', 'chat_users'), (30, 'student', 'chat_conversation')],
+    'grading': [(40, 'teacher', 'view_submissions'), (60, 'teacher', 'grade_submission')],
+    'admin_dashboard': [(70, 'admin', 'admin_dashboard'), (30, 'admin', 'admin_users')],
+}
+MIXES['mixed'] = [entry for mix in MIXES.values() for entry in mix]
+
+
+def _pick(rng, values):
+    return rng.choice(values) if values else None
+
+
+# Each operation yields (label, method, path, form data) steps for the chosen actor
+def _student_dashboard(ctx, actor, rng):
+    yield 'student.dashboard', 'GET', '/student/dashboard', None
+
+
+def _student_assignments(ctx, actor, rng):
+    yield 'student.assignments', 'GET', '/student/assignments', None
+
+
+def _calendar_events(ctx, actor, rng):
+    yield 'main.calendar_events', 'GET', '/api/calendar-events', None
+
+
+def _chat_users(ctx, actor, rng):
+    yield 'main.get_chat_users', 'GET', '/messages/users', None
+
+
+def _chat_conversation(ctx, actor, rng):
+    yield 'main.get_conversation', 'GET', f'/messages/{_pick(rng, ctx["teacher_ids"])}', None
+
+
+def _view_submissions(ctx, actor, rng):
+    assignment_id = _pick(rng, ctx['teacher_assignments'].get(actor['id'], []))
+    if assignment_id:
+        yield 'teacher.view_submissions', 'GET', f'/teacher/assignment/{assignment_id}/submissions', None
+
+
+def _grade_submission(ctx, actor, rng):
+    submission_id = _pick(rng, ctx['teacher_submissions'].get(actor['id'], []))
+    if submission_id:
+        path = f'/teacher/submission/{submission_id}/grade'
+        yield 'teacher.grade_submission[GET]', 'GET', path, None
+        yield 'teacher.grade_submission[POST]', 'POST', path, {'score': rng.randint(0, 10), 'feedback': 'Benchmark feedback'}
+
+
+def _admin_dashboard(ctx, actor, rng):
+    yield 'admin.admin_dashboard', 'GET', '/admin', None
+
+
+def _admin_users(ctx, actor, rng):
+    yield 'admin.admin_users', 'GET', '/admin/users', None
+
+
+OPERATIONS = {
+    'student_dashboard': _student_dashboard,
+    'student_assignments': _student_assignments,
+    'calendar_events': _calendar_events,
+    'chat_users': _chat_users,
+    'chat_conversation': _chat_conversation,
+    'view_submissions': _view_submissions,
+    'grade_submission': _grade_submission,
+    'admin_dashboard': _admin_dashboard,
+    'admin_users': _admin_users,
+}
+
+
+class TestClientTarget:
+    """Drive the app in-process and count SQL statements per request."""
+
+    def __init__(self, app):
+        from extension import db
+        from sqlalchemy import event
+        self.app = app
+        self.clients = {}
+        self.queries = 0
+        self._last_token = {}
+        with app.app_context():
+            engine = db.engine
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def count_query(*args):
+            self.queries += 1
+
+    def login(self, email, password):
+        client = self.app.test_client()
+        page = client.get('/auth/login').get_data(as_text=True)
+        token = CSRF_RE.search(page)
+        client.post('/auth/login', data={'email': email, 'password': password, 'csrf_token': token.group(1) if token else ''})
+        self.clients[email] = client
+
+    def request(self, email, method, path, data):
+        client = self.clients[email]
+        self.queries = 0
+        start = time.perf_counter()
+        if method == 'POST':
+            data = dict(data, csrf_token=self._last_token.get(email, ''))
+            response = client.post(path, data=data)
+        else:
+            response = client.get(path)
+        body = response.get_data(as_text=True)
+        elapsed = time.perf_counter() - start
+        self._remember_token(email, body)
+        return response.status_code, elapsed, self.queries
+
+    def _remember_token(self, email, body):
+        match = CSRF_RE.search(body)
+        if match:
+            self._last_token[email] = match.group(1)
+
+
+class HttpTarget(TestClientTarget):
+    """Drive a running server (e.g. local gunicorn); query counts are not available."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.cookies = {}
+        self._last_token = {}
+
+    def _send(self, method, path, cookie, data=None):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        headers = {'Cookie': cookie, 'Accept-Encoding': 'identity'}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        payload = response.read().decode(errors='ignore')
+        conn.close()
+        set_cookie = response.getheader('Set-Cookie')
+        return response.status, payload, set_cookie.split(';')[0] if set_cookie else cookie
+
+    def login(self, email, password):
+        _, page, cookie = self._send('GET', '/auth/login', '')
+        token = CSRF_RE.search(page)
+        _, _, cookie = self._send('POST', '/auth/login', cookie, {
+            'email': email, 'password': password, 'csrf_token': token.group(1) if token else ''})
+        self.cookies[email] = cookie
+
+    def request(self, email, method, path, data):
+        if method == 'POST':
+            data = dict(data, csrf_token=self._last_token.get(email, ''))
+        start = time.perf_counter()
+        status, body, self.cookies[email] = self._send(method, path, self.cookies[email], data)
+        elapsed = time.perf_counter() - start
+        self._remember_token(email, body)
+        return status, elapsed, None
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run_mix(target, ctx, mix, requests, rng):
+    actors = {
+        'student': [{'email': e, 'id': i} for e, i in zip(ctx['student_emails'], ctx['student_ids'])],
+        'teacher': [{'email': e, 'id': i} for e, i in zip(ctx['teacher_emails'], ctx['teacher_ids'])],
+        'admin': [{'email': 'admin@gmail.com', 'id': None}],
+    }
+    weights = [w for w, _, _ in MIXES[mix]]
+    samples = {}
+    done = 0
+    started = time.perf_counter()
+    while done < requests:
+        _, role, operation = rng.choices(MIXES[mix], weights=weights)[0]
+        actor = rng.choice(actors[role][:ctx['active_users']])
+        if actor['email'] not in ctx['logged_in']:
+            password = ctx['admin_password'] if role == 'admin' else ctx['password']
+            target.login(actor['email'], password)
+            ctx['logged_in'].add(actor['email'])
+        for label, method, path, data in OPERATIONS[operation](ctx, actor, rng):
+            status, elapsed, queries = target.request(actor['email'], method, path, data)
+            entry = samples.setdefault(label, {'latencies': [], 'queries': [], 'errors': 0})
+            entry['latencies'].append(elapsed * 1000)
+            if queries is not None:
+                entry['queries'].append(queries)
+            if status >= 400:
+                entry['errors'] += 1
+            done += 1
+    elapsed = time.perf_counter() - started
+    endpoints = {}
+    for label, entry in sorted(samples.items()):
+        lat = entry['latencies']
+        endpoints[label] = {
+            'requests': len(lat),
+            'errors': entry['errors'],
+            'p50_ms': round(percentile(lat, 50), 2),
+            'p95_ms': round(percentile(lat, 95), 2),
+            'p99_ms': round(percentile(lat, 99), 2),
+            'queries_per_request': round(sum(entry['queries']) / len(entry['queries']), 2) if entry['queries'] else None,
+        }
+    return {'throughput_rps': round(done / elapsed, 1), 'requests': done, 'endpoints': endpoints}
+
+
+def print_report(results):
+    for mix, result in results.items():
+        print(f'\n== {mix}: {result["throughput_rps"]} req/s over {result["requests"]} requests')
+        print(f'{"endpoint":<36}{"n":>6}{"err":>5}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"q/req":>7}')
+        for label, e in result['endpoints'].items():
+            qpr = '-' if e['queries_per_request'] is None else f'{e["queries_per_request"]:.1f}'
+            print(f'{label:<36}{e["requests"]:>6}{e["errors"]:>5}{e["p50_ms"]:>9.1f}{e["p95_ms"]:>9.1f}{e["p99_ms"]:>9.1f}{qpr:>7}')
+
+
+def compare(results, baseline, tolerance):
+    """Return regression messages for latency, query count or throughput beyond tolerance."""
+    regressions = []
+    for mix, result in results.items():
+        base = baseline.get(mix)
+        if not base:
+            continue
+        if result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f'{mix}: throughput {result["throughput_rps"]} < baseline {base["throughput_rps"]}')
+        for label, e in result['endpoints'].items():
+            b = base['endpoints'].get(label)
+            if not b:
+                continue
+            if e['p95_ms'] > b['p95_ms'] * (1 + tolerance):
+                regressions.append(f'{mix} {label}: p95 {e["p95_ms"]}ms > baseline {b["p95_ms"]}ms')
+            if e['queries_per_request'] is not None and b.get('queries_per_request') is not None \
+                    and e['queries_per_request'] > b['queries_per_request']:
+                regressions.append(f'{mix} {label}: {e["queries_per_request"]} queries/request > baseline {b["queries_per_request"]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    defaults = SchoolSize()
+    for field in ('courses', 'classes_per_course', 'teachers', 'students', 'classes_per_student',
+                  'assignments_per_class', 'messages'):
+        parser.add_argument('--' + field.replace('_', '-'), type=int, default=getattr(defaults, field))
+    parser.add_argument('--submission-rate', type=float, default=defaults.submission_rate)
+    parser.add_argument('--mix', default='mixed', choices=sorted(MIXES) + ['all'])
+    parser.add_argument('--requests', type=int, default=500, help='requests per mix')
+    parser.add_argument('--active-users', type=int, default=50, help='distinct users per role that send traffic')
+    parser.add_argument('--url', help='drive a running server (started with RATE_LIMIT_ENABLED=false) instead of the in-process test client')
+    parser.add_argument('--baseline', help='JSON baseline to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='write the results to --baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression (0.2 = 20%%)')
+    parser.add_argument('--output', help='write results JSON to this file')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app import create_app
+    from bootstrap import bootstrap
+    # Synthetic traffic comes from one address and would trip the rate limits
+    app = create_app({'RATE_LIMIT_ENABLED': False})
+    size = SchoolSize(**{k: getattr(args, k) for k in SchoolSize.__dataclass_fields__ if hasattr(args, k)})
+    started = time.perf_counter()
+    with app.app_context():
+        bootstrap()
+        ctx = generate_school(size, seed=args.seed)
+    print(f'Seeded {ctx["counts"]} in {time.perf_counter() - started:.1f}s')
+    ctx.update(active_users=args.active_users, logged_in=set(), admin_password='admin@123')
+
+    target = HttpTarget(args.url) if args.url else TestClientTarget(app)
+    rng = random.Random(args.seed)
+    mixes = [m for m in MIXES if m != 'mixed'] if args.mix == 'all' else [args.mix]
+    results = {mix: run_mix(target, ctx, mix, args.requests, rng) for mix in mixes}
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'\nBaseline written to {args.baseline}')
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('\nRegressions against baseline:')
+            for line in regressions:
+                print('  ' + line)
+            sys.exit(1)
+        print('\nNo regressions against baseline.')
+
+
+if __name__ == '__main__':
+    main()
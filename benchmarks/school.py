@@ -0,0 +1,135 @@
+"""Synthetic school generator for benchmarks.
+
+Populates the configured database with courses, classes, teachers, students,
+enrollments, assignments, submissions and messages using bulk INSERTs.
+"""
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from extension import db
+from models import User, Course, Class, Enrollment, Assignment, Submission, Message
+
+PASSWORD = 'bench-password'
+EMAIL_DOMAIN = 'bench.example.com'
+CHUNK_SIZE = 2000
+
+
+@dataclass
+class SchoolSize:
+    courses: int = 5
+    classes_per_course: int = 4
+    teachers: int = 10
+    students: int = 500
+    classes_per_student: int = 4
+    assignments_per_class: int = 10
+    submission_rate: float = 0.8
+    graded_rate: float = 0.6
+    messages: int = 2000
+
+
+def _insert(model, rows):
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(db.insert(model), rows[i:i + CHUNK_SIZE])
+
+
+def _ids(model, *criteria):
+    return [row[0] for row in db.session.query(model.id).filter(*criteria).order_by(model.id)]
+
+
+def generate_school(size=None, seed=42):
+    """Insert a synthetic school and return the ids the traffic mixes need."""
+    size = size or SchoolSize()
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    # One hash shared by every synthetic account; hashing per user would dominate seeding
+    password_hash = generate_password_hash(PASSWORD)
+    tag = f'{seed}-{int(now.timestamp())}'
+
+    _insert(Course, [{'name': f'Bench Course {tag}-{i}'} for i in range(size.courses)])
+    course_ids = _ids(Course, Course.name.like(f'Bench Course {tag}-%'))
+
+    _insert(User, [
+        {'email': f'teacher{i}-{tag}@{EMAIL_DOMAIN}', 'name': f'Teacher {i}', 'role': 'teacher',
+         'password_hash': password_hash, 'created_at': now - timedelta(days=rng.randint(0, 700))}
+        for i in range(size.teachers)
+    ] + [
+        {'email': f'student{i}-{tag}@{EMAIL_DOMAIN}', 'name': f'Student {i}', 'role': 'student',
+         'password_hash': password_hash, 'course_id': rng.choice(course_ids),
+         'created_at': now - timedelta(days=rng.randint(0, 700))}
+        for i in range(size.students)
+    ])
+    teacher_ids = _ids(User, User.email.like(f'teacher%-{tag}@{EMAIL_DOMAIN}'))
+    student_ids = _ids(User, User.email.like(f'student%-{tag}@{EMAIL_DOMAIN}'))
+
+    _insert(Class, [
+        {'name': f'Class {c}-{k}', 'description': 'Synthetic class', 'teacher_id': rng.choice(teacher_ids), 'course_id': course_id}
+        for c, course_id in enumerate(course_ids) for k in range(size.classes_per_course)
+    ])
+    classes = db.session.query(Class.id, Class.teacher_id).filter(Class.course_id.in_(course_ids)).all()
+    class_teacher = dict(classes)
+    class_ids = list(class_teacher)
+
+    enrollments = set()
+    for student_id in student_ids:
+        for class_id in rng.sample(class_ids, min(size.classes_per_student, len(class_ids))):
+            enrollments.add((student_id, class_id))
+    _insert(Enrollment, [{'student_id': s, 'class_id': c, 'enrolled_at': now} for s, c in enrollments])
+
+    _insert(Assignment, [
+        {'title': f'Assignment {i} for class {class_id}', 'description': 'Synthetic assignment ' * 20,
+         'due_date': now + timedelta(days=rng.randint(-120, 60)), 'max_score': 10,
+         'teacher_id': class_teacher[class_id], 'class_id': class_id, 'created_at': now - timedelta(days=130)}
+        for class_id in class_ids for i in range(size.assignments_per_class)
+    ])
+    assignments = db.session.query(Assignment.id, Assignment.class_id, Assignment.due_date, Assignment.teacher_id).filter(
+        Assignment.class_id.in_(class_ids)).all()
+
+    students_by_class = {}
+    for student_id, class_id in enrollments:
+        students_by_class.setdefault(class_id, []).append(student_id)
+    submissions = []
+    for assignment_id, class_id, due_date, teacher_id in assignments:
+        for student_id in students_by_class.get(class_id, []):
+            if rng.random() >= size.submission_rate:
+                continue
+            submitted_at = due_date - timedelta(hours=rng.randint(-48, 240))
+            graded = rng.random() < size.graded_rate
+            submissions.append({
+                'assignment_id': assignment_id, 'student_id': student_id,
+                'submission_text': f'Synthetic answer {rng.randint(0, 10**6)} ' * 10,
+                'submitted_at': submitted_at,
+                'score': rng.randint(0, 10) if graded else None,
+                'graded_at': submitted_at + timedelta(days=rng.randint(1, 10)) if graded else None,
+                'graded_by': teacher_id if graded else None,
+            })
+    _insert(Submission, submissions)
+
+    messages = []
+    for i in range(size.messages):
+        student_id, teacher_id = rng.choice(student_ids), rng.choice(teacher_ids)
+        sender, receiver = (student_id, teacher_id) if i % 2 else (teacher_id, student_id)
+        messages.append({'sender_id': sender, 'receiver_id': receiver, 'content': f'Synthetic message {i}',
+                         'is_read': rng.random() < 0.7, 'timestamp': now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))})
+    _insert(Message, messages)
+    db.session.commit()
+
+    teacher_submissions = {}
+    for submission_id, teacher_id in db.session.query(Submission.id, Assignment.teacher_id).join(
+            Assignment, Assignment.id == Submission.assignment_id).filter(Assignment.class_id.in_(class_ids)):
+        teacher_submissions.setdefault(teacher_id, []).append(submission_id)
+
+    return {
+        'teacher_emails': [f'teacher{i}-{tag}@{EMAIL_DOMAIN}' for i in range(size.teachers)],
+        'student_emails': [f'student{i}-{tag}@{EMAIL_DOMAIN}' for i in range(size.students)],
+        'teacher_ids': teacher_ids,
+        'student_ids': student_ids,
+        'teacher_assignments': {t: [a[0] for a in assignments if a[3] == t] for t in teacher_ids},
+        'teacher_submissions': teacher_submissions,
+        'password': PASSWORD,
+        'counts': {
+            'courses': len(course_ids), 'classes': len(class_ids), 'teachers': len(teacher_ids),
+            'students': len(student_ids), 'enrollments': len(enrollments), 'assignments': len(assignments),
+            'submissions': len(submissions), 'messages': size.messages,
+        },
+    }
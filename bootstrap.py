@@ -0,0 +1,38 @@
+import click
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+from extension import db
+
+
+def bootstrap():
+    """Create tables, search indexes and default users. Safe to run repeatedly."""
+    # Import models to ensure tables are created
+    import models
+    from models import User, create_default_admin
+    from search import install_search
+
+    db.create_all()
+    # Full-text search columns/indexes (Postgres) or FTS5 tables (SQLite)
+    install_search()
+    # Ensure the real admin user exists
+    create_default_admin()
+
+    # Create default admin user if none exists
+    if not User.query.filter_by(email='admin@learntrack.com').first():
+        admin_user = User(
+            email='admin@learntrack.com',
+            name='Admin User',
+            role='teacher',
+            password_hash=generate_password_hash('admin123')
+        )
+        db.session.add(admin_user)
+        db.session.commit()
+        click.echo("Default admin user created: admin@learntrack.com / admin123")
+
+
+@click.command('bootstrap')
+@with_appcontext
+def bootstrap_command():
+    """Create the database schema and default users."""
+    bootstrap()
+    click.echo('Bootstrap complete.')
@@ -0,0 +1,66 @@
+"""Fingerprint and pre-compress static assets.
+
+Copies every file under static/ (except dist/) to static/dist/ with a content
+hash in its name, writes .gz and .br siblings for text assets, and records the
+mapping in static/manifest.json for url_for('static', ...).
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+from assets import DIST_DIR, MANIFEST_NAME
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip variants are always written
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.map', '.html'}
+
+
+def fingerprint(rel_path, data):
+    name, ext = os.path.splitext(rel_path)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return f'{DIST_DIR}/{name}.{digest}{ext}'
+
+
+def write_compressed(path, data):
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def main():
+    dist_root = os.path.join(STATIC_DIR, DIST_DIR)
+    shutil.rmtree(dist_root, ignore_errors=True)
+    manifest = {}
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist_root]
+        for filename in files:
+            src = os.path.join(root, filename)
+            rel_path = os.path.relpath(src, STATIC_DIR).replace(os.sep, '/')
+            if rel_path == MANIFEST_NAME:
+                continue
+            with open(src, 'rb') as f:
+                data = f.read()
+            hashed = fingerprint(rel_path, data)
+            dest = os.path.join(STATIC_DIR, hashed)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            with open(dest, 'wb') as f:
+                f.write(data)
+            if os.path.splitext(filename)[1].lower() in COMPRESSIBLE:
+                write_compressed(dest, data)
+            manifest[rel_path] = hashed
+            print(f'{rel_path} -> {hashed}')
+    with open(os.path.join(STATIC_DIR, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f'Wrote {len(manifest)} entries to static/{MANIFEST_NAME}')
+
+
+if __name__ == '__main__':
+    main()
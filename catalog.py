@@ -0,0 +1,48 @@
+import json
+import os
+from sqlalchemy import select
+from extension import db
+from fragment_cache import fragment_cache, invalidate
+from models import Course, Class
+
+# With the shared store every write bumps the version all workers read after it commits,
+# so the TTL is just a backstop. Without it a bump stays in the process that made it
+# (`flask deletions`, a second container), so entries there only live a few seconds.
+CATALOG_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 3600))
+CATALOG_LOCAL_TTL = int(os.environ.get('CATALOG_LOCAL_CACHE_TTL', 15))
+
+
+def _cached(name, scope, load):
+    # Stored as JSON so the shared Redis store (strings only) works too
+    if not fragment_cache.enabled:
+        return load()
+    key = fragment_cache.key(f'catalog-{name}', catalog=scope)
+    value = fragment_cache.get(key)
+    if value is not None:
+        return [tuple(choice) for choice in json.loads(value)]
+    choices = load()
+    ttl = CATALOG_TTL if fragment_cache.shared is not None else CATALOG_LOCAL_TTL
+    fragment_cache.set(key, json.dumps(choices), ttl)
+    return choices
+
+
+def course_choices():
+    """(id, name) of every live course, for registration and class creation."""
+    return _cached('courses', 'courses', lambda: [tuple(row) for row in db.session.execute(
+        select(Course.id, Course.name).where(Course.deleted_at.is_(None)).order_by(Course.id)
+    )])
+
+
+def class_choices(teacher_id):
+    """(id, name) of a teacher's classes, for assignment and enrollment forms."""
+    return _cached('classes', f'classes-{teacher_id}', lambda: [tuple(row) for row in db.session.execute(
+        select(Class.id, Class.name).where(Class.teacher_id == teacher_id).order_by(Class.id)
+    )])
+
+
+def bump_courses():
+    invalidate('catalog:courses')
+
+
+def bump_classes(*teacher_ids):
+    invalidate(*(f'catalog:classes-{teacher_id}' for teacher_id in teacher_ids))
@@ -0,0 +1,42 @@
+import os
+
+GREEN_WORKER_CLASSES = ('gevent', 'gunicorn.workers.ggevent.GeventWorker')
+
+
+def worker_class():
+    return os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+
+def worker_count():
+    """Worker processes serving the app (GUNICORN_WORKERS, exported by gunicorn.conf.py); 1 otherwise."""
+    return int(os.environ.get('GUNICORN_WORKERS', '1'))
+
+
+def is_cooperative():
+    """True when running under gunicorn's gevent worker (set via GUNICORN_WORKER_CLASS)."""
+    return worker_class() in GREEN_WORKER_CLASSES
+
+
+def _gevent_wait_callback(conn, timeout=None):
+    # Yield to the gevent hub instead of blocking the whole worker on libpq I/O
+    import psycopg2
+    from psycopg2 import extensions
+    from gevent.socket import wait_read, wait_write
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f'Bad result from poll: {state!r}')
+
+
+def patch_psycopg():
+    """Make psycopg2 cooperative with gevent so queries don't block other greenlets."""
+    from psycopg2 import extensions
+    if not hasattr(extensions, 'set_wait_callback'):
+        raise ImportError('psycopg2 does not support wait callbacks')
+    extensions.set_wait_callback(_gevent_wait_callback)
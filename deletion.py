@@ -0,0 +1,278 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, delete, update, or_, func
+from extension import db
+from fragment_cache import invalidate
+from models import (User, Course, Class, Enrollment, Assignment, Submission, SubmissionSignature,
+                    SubmissionBand, Notification, Message, DeletionJob, ReportRollup, ReminderFiring,
+                    SubmissionVersion)
+
+logger = logging.getLogger(__name__)
+
+# Rows removed per transaction, and the pause between batches that lets other writers in
+DELETE_BATCH_SIZE = int(os.environ.get('DELETE_BATCH_SIZE', 500))
+DELETE_BATCH_PAUSE = float(os.environ.get('DELETE_BATCH_PAUSE', 0.05))
+# A pending or running job whose heartbeat is older than this lost its runner (say, a
+# restarted web worker) and is taken over by the reminder scheduler
+DELETION_STALE_SECONDS = int(os.environ.get('DELETION_STALE_SECONDS', 300))
+
+
+class Step:
+    """Delete (or, with `values`, update) rows of `model` matching `where`.
+
+    `file_column` names a column holding an upload filename to remove once
+    the batch has committed.
+    """
+
+    def __init__(self, name, model, where, file_column=None, values=None):
+        self.name = name
+        self.model = model
+        self.where = where
+        self.file_column = file_column
+        self.values = values
+
+    @property
+    def key(self):
+        return self.model.__mapper__.primary_key[0]
+
+    def count(self):
+        return db.session.execute(select(func.count()).select_from(self.model).where(self.where)).scalar()
+
+
+def _assignment_steps(assignment_ids):
+    """Steps removing assignments and everything hanging off them, children first."""
+    submission_ids = select(Submission.id).where(Submission.assignment_id.in_(assignment_ids))
+    return [
+        Step('similarity bands', SubmissionBand, SubmissionBand.assignment_id.in_(assignment_ids)),
+        Step('similarity signatures', SubmissionSignature, SubmissionSignature.assignment_id.in_(assignment_ids)),
+        Step('submission history', SubmissionVersion, SubmissionVersion.submission_id.in_(submission_ids)),
+        Step('submissions', Submission, Submission.id.in_(submission_ids), Submission.file_path),
+        Step('reminder firings', ReminderFiring, ReminderFiring.assignment_id.in_(assignment_ids)),
+        Step('assignments', Assignment, Assignment.id.in_(assignment_ids), Assignment.attachment_path),
+    ]
+
+
+def _rollup_step(name, dimension, where):
+    return Step(name, ReportRollup, (ReportRollup.dimension == dimension) & where)
+
+
+def _class_steps(class_ids):
+    assignment_ids = select(Assignment.id).where(Assignment.class_id.in_(class_ids))
+    return [_rollup_step('class rollups', 'class', ReportRollup.dimension_id.in_(class_ids))] + \
+        _assignment_steps(assignment_ids) + [
+        Step('enrollments', Enrollment, Enrollment.class_id.in_(class_ids)),
+        Step('classes', Class, Class.id.in_(class_ids)),
+    ]
+
+
+def user_steps(user_id):
+    """Dependency-ordered steps for deleting a user and the data they own."""
+    class_ids = select(Class.id).where(Class.teacher_id == user_id)
+    own_assignments = select(Assignment.id).where(Assignment.teacher_id == user_id)
+    own_submissions = select(Submission.id).where(Submission.student_id == user_id)
+    return (
+        _class_steps(class_ids)
+        + _assignment_steps(own_assignments)
+        + [
+            Step('own similarity bands', SubmissionBand, SubmissionBand.submission_id.in_(own_submissions)),
+            Step('own similarity signatures', SubmissionSignature, SubmissionSignature.submission_id.in_(own_submissions)),
+            Step('own submission history', SubmissionVersion, SubmissionVersion.submission_id.in_(own_submissions)),
+            Step('own submissions', Submission, Submission.student_id == user_id, Submission.file_path),
+            Step('grader references', Submission, Submission.graded_by == user_id, values={'graded_by': None}),
+            Step('history grader references', SubmissionVersion, SubmissionVersion.graded_by == user_id,
+                 values={'graded_by': None}),
+            Step('own enrollments', Enrollment, Enrollment.student_id == user_id),
+            Step('notifications', Notification, Notification.user_id == user_id),
+            Step('messages', Message, or_(Message.sender_id == user_id, Message.receiver_id == user_id)),
+            _rollup_step('teacher rollups', 'teacher', ReportRollup.dimension_id == user_id),
+            Step('user', User, User.id == user_id),
+        ]
+    )
+
+
+def course_steps(course_id):
+    """Dependency-ordered steps for deleting a course, its classes and their data."""
+    class_ids = select(Class.id).where(Class.course_id == course_id)
+    return _class_steps(class_ids) + [
+        Step('student course references', User, User.course_id == course_id, values={'course_id': None}),
+        _rollup_step('course rollups', 'course', ReportRollup.dimension_id == course_id),
+        Step('course', Course, Course.id == course_id),
+    ]
+
+
+STEP_BUILDERS = {'user': user_steps, 'course': course_steps}
+
+
+def _affected_scopes(job):
+    # Fragment and catalog cache scopes showing the deleted classes; core deletes skip the ORM events
+    if job.entity_type == 'user':
+        class_ids = select(Class.id).where(Class.teacher_id == job.entity_id)
+    else:
+        class_ids = select(Class.id).where(Class.course_id == job.entity_id)
+    classes = db.session.execute(class_ids).scalars().all()
+    students = db.session.execute(
+        select(Enrollment.student_id).where(Enrollment.class_id.in_(classes)).distinct()
+    ).scalars().all()
+    teachers = db.session.execute(select(Class.teacher_id).where(Class.id.in_(classes)).distinct()).scalars().all()
+    return [f'class:{cid}' for cid in classes] + [f'user:{sid}' for sid in students] + \
+        [f'catalog:classes-{tid}' for tid in teachers] + \
+        ([f'user:{job.entity_id}', f'teacher:{job.entity_id}'] if job.entity_type == 'user' else ['catalog:courses'])
+
+
+def _remove_files(filenames):
+    folder = current_app.config['UPLOAD_FOLDER']
+    for filename in filenames:
+        if not filename:
+            continue
+        try:
+            os.remove(os.path.join(folder, filename))
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.warning('Could not remove upload %s: %s', filename, exc)
+
+
+def _run_step(job, step, batch_size, pause):
+    columns = [step.key] + ([step.file_column] if step.file_column is not None else [])
+    while True:
+        rows = db.session.execute(select(*columns).where(step.where).limit(batch_size)).all()
+        if not rows:
+            return
+        ids = [row[0] for row in rows]
+        if step.values is not None:
+            stmt = update(step.model).where(step.key.in_(ids)).values(**step.values)
+        else:
+            stmt = delete(step.model).where(step.key.in_(ids))
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+        job.deleted_rows = (job.deleted_rows or 0) + len(ids)
+        job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+        if step.file_column is not None:
+            _remove_files(row[1] for row in rows)
+        if pause:
+            time.sleep(pause)
+
+
+def run_deletion(job_id, batch_size=None, pause=None):
+    """Run (or resume) a deletion job in short, bounded transactions.
+
+    Every step deletes by predicate, so a job interrupted part-way can be
+    run again and picks up where it stopped.
+    """
+    batch_size = batch_size or DELETE_BATCH_SIZE
+    pause = DELETE_BATCH_PAUSE if pause is None else pause
+    job = db.session.get(DeletionJob, job_id)
+    steps = STEP_BUILDERS[job.entity_type](job.entity_id)
+    try:
+        scopes = _affected_scopes(job)
+        job.status = 'running'
+        job.step = 'counting'
+        job.total_rows = (job.deleted_rows or 0) + sum(step.count() for step in steps)
+        db.session.commit()
+        for index, step in enumerate(steps):
+            job.step = step.name
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+            _run_step(job, step, batch_size, pause)
+            # Steps overlap (a teacher's own assignments are usually in their classes),
+            # so re-estimate what is left once each step has run
+            job.total_rows = job.deleted_rows + sum(later.count() for later in steps[index + 1:])
+        job.status = 'done'
+        job.step = None
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        invalidate(*scopes)
+    except Exception as exc:
+        db.session.rollback()
+        logger.exception('Deletion job %s failed', job_id)
+        job = db.session.get(DeletionJob, job_id)
+        job.status = 'failed'
+        job.error = str(exc)
+        db.session.commit()
+    return job
+
+
+def start_deletion(entity, requested_by=None):
+    """Soft-hide a user or course now and delete its data in a background thread."""
+    entity_type = 'user' if isinstance(entity, User) else 'course'
+    entity.deleted_at = datetime.utcnow()
+    job = DeletionJob(entity_type=entity_type, entity_id=entity.id, requested_by=requested_by,
+                      label=getattr(entity, 'email', None) or entity.name, heartbeat_at=datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    job_id = job.id
+
+    def work():
+        with app.app_context():
+            run_deletion(job_id)
+
+    threading.Thread(target=work, name=f'deletion-{job_id}', daemon=True).start()
+    return job
+
+
+def claim_stale_jobs(now=None):
+    """Take over pending or running jobs whose runner stopped; returns the claimed ids.
+
+    The claim is a conditional UPDATE of the heartbeat, so two schedulers
+    never pick up the same job. Failed jobs are left for `flask deletions`.
+    """
+    now = now or datetime.utcnow()
+    stale = or_(DeletionJob.heartbeat_at.is_(None),
+                DeletionJob.heartbeat_at < now - timedelta(seconds=DELETION_STALE_SECONDS))
+    candidates = db.session.execute(
+        select(DeletionJob.id).where(DeletionJob.status.in_(('pending', 'running')), stale)
+    ).scalars().all()
+    claimed = [job_id for job_id in candidates if db.session.execute(
+        update(DeletionJob).where(DeletionJob.id == job_id, stale).values(heartbeat_at=now)
+    ).rowcount]
+    db.session.commit()
+    return claimed
+
+
+def resume_stale_deletions(now=None):
+    """Finish every job orphaned by a restart; returns how many were resumed."""
+    claimed = claim_stale_jobs(now)
+    for job_id in claimed:
+        logger.info('Resuming orphaned deletion job %s', job_id)
+        run_deletion(job_id)
+    return len(claimed)
+
+
+_resumer = None
+
+
+def resume_stale_in_background(app):
+    """Resume orphaned jobs in a thread of a long-running process, one pass at a time."""
+    global _resumer
+    if _resumer is not None and _resumer.is_alive():
+        return
+
+    def work():
+        with app.app_context():
+            try:
+                resume_stale_deletions()
+            except Exception:
+                logger.exception('Resuming deletion jobs failed')
+            finally:
+                db.session.remove()
+
+    _resumer = threading.Thread(target=work, name='deletion-resumer', daemon=True)
+    _resumer.start()
+
+
+@click.command('deletions')
+@with_appcontext
+def resume_deletions_command():
+    """Finish deletion jobs left pending or interrupted by a restart."""
+    jobs = DeletionJob.query.filter(DeletionJob.status.in_(('pending', 'running', 'failed'))).all()
+    for job in jobs:
+        job = run_deletion(job.id)
+        click.echo(f'{job.entity_type} {job.entity_id}: {job.status}')
@@ -0,0 +1,183 @@
+import codecs
+import csv
+import hashlib
+import os
+import time
+from datetime import datetime
+from sqlalchemy import select, literal, cast, case, func, Boolean, DateTime, Integer, String, Text
+from extension import db, dialect_insert
+from models import User, Enrollment, Notification
+from fragment_cache import invalidate
+
+# Emails resolved per SELECT and rows written per INSERT when importing rosters
+ROSTER_BATCH_SIZE = 500
+# Seconds during which repeated notifications to one recipient fold into a digest
+NOTIFY_COALESCE_WINDOW = int(os.environ.get('NOTIFY_COALESCE_WINDOW', 86400))
+
+
+def bulk_enroll(class_id, student_ids):
+    """Enroll students into a class in one statement, skipping existing enrollments.
+
+    Returns the ids of students that were newly enrolled.
+    """
+    rows = [{'student_id': sid, 'class_id': class_id} for sid in dict.fromkeys(student_ids)]
+    if not rows:
+        return []
+    stmt = dialect_insert(Enrollment).values(rows)
+    stmt = stmt.on_conflict_do_nothing(index_elements=['student_id', 'class_id']).returning(Enrollment.student_id)
+    enrolled = [r[0] for r in db.session.execute(stmt)]
+    _invalidate_enrollments(class_id, enrolled)
+    return enrolled
+
+
+def enroll_course_students(class_id, course_id):
+    """Enroll every student registered for a course with INSERT ... SELECT.
+
+    Returns the ids of students that were newly enrolled.
+    """
+    source = select(User.id, literal(class_id)).where(User.role == 'student', User.course_id == course_id)
+    stmt = dialect_insert(Enrollment).from_select(['student_id', 'class_id'], source)
+    stmt = stmt.on_conflict_do_nothing(index_elements=['student_id', 'class_id']).returning(Enrollment.student_id)
+    enrolled = [r[0] for r in db.session.execute(stmt)]
+    _invalidate_enrollments(class_id, enrolled)
+    return enrolled
+
+
+def notify_users(user_ids, message, link, type='info'):
+    """Insert one notification per user with a single executemany."""
+    rows = [{'user_id': uid, 'message': message, 'link': link, 'type': type} for uid in user_ids]
+    if rows:
+        db.session.execute(db.insert(Notification), rows)
+        invalidate(*(f'user:{uid}' for uid in user_ids))
+
+
+def _coalesce_prefix(type, target, window):
+    # The recipient's id is appended (in Python or SQL) to make the coalescing key
+    bucket = int(time.time()) // (window or NOTIFY_COALESCE_WINDOW)
+    return hashlib.sha1(f'{type}|{target}|{bucket}'.encode()).hexdigest() + ':'
+
+
+def _coalescing(stmt, digest, actor):
+    """Fold a repeat into the recipient's existing row for the window."""
+    count = Notification.digest_count + 1
+    set_ = {
+        'digest_count': count,
+        'message': cast(count, String) + f' {digest}',
+        'timestamp': stmt.excluded.timestamp,
+        'is_read': False,
+    }
+    if actor is not None:
+        # A repeat by someone already counted leaves the count and text as they are
+        actors = f',{actor},'
+        seen = func.coalesce(Notification.digest_actors, '').contains(actors)
+        set_.update(
+            digest_count=case((seen, Notification.digest_count), else_=count),
+            message=case((seen, Notification.message), else_=set_['message']),
+            digest_actors=case((seen, Notification.digest_actors),
+                               else_=func.coalesce(Notification.digest_actors, ',') + f'{actor},'),
+        )
+    return stmt.on_conflict_do_update(index_elements=['coalesce_key'], set_=set_)
+
+
+def notify_coalesced(user_ids, message, digest, link, target=None, type='info', window=None, actor=None):
+    """Notify users, folding repeats of one (recipient, type, target) in a window into one row.
+
+    The first notification in a window is stored as `message`. Later ones
+    hit the same coalescing key and upsert: the counter goes up and the text
+    becomes "<count> <digest>", e.g. '27 students submitted assignment "Essay".'
+    With `actor`, the counter counts distinct actors, so a student who
+    resubmits three times is still one student. `target` defaults to the link.
+    """
+    prefix = _coalesce_prefix(type, target or link, window)
+    now = datetime.utcnow()
+    user_ids = list(dict.fromkeys(user_ids))
+    actors = None if actor is None else f',{actor},'
+    rows = [{
+        'user_id': uid, 'message': message, 'link': link, 'type': type, 'timestamp': now, 'is_read': False,
+        'digest_count': 1, 'digest_actors': actors, 'coalesce_key': f'{prefix}{uid}',
+    } for uid in user_ids]
+    if not rows:
+        return
+    db.session.execute(_coalescing(dialect_insert(Notification).values(rows), digest, actor))
+    invalidate(*(f'user:{uid}' for uid in user_ids))
+
+
+def coalesced_insert(recipients, message, digest, link, target=None, type='info', window=None, actor=None):
+    """notify_coalesced as one INSERT ... SELECT over `recipients`, a SELECT of user ids.
+
+    Returns the statement, RETURNING the notified user ids, so it can run
+    inside a larger statement; the caller executes it and invalidates
+    those users' fragments.
+    """
+    user_id = recipients.selected_columns[0]
+    source = recipients.add_columns(
+        literal(message, Text), literal(link, String), literal(type, String), literal(datetime.utcnow(), DateTime),
+        literal(False, Boolean), literal(1, Integer), literal(None if actor is None else f',{actor},', Text),
+        literal(_coalesce_prefix(type, target or link, window), String) + cast(user_id, String),
+    )
+    # SQLite can't tell ON CONFLICT from a join constraint unless the SELECT has a WHERE
+    source = source.where(user_id.isnot(None))
+    stmt = dialect_insert(Notification).from_select(
+        ['user_id', 'message', 'link', 'type', 'timestamp', 'is_read', 'digest_count', 'digest_actors', 'coalesce_key'],
+        source,
+    )
+    return _coalescing(stmt, digest, actor).returning(Notification.user_id)
+
+
+def _invalidate_enrollments(class_id, student_ids):
+    # Core inserts skip ORM events, so cached class lists are invalidated here
+    if student_ids:
+        invalidate(f'class:{class_id}', *(f'user:{sid}' for sid in student_ids))
+
+
+def _iter_emails(stream):
+    # Accept a plain list of emails or a CSV with an email column anywhere in the row.
+    # Decoded line by line: Werkzeug's spooled upload file can't take a TextIOWrapper before 3.11
+    for row in csv.reader(codecs.iterdecode(stream, 'utf-8-sig')):
+        for cell in row:
+            cell = cell.strip()
+            if '@' in cell:
+                yield cell
+                break
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_roster(class_id, stream, batch_size=ROSTER_BATCH_SIZE):
+    """Enroll the students listed in a CSV roster into a class.
+
+    Emails are resolved and enrolled in batches so a roster of thousands of
+    rows costs a handful of queries. Returns a summary with the emails that
+    did not match a registered student.
+    """
+    seen = set()
+    enrolled = []
+    missing = []
+    already = 0
+    for batch in _batches(_iter_emails(stream), batch_size):
+        batch = [e for e in batch if e not in seen]
+        seen.update(batch)
+        if not batch:
+            continue
+        found = dict(db.session.execute(
+            select(User.email, User.id).where(User.email.in_(batch), User.role == 'student')
+        ).all())
+        missing.extend(e for e in batch if e not in found)
+        new_ids = bulk_enroll(class_id, found.values())
+        enrolled.extend(new_ids)
+        already += len(found) - len(new_ids)
+    return {
+        'total': len(seen),
+        'enrolled': enrolled,
+        'already_enrolled': already,
+        'missing': missing,
+    }
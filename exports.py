@@ -0,0 +1,151 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime
+from flask import Response, send_file, stream_with_context
+from sqlalchemy import select, and_
+from extension import db
+from models import User, Class, Course, Assignment, Submission, Enrollment
+
+# Rows fetched per server-side cursor round trip
+YIELD_PER = 1000
+# Rows buffered before a CSV chunk is sent to the client
+CSV_FLUSH_ROWS = 500
+EXPORT_FORMATS = ('csv', 'xlsx')
+# Leading characters that make a spreadsheet treat a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='seconds')
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Names, titles and feedback are user input; a quote keeps "=HYPERLINK(...)" plain text
+        return "'" + value
+    return value
+
+
+def stream_rows(stmt):
+    """Iterate a SELECT through a server-side cursor, YIELD_PER rows at a time."""
+    result = db.session.execute(stmt, execution_options={'yield_per': YIELD_PER, 'stream_results': True})
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def csv_chunks(header, rows):
+    """Encode rows as CSV, yielding a chunk every CSV_FLUSH_ROWS rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([_cell(v) for v in header])
+    for i, row in enumerate(rows, 1):
+        writer.writerow([_cell(v) for v in row])
+        if i % CSV_FLUSH_ROWS == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def xlsx_file(header, rows, sheet_name):
+    """Write rows to a temporary XLSX file in constant-memory mode and return its path."""
+    import xlsxwriter  # optional dependency, only needed for XLSX exports
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'strings_to_formulas': False,
+                                          'tmpdir': tempfile.gettempdir()})
+    sheet = workbook.add_worksheet(sheet_name[:31])
+    sheet.write_row(0, 0, [_cell(v) for v in header])
+    for i, row in enumerate(rows, 1):
+        sheet.write_row(i, 0, [_cell(v) for v in row])
+    workbook.close()
+    return path
+
+
+def export_response(fmt, filename, header, rows):
+    """Stream rows as CSV, or send a constant-memory XLSX file."""
+    if fmt == 'xlsx':
+        path = xlsx_file(header, rows, filename)
+        # Unlink right away; the open handle keeps the data until the response is sent
+        handle = open(path, 'rb')
+        os.remove(path)
+        return send_file(handle, as_attachment=True, download_name=f'{filename}.xlsx',
+                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    response = Response(stream_with_context(csv_chunks(header, rows)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def gradebook_export(class_obj):
+    """One row per enrolled student with a score column per assignment."""
+    assignments = db.session.execute(
+        select(Assignment.id, Assignment.title).where(Assignment.class_id == class_obj.id).order_by(Assignment.due_date, Assignment.id)
+    ).all()
+    column = {a.id: i for i, a in enumerate(assignments)}
+    header = ['Student', 'Email'] + [a.title for a in assignments] + ['Total']
+    stmt = (
+        select(User.id, User.name, User.email, Submission.assignment_id, Submission.score)
+        .join(Enrollment, Enrollment.student_id == User.id)
+        .outerjoin(Submission, and_(Submission.student_id == User.id, Submission.assignment_id.in_(column or [-1])))
+        .where(Enrollment.class_id == class_obj.id)
+        .order_by(User.name, User.id)
+    )
+
+    def rows():
+        # Rows arrive grouped by student; emit one gradebook line per student
+        current, line = None, None
+        for student_id, name, email, assignment_id, score in stream_rows(stmt):
+            if student_id != current:
+                if line is not None:
+                    yield line + [sum(s for s in line[2:] if s is not None)]
+                current, line = student_id, [name, email] + [None] * len(assignments)
+            if assignment_id in column:
+                line[2 + column[assignment_id]] = score
+        if line is not None:
+            yield line + [sum(s for s in line[2:] if s is not None)]
+
+    return header, rows()
+
+
+def submissions_export(assignment):
+    header = ['Student', 'Email', 'Submitted At', 'Late', 'Score', 'Max Score', 'Graded At', 'Feedback', 'File']
+    stmt = (
+        select(User.name, User.email, Submission.submitted_at, Submission.is_late,
+               Submission.score, Submission.graded_at, Submission.feedback, Submission.file_path)
+        .join(User, User.id == Submission.student_id)
+        .where(Submission.assignment_id == assignment.id)
+        .order_by(User.name)
+    )
+    rows = ((name, email, submitted, 'yes' if late else 'no', score, assignment.max_score, graded, feedback, file_path)
+            for name, email, submitted, late, score, graded, feedback, file_path in stream_rows(stmt))
+    return header, rows
+
+
+def enrollments_export(teacher_id=None):
+    header = ['Course', 'Class', 'Teacher', 'Student', 'Email', 'Enrolled At']
+    teacher = db.aliased(User)
+    stmt = (
+        select(Course.name, Class.name, teacher.name, User.name, User.email, Enrollment.enrolled_at)
+        .join(Class, Class.id == Enrollment.class_id)
+        .join(Course, Course.id == Class.course_id)
+        .join(teacher, teacher.id == Class.teacher_id)
+        .join(User, User.id == Enrollment.student_id)
+        .order_by(Course.name, Class.name, User.name)
+    )
+    if teacher_id is not None:
+        stmt = stmt.where(Class.teacher_id == teacher_id)
+    return header, stream_rows(stmt)
+
+
+def users_export():
+    header = ['ID', 'Name', 'Email', 'Role', 'Course', 'Created At']
+    stmt = (
+        select(User.id, User.name, User.email, User.role, Course.name, User.created_at)
+        .outerjoin(Course, Course.id == User.course_id)
+        .where(User.deleted_at.is_(None))
+        .order_by(User.id)
+    )
+    return header, stream_rows(stmt)
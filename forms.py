@@ -1,8 +1,9 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, FileRequired
 from wtforms import StringField, PasswordField, TextAreaField, SelectField, DateTimeField, IntegerField, SubmitField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange, Optional
 from wtforms.widgets import DateTimeLocalInput
+from catalog import course_choices, class_choices
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()])
@@ -17,12 +18,19 @@ class RegisterForm(FlaskForm):
     password2 = PasswordField('Confirm Password', validators=[DataRequired(), EqualTo('password')])
     submit = SubmitField('Register')
 
+    def fill_choices(self, role):
+        # Students pick their course; teachers register without one
+        self.class_id.choices = course_choices() if role == 'student' else []
+
 class ClassForm(FlaskForm):
     name = StringField('Class Name', validators=[DataRequired(), Length(min=2, max=100)])
     description = TextAreaField('Description')
     course_id = SelectField('Course', coerce=int, validators=[DataRequired()])
     submit = SubmitField('Create Class')
 
+    def fill_choices(self):
+        self.course_id.choices = course_choices()
+
 class AssignmentForm(FlaskForm):
     title = StringField('Assignment Title', validators=[DataRequired(), Length(min=2, max=200)])
     description = TextAreaField('Description')
@@ -32,6 +40,9 @@ class AssignmentForm(FlaskForm):
     attachment = FileField('Attachment', validators=[FileAllowed(['pdf', 'doc', 'docx', 'txt', 'jpg', 'jpeg', 'png'], 'Invalid file type!')])
     submit = SubmitField('Create Assignment')
 
+    def fill_choices(self, teacher_id):
+        self.class_id.choices = class_choices(teacher_id)
+
 class SubmissionForm(FlaskForm):
     submission_text = TextAreaField('Submission Text')
     file = FileField('Upload File', validators=[FileAllowed(['pdf', 'doc', 'docx', 'txt', 'jpg', 'jpeg', 'png'], 'Invalid file type!')])
@@ -47,6 +58,17 @@ class EnrollStudentForm(FlaskForm):
     class_id = SelectField('Class', coerce=int, validators=[DataRequired()])
     submit = SubmitField('Enroll Student')
 
+    def fill_choices(self, teacher_id):
+        self.class_id.choices = class_choices(teacher_id)
+
+class RosterImportForm(FlaskForm):
+    roster = FileField('Roster CSV', validators=[FileRequired('Please choose a CSV roster to upload.'), FileAllowed(['csv', 'txt'], 'Upload a CSV file!')])
+    class_id = SelectField('Class', coerce=int, validators=[DataRequired()])
+    submit = SubmitField('Import Roster')
+
+    def fill_choices(self, teacher_id):
+        self.class_id.choices = class_choices(teacher_id)
+
 class AdminClassForm(FlaskForm):
     name = StringField('Class Name', validators=[DataRequired(), Length(min=2, max=100)])
     description = TextAreaField('Description')
@@ -0,0 +1,250 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from flask import has_app_context
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from cooperative import worker_count
+from extension import db
+
+DEFAULT_MAX_ENTRIES = 5000
+# session.info key holding the scopes a transaction has touched, bumped once it commits
+_PENDING = 'fragment_scopes'
+
+logger = logging.getLogger(__name__)
+
+
+class LRUStore:
+    """Thread-safe in-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def version(self, scope):
+        return self._versions.get(scope, 0)
+
+    def bump(self, scope):
+        with self._lock:
+            self._versions[scope] = self._versions.get(scope, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+
+
+class RedisStore:
+    """Shared store so fragments and invalidations are visible to every worker."""
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed for the shared store
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get('frag:' + key)
+        return value.decode('utf-8') if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set('frag:' + key, value.encode('utf-8'), ex=int(ttl))
+
+    def version(self, scope):
+        return int(self.client.get('fragver:' + scope) or 0)
+
+    def bump(self, scope):
+        self.client.incr('fragver:' + scope)
+
+    def clear(self):
+        pass
+
+
+class FragmentCache:
+    """Two-level fragment cache: in-process LRU in front of an optional shared store.
+
+    Keys embed version counters for their scopes (``user:5``, ``class:3``...),
+    so bumping a scope on a write makes every fragment that depends on it miss.
+    """
+
+    def __init__(self, shared=None, max_entries=DEFAULT_MAX_ENTRIES, enabled=True):
+        self.local = LRUStore(max_entries)
+        self.shared = shared
+        self.enabled = enabled
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+        return value
+
+    def set(self, key, value, ttl):
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+
+    def version(self, scope):
+        store = self.shared if self.shared is not None else self.local
+        return store.version(scope)
+
+    def bump(self, *scopes):
+        store = self.shared if self.shared is not None else self.local
+        for scope in scopes:
+            store.bump(scope)
+
+    def key(self, name, **scopes):
+        """Build a fragment key such as ``navbar|user:5@3`` from scope ids."""
+        parts = [name]
+        for kind, ids in sorted(scopes.items()):
+            if not isinstance(ids, (list, tuple, set)):
+                ids = [ids]
+            for scope_id in ids:
+                scope = f'{kind}:{scope_id}'
+                parts.append(f'{scope}@{self.version(scope)}')
+        return '|'.join(parts)
+
+
+class FragmentCacheExtension(Extension):
+    """Adds ``{% cache key, ttl %}...{% endcache %}`` backed by ``environment.fragment_cache``."""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(300))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, key, ttl, caller):
+        cache = getattr(self.environment, 'fragment_cache', None)
+        if cache is None or not cache.enabled:
+            return caller()
+        value = cache.get(key)
+        if value is None:
+            value = str(caller())
+            cache.set(key, value, ttl)
+        return Markup(value)
+
+
+# Cache used by the app; set up by init_fragment_cache()
+fragment_cache = FragmentCache()
+_listening = False
+
+
+def invalidate(*scopes):
+    """Bump scope versions, e.g. invalidate('user:5', 'class:3').
+
+    Inside an open transaction the scopes are bumped again once it commits:
+    a concurrent request that read the old rows before the commit could
+    otherwise have cached them under the first new version.
+    """
+    fragment_cache.bump(*scopes)
+    if has_app_context():
+        session = db.session()
+        if session.in_transaction():
+            session.info.setdefault(_PENDING, set()).update(scopes)
+
+
+def register_invalidation():
+    """Bump fragment scopes after commits that wrote rows cached fragments show.
+
+    Scopes are collected at flush and bumped only after the commit, so no
+    request can cache pre-commit rows under the new version; a rollback
+    drops them.
+    """
+    global _listening
+    if _listening:
+        return
+    _listening = True
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from models import User, Notification, Submission, Enrollment, Assignment, Class, Course
+
+    # model -> function returning the scopes a row belongs to
+    scope_map = {
+        User: lambda u: [f'user:{u.id}'],
+        Notification: lambda n: [f'user:{n.user_id}'],
+        Submission: lambda s: [f'user:{s.student_id}'],
+        Enrollment: lambda e: [f'user:{e.student_id}', f'class:{e.class_id}'],
+        Assignment: lambda a: [f'class:{a.class_id}', f'teacher:{a.teacher_id}'],
+        Class: lambda c: [f'class:{c.id}', f'teacher:{c.teacher_id}', f'catalog:classes-{c.teacher_id}'],
+        Course: lambda c: ['catalog:courses'],
+    }
+
+    def collect(session, flush_context):
+        scopes = set()
+        for target in (*session.new, *session.dirty, *session.deleted):
+            scopes_for = scope_map.get(type(target))
+            if scopes_for is not None:
+                scopes.update(scopes_for(target))
+        if scopes:
+            session.info.setdefault(_PENDING, set()).update(scopes)
+
+    def bump(session):
+        scopes = session.info.pop(_PENDING, None)
+        if scopes:
+            fragment_cache.bump(*scopes)
+
+    def discard(session):
+        session.info.pop(_PENDING, None)
+
+    event.listen(Session, 'after_flush', collect)
+    event.listen(Session, 'after_commit', bump)
+    event.listen(Session, 'after_rollback', discard)
+
+
+def init_fragment_cache(app):
+    """Enable template bytecode caching and the {% cache %} tag."""
+    cache_dir = os.environ.get('JINJA_BYTECODE_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'learntrack-jinja')
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+    redis_url = os.environ.get('FRAGMENT_CACHE_REDIS_URL')
+    if redis_url:
+        fragment_cache.shared = RedisStore(redis_url)
+    fragment_cache.local.max_entries = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+    enabled = app.config.get('FRAGMENT_CACHE_ENABLED', not app.testing)
+    if enabled and fragment_cache.shared is None and worker_count() > 1:
+        # Versions bumped in one worker would never reach the others, which would
+        # keep serving stale fragments until they expire
+        logger.warning('Fragment caching disabled: %s workers and no FRAGMENT_CACHE_REDIS_URL', worker_count())
+        enabled = False
+    fragment_cache.enabled = enabled
+
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = fragment_cache
+    app.jinja_env.globals['fragment_key'] = fragment_cache.key
+    register_invalidation()
+
+
+def precompile_templates(app):
+    """Compile every template up front, e.g. in the gunicorn master before forking workers."""
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
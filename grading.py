@@ -0,0 +1,77 @@
+from datetime import datetime
+from sqlalchemy import select, update
+from extension import db
+from fragment_cache import invalidate
+from models import Assignment, Submission, Notification
+
+# Most grades accepted in one request
+MAX_GRADE_BATCH = 500
+
+
+def _parse(item):
+    try:
+        submission_id = int(item['submission_id'])
+        score = item['score']
+        if isinstance(score, bool) or not float(score).is_integer():
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return None
+    feedback = item.get('feedback')
+    return submission_id, int(float(score)), feedback if feedback is None else str(feedback)
+
+
+def bulk_grade(teacher_id, items, link=None):
+    """Grade many submissions in one transaction.
+
+    Ownership and max_score come from one query over the whole batch; grades
+    are written as a single executemany UPDATE and students are told with a
+    single notification INSERT. The batch is all-or-nothing: returns
+    (graded submission ids, {}) or ([], {submission id or 'grades[i]': error}).
+    Omitting "feedback" keeps the existing feedback; unchanged grades are skipped.
+    """
+    errors = {}
+    parsed = {}
+    for index, item in enumerate(items):
+        grade = _parse(item) if isinstance(item, dict) else None
+        if grade is None:
+            errors[f'grades[{index}]'] = 'Each grade needs an integer submission_id and score.'
+        else:
+            parsed[grade[0]] = grade
+    rows = db.session.execute(
+        select(Submission.id, Submission.student_id, Submission.score, Submission.feedback,
+               Assignment.title, Assignment.max_score, Assignment.teacher_id)
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .where(Submission.id.in_(list(parsed)))
+    ).all()
+    found = {row.id: row for row in rows}
+
+    changes = []
+    for submission_id, score, feedback in parsed.values():
+        row = found.get(submission_id)
+        if row is None or row.teacher_id != teacher_id:
+            errors[str(submission_id)] = 'Submission not found.'
+        elif not 0 <= score <= (row.max_score or 0):
+            errors[str(submission_id)] = f'Score must be between 0 and {row.max_score}.'
+        else:
+            feedback = row.feedback if feedback is None else feedback
+            if score != row.score or feedback != row.feedback:
+                changes.append((row, score, feedback))
+    if errors:
+        return [], errors
+    if not changes:
+        return [], {}
+
+    now = datetime.utcnow()
+    db.session.execute(update(Submission), [
+        {'id': row.id, 'score': score, 'feedback': feedback, 'graded_at': now, 'graded_by': teacher_id}
+        for row, score, feedback in changes
+    ])
+    db.session.execute(db.insert(Notification), [
+        {'user_id': row.student_id, 'message': f'Your submission for "{row.title}" was graded: {score}/{row.max_score}.',
+         'link': link, 'type': 'grade', 'timestamp': now, 'is_read': False}
+        for row, score, feedback in changes
+    ])
+    db.session.commit()
+    # Bulk statements skip the ORM events that usually invalidate cached fragments
+    invalidate(*{f'user:{row.student_id}' for row, _, _ in changes})
+    return [row.id for row, _, _ in changes], {}
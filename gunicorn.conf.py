@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import time
+from cooperative import is_cooperative
+
+# Workers write metrics to mmap files here and /metrics aggregates them; must be set before the app is imported
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "learntrack-metrics"))
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+# Exported so the app knows per-process state (e.g. fragment cache versions) isn't shared
+os.environ["GUNICORN_WORKERS"] = str(workers)
+# "sync" (default) or "gevent"; gevent serves thousands of mostly idle connections per worker
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
+# Import the app once in the master and fork workers from it (copy-on-write)
+preload_app = os.environ.get("GUNICORN_PRELOAD", "").strip().lower() in ("1", "true", "yes", "on")
+
+_started = time.perf_counter()
+
+
+def on_starting(server):
+    # Start from empty metric files; stale ones from a previous run would be summed in
+    metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        # Compile templates once in the master; workers inherit them and the bytecode cache on disk
+        from fragment_cache import precompile_templates
+        precompile_templates(server.app.callable)
+    server.log.info("Master ready in %.1f ms (preload_app=%s)", (time.perf_counter() - _started) * 1000, server.cfg.preload_app)
+
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+    if is_cooperative():
+        # Database I/O must yield to other greenlets instead of blocking the worker
+        from cooperative import patch_psycopg
+        patch_psycopg()
+    # Connections opened before the fork (preload_app) must not be shared
+    if server.cfg.preload_app:
+        from pool import dispose_pool
+        dispose_pool(server.app.callable)
+
+
+def post_worker_init(worker):
+    # Time from fork to a loaded app; includes importing app.py when not preloaded
+    worker.log.info("Worker %s booted in %.1f ms", worker.pid, (time.perf_counter() - worker.boot_started) * 1000)
+    # Warm this worker's pool so the first requests don't wait on connect()
+    from pool import warm_pool
+    try:
+        opened = warm_pool(worker.wsgi)
+        worker.log.info("Warmed %s database connections", opened)
+    except Exception as exc:
+        worker.log.warning("Database pool warm-up failed: %s", exc)
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges (in-flight requests) from the aggregate
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
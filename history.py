@@ -0,0 +1,176 @@
+import difflib
+import hashlib
+import json
+import os
+import shutil
+import zlib
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select
+from extension import db
+from models import SubmissionVersion
+
+# A full compressed copy is stored every N versions; in between, versions are line
+# deltas against their predecessor, so rebuilding any version applies at most N - 1 deltas
+SNAPSHOT_EVERY = int(os.environ.get('HISTORY_SNAPSHOT_EVERY', 8))
+
+
+def _lines(text):
+    return text.splitlines(keepends=True)
+
+
+def encode_delta(old, new):
+    """Compressed line delta: [start, end] copies old lines, a string is new text."""
+    old_lines, new_lines = _lines(old), _lines(new)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j1 != j2:
+            ops.append(''.join(new_lines[j1:j2]))
+    return zlib.compress(json.dumps(ops, separators=(',', ':')).encode())
+
+
+def apply_delta(old, delta):
+    old_lines = _lines(old)
+    return ''.join(''.join(old_lines[op[0]:op[1]]) if isinstance(op, list) else op
+                   for op in json.loads(zlib.decompress(delta)))
+
+
+def blob_path(digest):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'blobs', digest[:2], digest)
+
+
+def store_file(filename):
+    """Keep an upload in the content-addressed blob store and return its SHA-256.
+
+    Blobs are hard links where the filesystem allows, so the first copy costs
+    no space and identical files submitted again are stored once.
+    """
+    if not filename:
+        return None
+    source = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    if not os.path.exists(source):
+        return None
+    digest = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    digest = digest.hexdigest()
+    target = blob_path(digest)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+    return digest
+
+
+def _latest(submission_id):
+    return SubmissionVersion.query.filter_by(submission_id=submission_id).order_by(SubmissionVersion.version.desc()).first()
+
+
+def _add_version(submission_id, state, previous, previous_text):
+    # `state` is any row with submission_text, file_path and submitted_at
+    number = previous.version + 1 if previous else 1
+    text = state.submission_text or ''
+    snapshot = zlib.compress(text.encode())
+    payload, is_snapshot = snapshot, True
+    if previous is not None and (number - 1) % SNAPSHOT_EVERY:
+        delta = encode_delta(previous_text, text)
+        if len(delta) < len(snapshot):
+            payload, is_snapshot = delta, False
+    if previous is not None and previous.file_name == state.file_path:
+        file_hash = previous.file_hash
+    else:
+        file_hash = store_file(state.file_path)
+    version = SubmissionVersion(
+        submission_id=submission_id, version=number, submitted_at=state.submitted_at,
+        is_snapshot=is_snapshot, text_data=payload, text_size=len(text),
+        file_name=state.file_path, file_hash=file_hash,
+    )
+    db.session.add(version)
+    return version
+
+
+def record_attempt(submission, replaced=None, inserted=True):
+    """Append a submission's new state as its newest version.
+
+    `replaced` is the row the submit overwrote (text, file and grade), or
+    None. The replaced attempt keeps its grade on its version; submissions
+    made before history existed get that attempt recorded first. A
+    resubmission whose replaced row wasn't visible (a concurrent submit
+    got there first) is encoded against the latest stored version.
+    """
+    if inserted:
+        return _add_version(submission.id, submission, None, None)
+    latest = _latest(submission.id)
+    if replaced is not None:
+        if latest is None:
+            latest = _add_version(submission.id, replaced, None, None)
+        latest.score = replaced.score
+        latest.feedback = replaced.feedback
+        latest.graded_at = replaced.graded_at
+        latest.graded_by = replaced.graded_by
+        previous_text = replaced.submission_text or ''
+    else:
+        previous_text = version_text(submission.id, latest.version) if latest else None
+    return _add_version(submission.id, submission, latest, previous_text)
+
+
+def load_history(submission_id):
+    """All versions of a submission, oldest first, each with its text rebuilt."""
+    versions = db.session.execute(
+        select(SubmissionVersion).where(SubmissionVersion.submission_id == submission_id).order_by(SubmissionVersion.version)
+    ).scalars().all()
+    text = ''
+    for version in versions:
+        if version.is_snapshot:
+            text = zlib.decompress(version.text_data).decode()
+        else:
+            text = apply_delta(text, version.text_data)
+        version.text = text
+    return versions
+
+
+def version_text(submission_id, number):
+    """Rebuild one version from the nearest snapshot at or before it."""
+    versions = db.session.execute(
+        select(SubmissionVersion.version, SubmissionVersion.is_snapshot, SubmissionVersion.text_data)
+        .where(SubmissionVersion.submission_id == submission_id, SubmissionVersion.version <= number)
+        .where(SubmissionVersion.version >= select(db.func.max(SubmissionVersion.version)).where(
+            SubmissionVersion.submission_id == submission_id,
+            SubmissionVersion.version <= number,
+            SubmissionVersion.is_snapshot.is_(True),
+        ).scalar_subquery())
+        .order_by(SubmissionVersion.version)
+    ).all()
+    if not versions or versions[-1].version != number:
+        return None
+    text = zlib.decompress(versions[0].text_data).decode()
+    for version in versions[1:]:
+        text = apply_delta(text, version.text_data)
+    return text
+
+
+def diff_lines(old, new, old_label, new_label):
+    return list(difflib.unified_diff(_lines(old), _lines(new), old_label, new_label, n=3))
+
+
+@click.command('prune-blobs')
+@with_appcontext
+def prune_blobs_command():
+    """Remove stored submission files no version refers to any more (e.g. after deletions)."""
+    referenced = set(db.session.execute(
+        select(SubmissionVersion.file_hash).where(SubmissionVersion.file_hash.isnot(None)).distinct()
+    ).scalars())
+    root = os.path.join(current_app.config['UPLOAD_FOLDER'], 'blobs')
+    removed = 0
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if name not in referenced:
+                os.remove(os.path.join(folder, name))
+                removed += 1
+    click.echo(f'{removed} unreferenced blobs removed.')
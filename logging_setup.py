@@ -0,0 +1,174 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+access_logger = logging.getLogger('learntrack.access')
+
+# SQLAlchemy logs every statement once its loggers are enabled for INFO
+DEFAULT_LEVELS = {'sqlalchemy.engine': 'WARNING', 'sqlalchemy.pool': 'WARNING'}
+
+_listener = None
+
+
+def _parse_pairs(value):
+    """Parse 'a=1,b.c=2' into {'a': '1', 'b.c': '2'}."""
+    pairs = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, _, setting = item.partition('=')
+            pairs[name.strip()] = setting.strip()
+    return pairs
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request_id and extra fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request's id before they leave the request thread."""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records from high-volume loggers; warnings and above always pass.
+
+    Rates come from LOG_SAMPLE, e.g. ``learntrack.access=0.1,sqlalchemy.engine=0.01``.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name = record.name
+        while name:
+            rate = self.rates.get(name)
+            if rate is not None:
+                return random.random() < rate
+            name = name.rpartition('.')[0]
+        return True
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records with their message merged but not yet formatted.
+
+    The stock QueueHandler formats on the calling thread; here JSON
+    serialisation and the write happen on the listener thread instead.
+    """
+
+    def prepare(self, record):
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def _stream_handler():
+    handler = logging.StreamHandler(sys.stdout)
+    if os.environ.get('LOG_FORMAT', 'json').lower() == 'text':
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+    else:
+        handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _start_listener(log_queue):
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, _stream_handler(), respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def configure_logging():
+    """Route all logging through a queue to a background writer thread.
+
+    LOG_LEVEL sets the root level (default INFO); LOG_LEVELS overrides single
+    loggers, e.g. ``sqlalchemy.engine=INFO,werkzeug=WARNING``.
+    """
+    root = logging.getLogger()
+    if any(isinstance(h, StructuredQueueHandler) for h in root.handlers):
+        return
+    log_queue = queue.SimpleQueue()
+    handler = StructuredQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter({name: float(rate) for name, rate in _parse_pairs(os.environ.get('LOG_SAMPLE')).items()}))
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    levels = dict(DEFAULT_LEVELS, **_parse_pairs(os.environ.get('LOG_LEVELS')))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _start_listener(log_queue)
+    atexit.register(_stop_listener)
+    # The writer thread doesn't survive fork (gunicorn preload_app); start a fresh one in the child
+    os.register_at_fork(after_in_child=lambda: _start_listener(log_queue))
+
+
+def init_request_logging(app):
+    """Assign request ids, echo them in X-Request-ID and write one access record per request."""
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get('X-Request-ID', '')
+        g.request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        started = g.get('request_started')
+        access_logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2) if started else None,
+        })
+        return response
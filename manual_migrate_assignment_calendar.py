@@ -0,0 +1,33 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join('instance', 'learntrack.db')
+
+def column_exists(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    # Add updated_at column to assignment table if it doesn't exist
+    if not column_exists(cursor, 'assignment', 'updated_at'):
+        print('Adding updated_at column to assignment table...')
+        cursor.execute('ALTER TABLE assignment ADD COLUMN updated_at DATETIME')
+        cursor.execute('UPDATE assignment SET updated_at = created_at')
+        conn.commit()
+    else:
+        print('updated_at column already exists in assignment table.')
+
+    # Indexes backing calendar range queries
+    print('Creating calendar indexes...')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_assignment_class_due ON assignment (class_id, due_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_assignment_teacher_due ON assignment (teacher_id, due_date)')
+    conn.commit()
+
+    print('Migration complete.')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join('instance', 'learntrack.db')
+
+def column_exists(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    # Digest columns: repeated notifications upsert into one row by coalescing key
+    if not column_exists(cursor, 'notification', 'coalesce_key'):
+        print('Adding coalesce_key and digest_count columns to notification table...')
+        cursor.execute('ALTER TABLE notification ADD COLUMN coalesce_key VARCHAR(64)')
+        cursor.execute('ALTER TABLE notification ADD COLUMN digest_count INTEGER DEFAULT 1')
+        conn.commit()
+    else:
+        print('Digest columns already exist in notification table.')
+    if not column_exists(cursor, 'notification', 'digest_actors'):
+        print('Adding digest_actors column to notification table...')
+        cursor.execute('ALTER TABLE notification ADD COLUMN digest_actors TEXT')
+        conn.commit()
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS ix_notification_coalesce_key ON notification (coalesce_key)')
+    conn.commit()
+
+    print('Migration complete.')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join('instance', 'learntrack.db')
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    # Range scans the reminder scheduler runs over upcoming due dates and recent edits
+    print('Creating reminder scheduler indexes...')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_assignment_due ON assignment (due_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_assignment_updated ON assignment (updated_at)')
+    conn.commit()
+
+    # The reminder_firing table is created by `flask --app app bootstrap`
+    print('Migration complete.')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join('instance', 'learntrack.db')
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    # Indexes the rollup refresh uses to find submissions changed since its high-water mark
+    print('Creating rollup high-water indexes...')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_submission_submitted_at ON submission (submitted_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_submission_graded_at ON submission (graded_at)')
+    conn.commit()
+
+    # The report_rollup and rollup_state tables are created by `flask --app app bootstrap`;
+    # then fill them with `flask --app app rollups --backfill`
+    print('Migration complete.')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join('instance', 'learntrack.db')
+
+def column_exists(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    # Soft-delete markers; rows are hidden while background deletion runs
+    for table in ('user', 'course'):
+        if not column_exists(cursor, table, 'deleted_at'):
+            print(f'Adding deleted_at column to {table} table...')
+            cursor.execute(f'ALTER TABLE "{table}" ADD COLUMN deleted_at DATETIME')
+            conn.commit()
+        else:
+            print(f'deleted_at column already exists in {table} table.')
+
+    # The deletion_job table itself is created by `flask --app app bootstrap`
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'deletion_job'")
+    if cursor.fetchone() and not column_exists(cursor, 'deletion_job', 'heartbeat_at'):
+        print('Adding heartbeat_at column to deletion_job table...')
+        cursor.execute('ALTER TABLE deletion_job ADD COLUMN heartbeat_at DATETIME')
+        conn.commit()
+    print('Migration complete.')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,20 @@
+import sqlite3
+import os
+
+DB_PATH = os.path.join('instance', 'learntrack.db')
+
+def main():
+    conn = sqlite3.connect(DB_PATH)
+    cursor = conn.cursor()
+
+    # Indexes backing the late / missing / ungraded status filters
+    print('Creating status filter indexes...')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_submission_assignment_score ON submission (assignment_id, score)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_enrollment_class ON enrollment (class_id)')
+    conn.commit()
+
+    print('Migration complete.')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import hmac
+import ipaddress
+import os
+import time
+from flask import g, request, has_request_context, before_render_template, template_rendered, Response, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# prometheus_client picks multiprocess (mmap file) mode when this is set before it is imported;
+# gunicorn.conf.py points it at a directory shared by all workers
+from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, generate_latest,
+                               CONTENT_TYPE_LATEST, REGISTRY, multiprocess)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+REQUEST_LATENCY = Histogram('learntrack_http_request_duration_seconds', 'Request latency by endpoint',
+                            ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+REQUEST_COUNT = Counter('learntrack_http_requests_total', 'Responses by endpoint and status',
+                        ['endpoint', 'method', 'status'])
+IN_PROGRESS = Gauge('learntrack_http_requests_in_progress', 'Requests currently being handled',
+                    ['endpoint'], multiprocess_mode='livesum')
+DB_TIME = Histogram('learntrack_db_time_seconds', 'Total database time per request',
+                    ['endpoint'], buckets=DB_BUCKETS)
+DB_QUERIES = Counter('learntrack_db_queries_total', 'Database statements executed', ['endpoint'])
+TEMPLATE_TIME = Histogram('learntrack_template_render_seconds', 'Template render time',
+                          ['template'], buckets=DB_BUCKETS)
+UPLOAD_BYTES = Counter('learntrack_upload_bytes_total', 'Request body bytes received on uploads', ['endpoint'])
+
+
+def _endpoint():
+    # Unmatched URLs share one label so 404 scans can't blow up cardinality
+    return request.endpoint or 'unmatched'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    if has_request_context():
+        g.db_time = g.get('db_time', 0.0) + time.perf_counter() - started
+        g.db_queries = g.get('db_queries', 0) + 1
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    stack = context.connection.info.get('query_started') if context.connection is not None else None
+    if stack:
+        stack.pop()
+
+
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault('render_started', []).append(time.perf_counter())
+
+
+def _rendered(sender, template, context, **extra):
+    stack = g.get('render_started') if has_request_context() else None
+    if stack:
+        TEMPLATE_TIME.labels(template.name or 'string').observe(time.perf_counter() - stack.pop())
+
+
+def _collect():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def init_metrics(app):
+    """Record per-endpoint latency, status, in-flight, DB, template and upload metrics; serve /metrics."""
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+
+    @app.before_request
+    def start_metrics():
+        endpoint = _endpoint()
+        g.metrics_started = time.perf_counter()
+        IN_PROGRESS.labels(endpoint).inc()
+        if request.content_length and request.mimetype == 'multipart/form-data':
+            UPLOAD_BYTES.labels(endpoint).inc(request.content_length)
+
+    @app.after_request
+    def record_metrics(response):
+        started = g.get('metrics_started')
+        if started is not None:
+            endpoint = _endpoint()
+            REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+            REQUEST_COUNT.labels(endpoint, request.method, response.status_code).inc()
+            DB_TIME.labels(endpoint).observe(g.get('db_time', 0.0))
+            DB_QUERIES.labels(endpoint).inc(g.get('db_queries', 0))
+        return response
+
+    @app.teardown_request
+    def finish_metrics(exc):
+        if g.pop('metrics_started', None) is not None:
+            IN_PROGRESS.labels(_endpoint()).dec()
+
+    @app.route('/metrics')
+    def metrics():
+        if not _scrape_allowed():
+            abort(403)
+        return Response(_collect(), content_type=CONTENT_TYPE_LATEST)
+
+
+def _scrape_allowed():
+    """With METRICS_TOKEN set, scrapers send it as a bearer token; without it only loopback may scrape."""
+    token = os.environ.get('METRICS_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    try:
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
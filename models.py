@@ -1,10 +1,10 @@
 from datetime import datetime
 from extension import db
 from flask_login import UserMixin
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.hybrid import hybrid_property
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask import current_app
-import pytz
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,6 +14,7 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=True)
+    deleted_at = db.Column(db.DateTime)  # Set when a background deletion starts; hides the user
     
     # Relationships
     taught_classes = db.relationship('Class', backref='teacher', lazy=True, foreign_keys='Class.teacher_id')
@@ -42,6 +43,7 @@ class User(UserMixin, db.Model):
 class Course(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
+    deleted_at = db.Column(db.DateTime)  # Set when a background deletion starts; hides the course
     # No description
     classes = db.relationship('Class', backref='course', lazy=True)
 
@@ -66,8 +68,11 @@ class Enrollment(db.Model):
     class_id = db.Column(db.Integer, db.ForeignKey('class.id'), nullable=False)
     enrolled_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Unique constraint to prevent duplicate enrollments
-    __table_args__ = (db.UniqueConstraint('student_id', 'class_id', name='unique_enrollment'),)
+    # Unique constraint to prevent duplicate enrollments; the index serves lookups by class
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'class_id', name='unique_enrollment'),
+        db.Index('ix_enrollment_class', 'class_id'),
+    )
 
 class Assignment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -79,23 +84,36 @@ class Assignment(db.Model):
     class_id = db.Column(db.Integer, db.ForeignKey('class.id'), nullable=False)
     attachment_path = db.Column(db.String(255))  # Path to uploaded assignment file
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     submissions = db.relationship('Submission', backref='assignment', lazy=True, cascade='all, delete-orphan')
     
+    # Calendar range queries filter by class (students) or teacher, then due date;
+    # the reminder scheduler scans upcoming due dates and recent edits
+    __table_args__ = (
+        db.Index('ix_assignment_class_due', 'class_id', 'due_date'),
+        db.Index('ix_assignment_teacher_due', 'teacher_id', 'due_date'),
+        db.Index('ix_assignment_due', 'due_date'),
+        db.Index('ix_assignment_updated', 'updated_at'),
+    )
+    
     def __repr__(self):
         return f'<Assignment {self.title}>'
     
+    # Due dates are stored as naive UTC, so comparisons need no timezone conversion
+    @hybrid_property
     def is_overdue(self):
         return datetime.utcnow() > self.due_date
+
+    @is_overdue.expression
+    def is_overdue(cls):
+        return cls.due_date < datetime.utcnow()
     
     def is_submission_late(self, submission):
         if not submission or not submission.submitted_at:
             return False
-        utc = pytz.utc
-        submitted_utc = submission.submitted_at.replace(tzinfo=utc)
-        due_utc = self.due_date.replace(tzinfo=utc)
-        return submitted_utc > due_utc
+        return submission.submitted_at > self.due_date
     
     def get_submission_by_student(self, student_id):
         return Submission.query.filter_by(assignment_id=self.id, student_id=student_id).first()
@@ -106,7 +124,7 @@ class Submission(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     submission_text = db.Column(db.Text)
     file_path = db.Column(db.String(255))  # Path to uploaded submission file
-    submitted_at = db.Column(db.DateTime, default=datetime.utcnow())
+    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Grading fields
     score = db.Column(db.Integer)
@@ -114,8 +132,14 @@ class Submission(db.Model):
     graded_at = db.Column(db.DateTime)
     graded_by = db.Column(db.Integer, db.ForeignKey('user.id'))
     
-    # Unique constraint to prevent multiple submissions
-    __table_args__ = (db.UniqueConstraint('assignment_id', 'student_id', name='unique_submission'),)
+    # Unique constraint to prevent multiple submissions; the indexes serve
+    # "ungraded" filters across an assignment and the rollup high-water scans
+    __table_args__ = (
+        db.UniqueConstraint('assignment_id', 'student_id', name='unique_submission'),
+        db.Index('ix_submission_assignment_score', 'assignment_id', 'score'),
+        db.Index('ix_submission_submitted_at', 'submitted_at'),
+        db.Index('ix_submission_graded_at', 'graded_at'),
+    )
     
     def __repr__(self):
         return f'<Submission {self.id}>'
@@ -123,10 +147,37 @@ class Submission(db.Model):
     def is_graded(self):
         return self.score is not None
     
+    @hybrid_property
     def is_late(self):
         return self.assignment.is_submission_late(self) if self.assignment else False
+
+    @is_late.expression
+    def is_late(cls):
+        # The one SQL definition of "late" (status page, API, exports); an unsubmitted row is not late
+        due_date = select(Assignment.due_date).where(Assignment.id == cls.assignment_id).correlate_except(Assignment).scalar_subquery()
+        return func.coalesce(cls.submitted_at > due_date, False)
         
 
+# MinHash signature of a submission's text, packed as little-endian uint32s
+class SubmissionSignature(db.Model):
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), primary_key=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False, index=True)
+    signature = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# LSH band bucket; submissions sharing a (band, bucket) are candidate duplicates
+class SubmissionBand(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False, index=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
+    band = db.Column(db.SmallInteger, nullable=False)
+    bucket = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_submission_band_bucket', 'band', 'bucket', 'assignment_id'),
+        db.Index('ix_submission_band_assignment', 'assignment_id'),
+    )
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -135,6 +186,12 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     type = db.Column(db.String(20))  # Optional: info, warning, etc.
+    # Repeats of one (recipient, type, target) within a window fold into a single digest row
+    coalesce_key = db.Column(db.String(64))
+    digest_count = db.Column(db.Integer, default=1)
+    digest_actors = db.Column(db.Text)  # ",5,9," - who the digest counts, so a repeat actor counts once
+
+    __table_args__ = (db.Index('ix_notification_coalesce_key', 'coalesce_key', unique=True),)
 
 class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -162,3 +219,84 @@ def create_default_admin():
         admin.set_password('admin@123')
         db.session.add(admin)
         db.session.commit()
+
+# Progress of a background cascade delete of a user or course
+class DeletionJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)  # 'user' or 'course'
+    entity_id = db.Column(db.Integer, nullable=False)
+    label = db.Column(db.String(255))
+    status = db.Column(db.String(20), default='pending')  # pending, running, done, failed
+    step = db.Column(db.String(50))
+    total_rows = db.Column(db.Integer, default=0)
+    deleted_rows = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    requested_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Touched every batch; a stale one means the runner died
+
+    __table_args__ = (db.Index('ix_deletion_job_entity', 'entity_type', 'entity_id'),)
+
+    def progress(self):
+        if self.status == 'done':
+            return 100
+        return int(self.deleted_rows * 100 / self.total_rows) if self.total_rows else 0
+
+# Pre-aggregated submission activity per day or week for a course, class or teacher.
+# Rows are bucketed by submitted_at and rebuilt by rollups.refresh_rollups().
+class ReportRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    grain = db.Column(db.String(10), nullable=False)  # 'day' or 'week' (weeks start on Monday)
+    period_start = db.Column(db.Date, nullable=False)
+    dimension = db.Column(db.String(10), nullable=False)  # 'course', 'class' or 'teacher'
+    dimension_id = db.Column(db.Integer, nullable=False)
+    submissions = db.Column(db.Integer, default=0)
+    on_time = db.Column(db.Integer, default=0)
+    active_students = db.Column(db.Integer, default=0)
+    graded = db.Column(db.Integer, default=0)
+    score_pct_sum = db.Column(db.Float, default=0)  # Sum of score / max_score * 100 over graded rows
+    turnaround_seconds = db.Column(db.Float, default=0)  # Sum of graded_at - submitted_at over graded rows
+
+    __table_args__ = (
+        db.UniqueConstraint('grain', 'dimension', 'dimension_id', 'period_start', name='unique_report_rollup'),
+        db.Index('ix_report_rollup_period', 'grain', 'dimension', 'period_start'),
+    )
+
+# High-water mark of the last rollup refresh
+class RollupState(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    high_water = db.Column(db.DateTime)
+    refreshed_at = db.Column(db.DateTime)
+    rows_written = db.Column(db.Integer, default=0)
+
+# One row per (assignment, reminder offset) once its deadline reminder has gone out
+class ReminderFiring(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
+    offset_minutes = db.Column(db.Integer, nullable=False)
+    fired_at = db.Column(db.DateTime, default=datetime.utcnow)
+    recipients = db.Column(db.Integer, default=0)
+
+    __table_args__ = (db.UniqueConstraint('assignment_id', 'offset_minutes', name='unique_reminder_firing'),)
+
+# One attempt at a submission. Text is zlib-compressed: a full snapshot every few
+# versions, otherwise a line delta against the previous version (see history.py).
+# Files are referenced by SHA-256 in the content-addressed blob store.
+class SubmissionVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    submitted_at = db.Column(db.DateTime)
+    is_snapshot = db.Column(db.Boolean, default=False, nullable=False)
+    text_data = db.Column(db.LargeBinary, nullable=False)
+    text_size = db.Column(db.Integer, default=0)
+    file_name = db.Column(db.String(255))
+    file_hash = db.Column(db.String(64))
+    # Grade this attempt had when it was superseded; the latest attempt's grade is on the submission
+    score = db.Column(db.Integer)
+    feedback = db.Column(db.Text)
+    graded_at = db.Column(db.DateTime)
+    graded_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+
+    __table_args__ = (db.UniqueConstraint('submission_id', 'version', name='unique_submission_version'),)
@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from sqlalchemy.pool import QueuePool, NullPool
+from cooperative import is_cooperative
+
+# Checkout latency histogram bucket upper bounds, in milliseconds
+CHECKOUT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class PoolStats:
+    """Per-process counters for connection pool checkouts."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.buckets = [0] * (len(CHECKOUT_BUCKETS_MS) + 1)
+
+    def record(self, elapsed, timed_out=False):
+        elapsed_ms = elapsed * 1000
+        index = len(CHECKOUT_BUCKETS_MS)
+        for i, bound in enumerate(CHECKOUT_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                index = i
+                break
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += elapsed
+            if elapsed > self.max_wait:
+                self.max_wait = elapsed
+            self.buckets[index] += 1
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f'le_{b}ms' for b in CHECKOUT_BUCKETS_MS] + ['le_inf']
+            attempts = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_seconds_total': round(self.total_wait, 6),
+                'wait_ms_avg': round(self.total_wait * 1000 / attempts, 3) if attempts else 0.0,
+                'wait_ms_max': round(self.max_wait * 1000, 3),
+                'checkout_latency_histogram': dict(zip(labels, self.buckets)),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long each checkout waits for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return conn
+
+    def recreate(self):
+        new_pool = super().recreate()
+        new_pool.stats = self.stats
+        return new_pool
+
+
+def engine_options(database_uri):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from DB_POOL_* environment variables.
+
+    DB_POOL_MODE=pgbouncer targets PgBouncer in transaction pooling mode:
+    PgBouncer owns the real server connections, so the app keeps no pool of
+    its own and skips pre-ping and session-level state.
+    """
+    if database_uri.startswith('sqlite'):
+        return {}
+
+    mode = os.environ.get('DB_POOL_MODE', 'default').strip().lower()
+    if mode == 'pgbouncer':
+        return {
+            'poolclass': NullPool,
+            'pool_pre_ping': False,
+            'connect_args': {'application_name': 'learntrack'},
+        }
+
+    # Under gevent one process serves many concurrent requests, so it needs a larger pool;
+    # greenlets beyond size + overflow wait in checkout (bounded by pool_timeout)
+    cooperative = is_cooperative()
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': _env_int('DB_POOL_SIZE', 20 if cooperative else 5),
+        'max_overflow': _env_int('DB_POOL_MAX_OVERFLOW', 30 if cooperative else 10),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 300),
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', False),
+        'pool_use_lifo': _env_bool('DB_POOL_USE_LIFO', True),
+    }
+
+
+def pool_status(engine):
+    """Return live statistics for the engine's connection pool."""
+    pool = engine.pool
+    status = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+            'timeout': pool.timeout(),
+        })
+    stats = getattr(pool, 'stats', None)
+    if stats is not None:
+        status.update(stats.snapshot())
+    return status
+
+
+def warm_pool(app, count=None):
+    """Open up to `count` pooled connections so the first requests don't pay for connect()."""
+    from extension import db
+    with app.app_context():
+        engine = db.engine
+        if not isinstance(engine.pool, QueuePool):
+            return 0
+        if count is None:
+            count = _env_int('DB_POOL_WARM', engine.pool.size())
+        count = min(count, engine.pool.size())
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(engine.connect())
+        finally:
+            for conn in connections:
+                conn.close()
+        return len(connections)
+
+
+def dispose_pool(app):
+    """Drop connections inherited from the parent process after a fork."""
+    from extension import db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,172 @@
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from flask import g, request, current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+# Seconds between stack samples, traces kept per worker, and share of traffic profiled automatically
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+PROFILE_BUFFER = int(os.environ.get('PROFILE_BUFFER', 50))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_TOKEN_MAX_AGE = 3600
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = '_profile'
+
+# Module prefixes deciding which bucket a sample's time is charged to
+SQL_MODULES = ('sqlalchemy', 'psycopg2', 'sqlite3', 'flask_sqlalchemy')
+JINJA_MODULES = ('jinja2',)
+
+_ids = itertools.count(1)
+traces = deque(maxlen=PROFILE_BUFFER)
+
+
+def _gevent_original(name):
+    # Under gevent, threading is patched to greenlets, which can't preempt a busy request;
+    # the sampler needs a real OS thread and the OS thread id of the request.
+    # It then sees whichever greenlet is running, which under load may not be the profiled one.
+    if 'gevent' in sys.modules:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            return monkey.get_original('_thread', name)
+    return None
+
+
+def _start_thread(target):
+    start_new_thread = _gevent_original('start_new_thread')
+    if start_new_thread is not None:
+        start_new_thread(target, ())
+    else:
+        threading.Thread(target=target, name='profiler', daemon=True).start()
+
+
+def _thread_ident():
+    get_ident = _gevent_original('get_ident')
+    return get_ident() if get_ident is not None else threading.get_ident()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    if code.co_filename.endswith('.html'):
+        return f'template:{os.path.basename(code.co_filename)}:{code.co_name}'
+    return f"{frame.f_globals.get('__name__', '?')}:{code.co_name}"
+
+
+class StackSampler:
+    """Sample one thread's Python stack at a fixed interval from a background thread."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.split = Counter()
+        self.finished = False
+        self._running = False
+
+    def start(self):
+        self._running = True
+        _start_thread(self._run)
+
+    def stop(self):
+        """Stop sampling and wait (briefly) for the sampler to finish its last sample."""
+        self._running = False
+        deadline = time.perf_counter() + self.interval * 4
+        while not self.finished and time.perf_counter() < deadline:
+            time.sleep(self.interval / 5)
+
+    def _run(self):
+        try:
+            while self._running:
+                time.sleep(self.interval)
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None and self._running:
+                    self._sample(frame)
+        finally:
+            self.finished = True
+
+    def _sample(self, frame):
+        names = []
+        in_sql = in_jinja = False
+        while frame is not None:
+            module = frame.f_globals.get('__name__', '')
+            if module.startswith(SQL_MODULES):
+                in_sql = True
+            elif module.startswith(JINJA_MODULES) or frame.f_code.co_filename.endswith('.html'):
+                in_jinja = True
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        names.reverse()
+        self.stacks[';'.join(names)] += 1
+        # Queries issued from templates (lazy loads) count as SQL time
+        self.split['sql' if in_sql else 'jinja' if in_jinja else 'python'] += 1
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='learntrack-profile')
+
+
+def profile_token(admin_id):
+    """Signed token an admin passes as X-Profile or ?_profile= to profile a request."""
+    return _serializer().dumps({'admin': admin_id})
+
+
+def _requested():
+    token = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM)
+    if token:
+        try:
+            _serializer().loads(token, max_age=PROFILE_TOKEN_MAX_AGE)
+            return 'token'
+        except BadSignature:
+            return None
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+
+def get_trace(trace_id):
+    return next((t for t in traces if t['id'] == trace_id), None)
+
+
+def collapsed_stacks(trace):
+    """Render a trace in the collapsed format read by flamegraph.pl and speedscope."""
+    return '\n'.join(f'{stack} {count}' for stack, count in trace['stacks'].most_common()) + '\n'
+
+
+def init_profiler(app):
+    """Sample the stacks of signed or randomly sampled requests into an in-memory ring buffer."""
+
+    @app.before_request
+    def start_profile():
+        reason = _requested()
+        if reason is None or request.endpoint in ('static', 'metrics'):
+            return
+        sampler = StackSampler(_thread_ident())
+        g.profile = (sampler, reason, time.perf_counter(), datetime.utcnow())
+        sampler.start()
+
+    @app.after_request
+    def finish_profile(response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        sampler, reason, started, started_at = profile
+        sampler.stop()
+        interval_ms = sampler.interval * 1000
+        traces.append({
+            'id': next(_ids),
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'reason': reason,
+            'started_at': started_at,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'samples': sum(sampler.stacks.values()),
+            'split_ms': {k: round(sampler.split[k] * interval_ms, 1) for k in ('sql', 'jinja', 'python')},
+            'stacks': sampler.stacks,
+        })
+        return response
@@ -0,0 +1,187 @@
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+from flask import request, jsonify, current_app
+from flask_login import current_user
+
+# rate: tokens refilled per second, burst: bucket size, scope: 'user' (falls back to
+# IP when anonymous), 'ip' or 'account' (the submitted email plus IP), methods: None for all
+Limit = namedtuple('Limit', 'rate burst scope methods', defaults=('user', None))
+
+
+def per_minute(count):
+    return count / 60.0
+
+
+# Endpoint -> limits; every limit must have a token for the request to pass
+DEFAULT_LIMITS = {
+    'main.send_message': [Limit(1, 10), Limit(5, 30, 'ip')],
+    'main.get_conversation': [Limit(2, 20)],
+    'main.get_chat_users': [Limit(1, 10)],
+    'main.mark_messages_read': [Limit(2, 20)],
+    'mark_notification_read': [Limit(2, 20)],
+    'main.search': [Limit(1, 10)],
+    'student.submit_assignment': [Limit(per_minute(10), 5, methods=('POST',))],
+    # Per account and IP, so a classroom behind one NAT doesn't share a bucket; the roomier
+    # per-IP bucket stops one address guessing passwords by cycling through emails
+    'auth.login': [Limit(per_minute(10), 10, 'account', ('POST',)), Limit(per_minute(30), 50, 'ip', ('POST',))],
+}
+
+
+class LocalBackend:
+    """In-process token buckets.
+
+    Buckets are guarded by a fixed set of striped locks, so requests for
+    different keys rarely contend and there is no global lock on the hot path.
+    Each worker process keeps its own buckets.
+    """
+
+    PRUNE_EVERY = 10000
+
+    def __init__(self, stripes=64):
+        self._buckets = {}
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._calls = 0
+
+    def take(self, buckets):
+        """Take one token from each (key, rate, burst) bucket, all or none.
+
+        Returns 0 when every bucket had a token, else the seconds until they
+        all will; a denied request consumes nothing.
+        """
+        now = time.monotonic()
+        # Stripes locked in a fixed order, so concurrent multi-bucket takes can't deadlock
+        stripes = sorted({hash(key) % len(self._locks) for key, _, _ in buckets})
+        for stripe in stripes:
+            self._locks[stripe].acquire()
+        try:
+            wait = 0.0
+            refilled = []
+            for key, rate, burst in buckets:
+                tokens, stamp = self._buckets.get(key, (burst, now))
+                tokens = min(burst, tokens + (now - stamp) * rate)
+                refilled.append((key, tokens))
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+            for key, tokens in refilled:
+                self._buckets[key] = (tokens if wait else tokens - 1, now)
+        finally:
+            for stripe in reversed(stripes):
+                self._locks[stripe].release()
+        self._calls += 1
+        if self._calls % self.PRUNE_EVERY == 0:
+            self.prune(now)
+        return wait
+
+    def prune(self, now=None, idle=3600):
+        # Idle buckets have refilled completely and are equivalent to missing ones
+        now = now or time.monotonic()
+        for key, (_, stamp) in list(self._buckets.items()):
+            if now - stamp > idle:
+                self._buckets.pop(key, None)
+
+    def reset(self):
+        self._buckets.clear()
+
+
+# Atomic all-or-none refill-and-take over every bucket of a request, using the
+# Redis server's clock so workers agree. ARGV holds rate, burst pairs per key.
+_REDIS_TAKE = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local wait = 0
+local refilled = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i - 1])
+    local burst = tonumber(ARGV[2 * i])
+    local bucket = redis.call('HMGET', key, 'tokens', 'stamp')
+    local tokens = tonumber(bucket[1]) or burst
+    local stamp = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - stamp) * rate)
+    refilled[i] = tokens
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local tokens = refilled[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'stamp', now)
+    redis.call('EXPIRE', key, math.ceil(tonumber(ARGV[2 * i]) / tonumber(ARGV[2 * i - 1])) + 1)
+end
+return tostring(wait)
+"""
+
+
+class RedisBackend:
+    """Token buckets shared by every worker, kept in Redis."""
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed for the shared backend
+        self.client = redis.Redis.from_url(url)
+        self._take = self.client.register_script(_REDIS_TAKE)
+
+    def take(self, buckets):
+        args = [value for _, rate, burst in buckets for value in (rate, burst)]
+        return float(self._take(keys=['ratelimit:' + key for key, _, _ in buckets], args=args))
+
+    def reset(self):
+        pass
+
+
+def _identity(scope):
+    if scope == 'user' and current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    if scope == 'account':
+        email = (request.form.get('email') or '').strip().lower()[:254]
+        return f'account:{email}|ip:{request.remote_addr}'
+    return f'ip:{request.remote_addr}'
+
+
+def _too_many_requests(wait):
+    retry_after = max(1, math.ceil(wait))
+    message = 'Too many requests. Please slow down.'
+    # fetch() sends Accept: */*, but browsers mark it with a Sec-Fetch-Mode other than "navigate"
+    if request.is_json or request.accept_mimetypes.best == 'application/json' \
+            or request.headers.get('X-Requested-With') == 'XMLHttpRequest' \
+            or request.headers.get('Sec-Fetch-Mode', 'navigate') != 'navigate':
+        response = jsonify({'error': message, 'retry_after': retry_after})
+    else:
+        response = current_app.response_class(message, mimetype='text/plain')
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def init_rate_limits(app):
+    """Throttle the endpoints listed in RATE_LIMITS, answering 429 with Retry-After."""
+    enabled = os.environ.get('RATE_LIMIT_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+    app.config.setdefault('RATE_LIMIT_ENABLED', enabled)
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(app.config.get('RATE_LIMITS', {}))
+    url = os.environ.get('RATE_LIMIT_REDIS_URL')
+    backend = app.config.get('RATE_LIMIT_BACKEND') or (RedisBackend(url) if url else LocalBackend())
+    app.extensions['rate_limit'] = backend
+
+    @app.before_request
+    def check_rate_limit():
+        if not app.config.get('RATE_LIMIT_ENABLED', True):
+            return None
+        endpoint_limits = limits.get(request.endpoint)
+        if not endpoint_limits:
+            return None
+        buckets = [
+            (f'{request.endpoint}:{index}:{_identity(limit.scope)}', limit.rate, limit.burst)
+            for index, limit in enumerate(endpoint_limits)
+            if not limit.methods or request.method in limit.methods
+        ]
+        if not buckets:
+            return None
+        wait = backend.take(buckets)
+        if wait > 0:
+            return _too_many_requests(wait)
+        return None
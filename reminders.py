@@ -0,0 +1,249 @@
+import heapq
+import logging
+import os
+import select as select_module
+import time
+from datetime import datetime, timedelta
+import click
+from flask import current_app, url_for
+from flask.cli import with_appcontext
+from sqlalchemy import select, exists, literal, text, event
+from extension import db, dialect_insert
+from deletion import resume_stale_in_background
+from fragment_cache import invalidate
+from models import User, Enrollment, Assignment, Submission, Notification, ReminderFiring
+
+logger = logging.getLogger(__name__)
+
+# Postgres NOTIFY channel the web app signals on assignment create/edit
+CHANNEL = 'assignment_deadlines'
+_UNITS = {'d': 1440, 'h': 60, 'm': 1}
+
+
+def parse_offsets(value):
+    """Parse '24h,1h,30m' into minutes before the deadline, largest first."""
+    offsets = set()
+    for item in value.split(','):
+        item = item.strip().lower()
+        if item:
+            offsets.add(int(item[:-1]) * _UNITS[item[-1]] if item[-1] in _UNITS else int(item))
+    return sorted(offsets, reverse=True)
+
+
+REMINDER_OFFSETS = parse_offsets(os.environ.get('REMINDER_OFFSETS', '24h,1h'))
+# How far past the largest offset each range query loads deadlines, and how often
+# (seconds) the scheduler checks for assignments edited since its last look
+REMINDER_WINDOW = timedelta(hours=float(os.environ.get('REMINDER_WINDOW_HOURS', 6)))
+REMINDER_POLL = int(os.environ.get('REMINDER_POLL', 60))
+
+_listening = False
+
+
+def _describe(delta):
+    minutes = max(int(delta.total_seconds() // 60), 1)
+    if minutes >= 120:
+        return f'{round(minutes / 60)} hours'
+    if minutes >= 60:
+        return '1 hour'
+    return f'{minutes} minute{"s" if minutes != 1 else ""}'
+
+
+def fire_reminder(assignment, offset_minutes, now=None):
+    """Claim a firing and notify every enrolled student with no submission.
+
+    The claim is an INSERT ... ON CONFLICT DO NOTHING on (assignment, offset),
+    so a reminder goes out at most once across restarts and concurrent
+    schedulers. Recipients are chosen and notified in one INSERT ... SELECT
+    with a NOT EXISTS anti-join against submissions. Returns the number of
+    students notified, or None if the reminder had already fired.
+    """
+    now = now or datetime.utcnow()
+    claim = dialect_insert(ReminderFiring).values(assignment_id=assignment.id, offset_minutes=offset_minutes, fired_at=now)
+    claim = claim.on_conflict_do_nothing(index_elements=['assignment_id', 'offset_minutes']).returning(ReminderFiring.id)
+    firing_id = db.session.execute(claim).scalar()
+    if firing_id is None:
+        db.session.rollback()
+        return None
+
+    with current_app.test_request_context():
+        link = url_for('student.submit_assignment', assignment_id=assignment.id)
+    message = f'Reminder: "{assignment.title}" is due in {_describe(assignment.due_date - now)}.'
+    submitted = exists().where(
+        Submission.assignment_id == assignment.id,
+        Submission.student_id == Enrollment.student_id,
+    )
+    recipients = (
+        select(Enrollment.student_id, literal(message), literal(link), literal('warning'), literal(now), literal(False))
+        .join(User, User.id == Enrollment.student_id)
+        .where(Enrollment.class_id == assignment.class_id, User.deleted_at.is_(None), ~submitted)
+    )
+    stmt = db.insert(Notification).from_select(
+        ['user_id', 'message', 'link', 'type', 'timestamp', 'is_read'], recipients
+    ).returning(Notification.user_id)
+    user_ids = db.session.execute(stmt).scalars().all()
+    db.session.get(ReminderFiring, firing_id).recipients = len(user_ids)
+    db.session.commit()
+    invalidate(*(f'user:{uid}' for uid in user_ids))
+    logger.info('Deadline reminder sent', extra={
+        'assignment_id': assignment.id, 'offset_minutes': offset_minutes, 'recipients': len(user_ids),
+    })
+    return len(user_ids)
+
+
+class ReminderScheduler:
+    """Min-heap of upcoming reminder times, fed by indexed range queries.
+
+    Deadlines are loaded one window at a time (due_date index), and edits
+    are picked up from the updated_at index, so no pass ever reads the
+    whole assignment table. Heap entries are invalidated lazily: an entry
+    whose time no longer matches `scheduled` is skipped when popped.
+    """
+
+    def __init__(self, offsets=None, window=REMINDER_WINDOW, poll=REMINDER_POLL):
+        self.offsets = offsets or REMINDER_OFFSETS
+        self.window = window
+        self.poll = timedelta(seconds=poll)
+        self.heap = []
+        self.scheduled = {}  # (assignment_id, offset) -> fire time
+        self.loaded_until = None
+        self.next_reload = None
+        self.next_poll = None
+        self.changes_seen = None
+
+    def _schedule(self, assignment_id, due_date, fired, now):
+        for index, offset in enumerate(self.offsets):
+            key = (assignment_id, offset)
+            fire_at = due_date - timedelta(minutes=offset)
+            # A deadline created or moved inside a smaller offset only gets the nearest reminder
+            superseded = fire_at <= now and any(due_date - timedelta(minutes=o) <= now for o in self.offsets[index + 1:])
+            if key in fired or superseded or due_date <= now or due_date > self.loaded_until:
+                self.scheduled.pop(key, None)
+            elif self.scheduled.get(key) != fire_at:
+                self.scheduled[key] = fire_at
+                heapq.heappush(self.heap, (fire_at, assignment_id, offset))
+
+    def _load(self, stmt, now):
+        rows = db.session.execute(stmt).all()
+        ids = [row.id for row in rows]
+        fired = set()
+        if ids:
+            fired = set(db.session.execute(
+                select(ReminderFiring.assignment_id, ReminderFiring.offset_minutes)
+                .where(ReminderFiring.assignment_id.in_(ids))
+            ).tuples())
+        for row in rows:
+            self._schedule(row.id, row.due_date, fired, now)
+        return len(rows)
+
+    def reload(self, now):
+        """Load every deadline whose reminders fall before the next reload."""
+        self.loaded_until = now + timedelta(minutes=self.offsets[0]) + self.window
+        loaded = self._load(
+            select(Assignment.id, Assignment.due_date)
+            .where(Assignment.due_date > now, Assignment.due_date <= self.loaded_until),
+            now,
+        )
+        self.next_reload = now + self.window
+        self.changes_seen = now
+        self.next_poll = now + self.poll
+        logger.debug('Loaded %s upcoming deadlines', loaded)
+
+    def load_changes(self, now):
+        """Reschedule assignments created or edited since the last check."""
+        # Overlap one poll interval so rows stamped before a slow commit aren't missed
+        since = self.changes_seen - self.poll
+        self._load(select(Assignment.id, Assignment.due_date).where(Assignment.updated_at > since), now)
+        self.changes_seen = now
+        self.next_poll = now + self.poll
+
+    def run_pending(self, now):
+        fired = 0
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, assignment_id, offset = heapq.heappop(self.heap)
+            key = (assignment_id, offset)
+            if self.scheduled.get(key) != fire_at:
+                continue
+            del self.scheduled[key]
+            assignment = db.session.get(Assignment, assignment_id)
+            # Skip rows deleted or moved since they were loaded; an edit reschedules them
+            if assignment is None or assignment.due_date != fire_at + timedelta(minutes=offset) or assignment.due_date <= now:
+                continue
+            if fire_reminder(assignment, offset, now) is not None:
+                fired += 1
+        return fired
+
+    def next_wake(self):
+        times = [self.next_reload, self.next_poll]
+        if self.heap:
+            times.append(self.heap[0][0])
+        return min(times)
+
+    def tick(self, now=None, woken=False):
+        now = now or datetime.utcnow()
+        if self.next_reload is None or now >= self.next_reload:
+            self.reload(now)
+        elif woken or now >= self.next_poll:
+            self.load_changes(now)
+        fired = self.run_pending(now)
+        db.session.remove()
+        return fired
+
+
+class _Waiter:
+    """Sleep until a timeout; on Postgres, wake early when an assignment changes."""
+
+    def __init__(self):
+        self.raw = None
+        if db.engine.dialect.name == 'postgresql':
+            self.raw = db.engine.raw_connection()
+            conn = self.raw.driver_connection
+            conn.autocommit = True
+            conn.cursor().execute(f'LISTEN {CHANNEL}')
+
+    def wait(self, timeout):
+        if self.raw is None:
+            time.sleep(timeout)
+            return False
+        conn = self.raw.driver_connection
+        if select_module.select([conn], [], [], timeout) == ([], [], []):
+            return False
+        conn.poll()
+        woken = bool(conn.notifies)
+        conn.notifies.clear()
+        return woken
+
+
+def register_deadline_notify():
+    """Signal the scheduler (Postgres NOTIFY, sent on commit) when an assignment is created or edited."""
+    global _listening
+    if _listening:
+        return
+    _listening = True
+
+    def notify(mapper, connection, target):
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': CHANNEL, 'payload': str(target.id)})
+
+    event.listen(Assignment, 'after_insert', notify)
+    event.listen(Assignment, 'after_update', notify)
+
+
+@click.command('reminders')
+@click.option('--once', is_flag=True, help='Send due reminders and exit (for cron) instead of running continuously.')
+@with_appcontext
+def reminders_command(once):
+    """Send deadline reminders to students who haven't submitted."""
+    scheduler = ReminderScheduler()
+    if once:
+        click.echo(f'{scheduler.tick()} reminders sent.')
+        return
+    waiter = _Waiter()
+    logger.info('Reminder scheduler started', extra={'offsets': scheduler.offsets})
+    app = current_app._get_current_object()
+    woken = False
+    while True:
+        # Deletion jobs run in the web worker that started them; finish any a restart orphaned
+        resume_stale_in_background(app)
+        scheduler.tick(woken=woken)
+        timeout = (scheduler.next_wake() - datetime.utcnow()).total_seconds()
+        woken = waiter.wait(max(timeout, 0))
@@ -0,0 +1,290 @@
+import logging
+import os
+from datetime import date, datetime, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import select, delete, insert, func, case, distinct, union
+from extension import db
+from models import Class, Assignment, Submission, User, Course, ReportRollup, RollupState
+
+logger = logging.getLogger(__name__)
+
+GRAINS = ('day', 'week')
+# Reporting dimension -> the column a submission is grouped by
+DIMENSIONS = {
+    'course': Class.course_id,
+    'class': Assignment.class_id,
+    'teacher': Assignment.teacher_id,
+}
+STATE_NAME = 'submissions'
+
+# Days before the high-water mark that every refresh rebuilds. Covers rows committed
+# after a refresh started but stamped before it, and resubmissions that move submitted_at.
+ROLLUP_LOOKBACK_DAYS = int(os.environ.get('ROLLUP_LOOKBACK_DAYS', 7))
+# Weeks rebuilt per transaction during a backfill or refresh
+ROLLUP_BACKFILL_WEEKS = int(os.environ.get('ROLLUP_BACKFILL_WEEKS', 12))
+INSERT_BATCH = 1000
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def period_start(day, grain):
+    return week_start(day) if grain == 'week' else day
+
+
+def _as_date(value):
+    # date_trunc gives datetimes on Postgres, date() gives strings on SQLite
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def _period(column, grain):
+    if _is_postgres():
+        return func.date_trunc(grain, column)
+    if grain == 'week':
+        return func.date(column, 'weekday 0', '-6 days')
+    return func.date(column)
+
+
+def _seconds_between(start, end):
+    if _is_postgres():
+        return func.extract('epoch', end - start)
+    return (func.julianday(end) - func.julianday(start)) * 86400
+
+
+def _aggregate(grain, dimension, start, end=None):
+    """Rollup rows for submissions made in [start, end), computed from the source tables."""
+    period = _period(Submission.submitted_at, grain)
+    dim = DIMENSIONS[dimension]
+    graded = Submission.score.isnot(None)
+    stmt = (
+        select(
+            period,
+            dim,
+            func.count(Submission.id),
+            func.sum(case((Submission.submitted_at <= Assignment.due_date, 1), else_=0)),
+            func.count(distinct(Submission.student_id)),
+            func.count(Submission.score),
+            func.sum(case((graded & (Assignment.max_score > 0), Submission.score * 100.0 / Assignment.max_score), else_=0)),
+            func.sum(case((graded & Submission.graded_at.isnot(None),
+                           _seconds_between(Submission.submitted_at, Submission.graded_at)), else_=0)),
+        )
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .join(Class, Class.id == Assignment.class_id)
+        .where(Submission.submitted_at >= datetime.combine(start, datetime.min.time()))
+        .group_by(period, dim)
+    )
+    if end is not None:
+        stmt = stmt.where(Submission.submitted_at < datetime.combine(end, datetime.min.time()))
+    for row in db.session.execute(stmt):
+        yield {
+            'grain': grain,
+            'period_start': _as_date(row[0]),
+            'dimension': dimension,
+            'dimension_id': row[1],
+            'submissions': row[2],
+            'on_time': row[3] or 0,
+            'active_students': row[4],
+            'graded': row[5],
+            'score_pct_sum': float(row[6] or 0),
+            'turnaround_seconds': float(row[7] or 0),
+        }
+
+
+def _rebuild(start, end=None):
+    """Replace every rollup row for periods in [start, end); both bounds are Mondays.
+
+    Runs in the caller's transaction, so readers see the old rows until it commits.
+    """
+    written = 0
+    for grain in GRAINS:
+        for dimension in DIMENSIONS:
+            stale = delete(ReportRollup).where(
+                ReportRollup.grain == grain,
+                ReportRollup.dimension == dimension,
+                ReportRollup.period_start >= start,
+            )
+            if end is not None:
+                stale = stale.where(ReportRollup.period_start < end)
+            db.session.execute(stale)
+            batch = []
+            for row in _aggregate(grain, dimension, start, end):
+                batch.append(row)
+                if len(batch) >= INSERT_BATCH:
+                    db.session.execute(insert(ReportRollup), batch)
+                    written += len(batch)
+                    batch = []
+            if batch:
+                db.session.execute(insert(ReportRollup), batch)
+                written += len(batch)
+    return written
+
+
+def _state():
+    # Row lock on Postgres keeps two refreshes from rebuilding the same range at once
+    state = db.session.get(RollupState, STATE_NAME, with_for_update=True)
+    if state is None:
+        state = RollupState(name=STATE_NAME)
+        db.session.add(state)
+    return state
+
+
+def backfill(since=None):
+    """Rebuild all rollups from `since` (default: the first submission) in week-aligned chunks."""
+    started = datetime.utcnow()
+    if since is None:
+        first = db.session.execute(select(func.min(Submission.submitted_at))).scalar()
+        since = first.date() if first else started.date()
+    start = week_start(since)
+    stop = week_start(started.date()) + timedelta(weeks=1)
+    written = 0
+    while start < stop:
+        end = start + timedelta(weeks=ROLLUP_BACKFILL_WEEKS)
+        written += _rebuild(start, None if end >= stop else end)
+        db.session.commit()
+        start = end
+    state = _state()
+    state.high_water = started
+    state.refreshed_at = datetime.utcnow()
+    state.rows_written = written
+    db.session.commit()
+    logger.info('Rollup backfill wrote %s rows', written, extra={'since': since.isoformat()})
+    return written
+
+
+def _changed_weeks(mark, until):
+    """Mondays of the weeks holding a submission made, graded or re-dated since `mark`."""
+    week = _period(Submission.submitted_at, 'week')
+    graded = select(week).where(Submission.graded_at > mark)
+    edited = (
+        select(week)
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .where(Assignment.updated_at > mark)
+    )
+    weeks = {_as_date(value) for value in db.session.execute(union(graded, edited)).scalars()}
+    # New submissions can only land in the weeks since the mark
+    day = week_start((mark - timedelta(days=ROLLUP_LOOKBACK_DAYS)).date())
+    while day <= until:
+        weeks.add(day)
+        day += timedelta(weeks=1)
+    return sorted(weeks)
+
+
+def _runs(weeks):
+    """Collapse sorted Mondays into [start, end) ranges of consecutive weeks."""
+    runs = []
+    for day in weeks:
+        if runs and runs[-1][1] == day:
+            runs[-1][1] = day + timedelta(weeks=1)
+        else:
+            runs.append([day, day + timedelta(weeks=1)])
+    return runs
+
+
+def refresh_rollups():
+    """Bring the rollups up to date from the high-water mark.
+
+    Only the weeks touched since the last refresh are rebuilt: new
+    submissions, newly graded ones and those on assignments edited since
+    (a due date change flips on-time status). A regrade from last term
+    rebuilds that one week, not everything after it. Hard deletes are not
+    tracked; `flask --app app rollups --backfill` rebuilds everything.
+    """
+    state = _state()
+    if state.high_water is None:
+        db.session.rollback()
+        return backfill()
+    started = datetime.utcnow()
+    weeks = _changed_weeks(state.high_water, week_start(started.date()))
+    written = 0
+    for i in range(0, len(weeks), ROLLUP_BACKFILL_WEEKS):
+        if i:
+            _state()  # Take the lock the previous commit released
+        for start, end in _runs(weeks[i:i + ROLLUP_BACKFILL_WEEKS]):
+            written += _rebuild(start, end)
+        db.session.commit()
+    state = _state()
+    state.high_water = started
+    state.refreshed_at = datetime.utcnow()
+    state.rows_written = written
+    db.session.commit()
+    logger.info('Rollups refreshed', extra={'weeks': len(weeks), 'rows': written})
+    return written
+
+
+def _names(dimension, ids):
+    if not ids:
+        return {}
+    model, label = {'course': (Course, Course.name), 'class': (Class, Class.name), 'teacher': (User, User.name)}[dimension]
+    return dict(db.session.execute(select(model.id, label).where(model.id.in_(ids))).all())
+
+
+def _derive(entry):
+    # Rates and averages are computed from the summed totals, never averaged across periods
+    entry['on_time_rate'] = round(entry['on_time'] * 100 / entry['submissions'], 1) if entry['submissions'] else None
+    entry['avg_score_pct'] = round(entry['score_pct_sum'] / entry['graded'], 1) if entry['graded'] else None
+    entry['avg_turnaround_hours'] = round(entry['turnaround_seconds'] / entry['graded'] / 3600, 1) if entry['graded'] else None
+    return entry
+
+
+def report(grain='week', dimension='course', periods=12, dimension_id=None):
+    """Rollup rows for the last `periods` days or weeks, plus per-entity and per-period totals.
+
+    Reads only the rollup table, so its cost depends on the range shown, not on history.
+    """
+    today = datetime.utcnow().date()
+    step = timedelta(weeks=1) if grain == 'week' else timedelta(days=1)
+    start = period_start(today, grain) - step * (periods - 1)
+    query = ReportRollup.query.filter(
+        ReportRollup.grain == grain,
+        ReportRollup.dimension == dimension,
+        ReportRollup.period_start >= start,
+    )
+    if dimension_id is not None:
+        query = query.filter(ReportRollup.dimension_id == dimension_id)
+    rows = query.order_by(ReportRollup.period_start, ReportRollup.dimension_id).all()
+    names = _names(dimension, {row.dimension_id for row in rows})
+
+    totals_fields = ('submissions', 'on_time', 'graded', 'score_pct_sum', 'turnaround_seconds')
+    series, entities, by_period = [], {}, {}
+    for row in rows:
+        values = {field: getattr(row, field) or 0 for field in totals_fields}
+        series.append(_derive(dict(values, period_start=row.period_start.isoformat(), id=row.dimension_id,
+                                   name=names.get(row.dimension_id), active_students=row.active_students)))
+        entity = entities.setdefault(row.dimension_id, dict.fromkeys(totals_fields, 0))
+        period = by_period.setdefault(row.period_start.isoformat(), dict.fromkeys(totals_fields, 0))
+        for field, value in values.items():
+            entity[field] += value
+            period[field] += value
+        # Distinct students don't add up across periods; show the busiest period instead
+        entity['peak_active_students'] = max(entity.get('peak_active_students', 0), row.active_students or 0)
+
+    return {
+        'grain': grain,
+        'dimension': dimension,
+        'start': start.isoformat(),
+        'refreshed_at': getattr(db.session.get(RollupState, STATE_NAME), 'refreshed_at', None),
+        'rows': series,
+        'entities': sorted((_derive(dict(totals, id=eid, name=names.get(eid))) for eid, totals in entities.items()),
+                           key=lambda e: -e['submissions']),
+        'periods': [_derive(dict(totals, period_start=p)) for p, totals in sorted(by_period.items())],
+    }
+
+
+@click.command('rollups')
+@click.option('--backfill', 'full', is_flag=True, help='Rebuild every period instead of refreshing from the high-water mark.')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='With --backfill, start from this date.')
+@with_appcontext
+def rollups_command(full, since):
+    """Refresh the reporting rollups; run from cron every few minutes."""
+    written = backfill(since.date() if since else None) if full else refresh_rollups()
+    click.echo(f'{written} rollup rows written.')
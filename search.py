@@ -0,0 +1,190 @@
+from markupsafe import Markup, escape
+from sqlalchemy import text
+from extension import db
+
+# Highlight delimiters used inside snippets; replaced with <mark> after escaping
+MARK_START = '\x01'
+MARK_END = '\x02'
+SEARCH_LIMIT = 20
+
+# Indexed text per table: (table, weighted columns for Postgres, FTS5 columns for SQLite)
+SEARCH_TABLES = {
+    'assignment': (
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        ('title', 'description'),
+    ),
+    'submission': (
+        "to_tsvector('english', coalesce(submission_text, ''))",
+        ('submission_text',),
+    ),
+    'message': (
+        "to_tsvector('english', coalesce(content, ''))",
+        ('content',),
+    ),
+}
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def install_search():
+    """Create search columns/indexes (Postgres) or FTS5 tables and triggers (SQLite).
+
+    Safe to run repeatedly. Both backends keep the index current on every
+    insert, update and delete, so no rebuild job is needed.
+    """
+    with db.engine.begin() as conn:
+        if _is_postgres():
+            for table, (vector, _) in SEARCH_TABLES.items():
+                conn.execute(text(
+                    f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS search_vector tsvector '
+                    f'GENERATED ALWAYS AS ({vector}) STORED'
+                ))
+                conn.execute(text(
+                    f'CREATE INDEX IF NOT EXISTS ix_{table}_search ON "{table}" USING GIN (search_vector)'
+                ))
+            return
+        for table, (_, columns) in SEARCH_TABLES.items():
+            fts = f'{table}_fts'
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': fts}
+            ).first()
+            if exists:
+                continue
+            cols = ', '.join(columns)
+            new_cols = ', '.join(f'new.{c}' for c in columns)
+            old_cols = ', '.join(f'old.{c}' for c in columns)
+            conn.execute(text(f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', content_rowid='id')"))
+            conn.execute(text(
+                f'CREATE TRIGGER {fts}_ai AFTER INSERT ON "{table}" BEGIN '
+                f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END'
+            ))
+            conn.execute(text(
+                f'CREATE TRIGGER {fts}_ad AFTER DELETE ON "{table}" BEGIN '
+                f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"
+            ))
+            conn.execute(text(
+                f'CREATE TRIGGER {fts}_au AFTER UPDATE ON "{table}" BEGIN '
+                f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+                f'INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_cols}); END'
+            ))
+            conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+
+
+def _fts5_query(query):
+    # Quote every term so user input can't use FTS5 operators; last term matches as a prefix
+    terms = [t.replace('"', '""') for t in query.split()]
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _scopes(user):
+    """SQL fragments restricting each result type to what the user may see."""
+    if user.is_admin():
+        return {
+            'assignment': '1 = 1',
+            'submission': '1 = 1',
+            'message': '(m.sender_id = :uid OR m.receiver_id = :uid)',
+        }
+    if user.is_teacher():
+        return {
+            'assignment': 'a.teacher_id = :uid',
+            'submission': 'a.teacher_id = :uid',
+            'message': '(m.sender_id = :uid OR m.receiver_id = :uid)',
+        }
+    return {
+        'assignment': 'a.class_id IN (SELECT class_id FROM enrollment WHERE student_id = :uid)',
+        'submission': 's.student_id = :uid',
+        'message': '(m.sender_id = :uid OR m.receiver_id = :uid)',
+    }
+
+
+def _postgres_statements(scopes):
+    headline = "ts_headline('english', {col}, q, :headline)"
+    return {
+        'assignment': f'''
+            SELECT a.id, a.title, {headline.format(col="coalesce(a.description, '')")} AS snippet,
+                   ts_rank(a.search_vector, q) AS rank
+            FROM assignment a, websearch_to_tsquery('english', :q) q
+            WHERE a.search_vector @@ q AND {scopes['assignment']}
+            ORDER BY rank DESC LIMIT :limit''',
+        'submission': f'''
+            SELECT s.id, a.title, u.name AS student_name,
+                   {headline.format(col="coalesce(s.submission_text, '')")} AS snippet,
+                   ts_rank(s.search_vector, q) AS rank
+            FROM submission s JOIN assignment a ON a.id = s.assignment_id JOIN "user" u ON u.id = s.student_id,
+                 websearch_to_tsquery('english', :q) q
+            WHERE s.search_vector @@ q AND {scopes['submission']}
+            ORDER BY rank DESC LIMIT :limit''',
+        'message': f'''
+            SELECT m.id, m.sender_id, m.receiver_id, m.timestamp, su.name AS sender_name, ru.name AS receiver_name,
+                   {headline.format(col='m.content')} AS snippet, ts_rank(m.search_vector, q) AS rank
+            FROM message m JOIN "user" su ON su.id = m.sender_id JOIN "user" ru ON ru.id = m.receiver_id,
+                 websearch_to_tsquery('english', :q) q
+            WHERE m.search_vector @@ q AND {scopes['message']}
+            ORDER BY rank DESC LIMIT :limit''',
+    }
+
+
+def _sqlite_statements(scopes):
+    snippet = "snippet({fts}, {col}, char(1), char(2), '…', 16)"
+    return {
+        'assignment': f'''
+            SELECT a.id, a.title, {snippet.format(fts='assignment_fts', col=1)} AS snippet,
+                   -bm25(assignment_fts, 10.0, 1.0) AS rank
+            FROM assignment_fts JOIN assignment a ON a.id = assignment_fts.rowid
+            WHERE assignment_fts MATCH :q AND {scopes['assignment']}
+            ORDER BY rank DESC LIMIT :limit''',
+        'submission': f'''
+            SELECT s.id, a.title, u.name AS student_name,
+                   {snippet.format(fts='submission_fts', col=0)} AS snippet,
+                   -bm25(submission_fts) AS rank
+            FROM submission_fts JOIN submission s ON s.id = submission_fts.rowid
+                 JOIN assignment a ON a.id = s.assignment_id JOIN user u ON u.id = s.student_id
+            WHERE submission_fts MATCH :q AND {scopes['submission']}
+            ORDER BY rank DESC LIMIT :limit''',
+        'message': f'''
+            SELECT m.id, m.sender_id, m.receiver_id, m.timestamp, su.name AS sender_name, ru.name AS receiver_name,
+                   {snippet.format(fts='message_fts', col=0)} AS snippet, -bm25(message_fts) AS rank
+            FROM message_fts JOIN message m ON m.id = message_fts.rowid
+                 JOIN user su ON su.id = m.sender_id JOIN user ru ON ru.id = m.receiver_id
+            WHERE message_fts MATCH :q AND {scopes['message']}
+            ORDER BY rank DESC LIMIT :limit''',
+    }
+
+
+def highlight(snippet):
+    """Escape a snippet and turn the match delimiters into <mark> tags."""
+    escaped = str(escape(snippet or ''))
+    return Markup(escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+def search(user, query, limit=SEARCH_LIMIT):
+    """Run a role-scoped, ranked search and return results grouped by type."""
+    results = {'assignment': [], 'submission': [], 'message': []}
+    query = (query or '').strip()
+    if not query:
+        return results
+    scopes = _scopes(user)
+    params = {'uid': user.id, 'limit': limit}
+    if _is_postgres():
+        statements = _postgres_statements(scopes)
+        params['q'] = query
+        params['headline'] = f'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=30, MinWords=10'
+    else:
+        statements = _sqlite_statements(scopes)
+        params['q'] = _fts5_query(query)
+        if params['q'] is None:
+            return results
+    for kind, sql in statements.items():
+        stmt = text(sql).columns(timestamp=db.DateTime) if kind == 'message' else text(sql)
+        for row in db.session.execute(stmt, params).mappings():
+            item = dict(row)
+            item['snippet'] = highlight(item['snippet'])
+            results[kind].append(item)
+    return results
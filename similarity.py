@@ -0,0 +1,274 @@
+import logging
+import os
+import random
+import re
+import sys
+import time
+import zipfile
+import zlib
+from array import array
+from xml.etree import ElementTree
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import select, exists, and_, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from extension import db
+from models import Assignment, Class, Submission, SubmissionSignature, SubmissionBand, User
+
+NUM_PERM = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+# Pairs below this estimated Jaccard similarity are not reported
+DEFAULT_THRESHOLD = 0.5
+# Characters of submission text (typed plus extracted from the file) that are shingled;
+# MinHash cost grows with length, and the start of a document is enough to spot copies
+MAX_INDEX_CHARS = int(os.environ.get('SIMILARITY_MAX_CHARS', 100000))
+INDEX_BATCH = 100
+# Seconds `flask index-similarity --watch` waits between looks for unindexed submissions
+INDEX_POLL = float(os.environ.get('SIMILARITY_INDEX_POLL', 5))
+
+logger = logging.getLogger(__name__)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+# Fixed seed so signatures stay comparable across processes and restarts
+_rng = random.Random(0x1EA27)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+_WORD_RE = re.compile(r'\w+')
+_DOCX_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Return the set of hashed word n-grams of a normalised text."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(' '.join(words).encode())} if words else set()
+    return {zlib.crc32(' '.join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_hashes):
+    """Compute a NUM_PERM-value MinHash signature as an array of uint32."""
+    values = list(shingle_hashes)
+    signature = array('I')
+    for a, b in _PERMUTATIONS:
+        signature.append(min((a * x + b) % _MERSENNE_PRIME for x in values) & _MAX_HASH)
+    return signature
+
+
+def pack(signature):
+    if sys.byteorder != 'little':
+        signature = array('I', signature)
+        signature.byteswap()
+    return signature.tobytes()
+
+
+def unpack(data):
+    signature = array('I')
+    signature.frombytes(data)
+    if sys.byteorder != 'little':
+        signature.byteswap()
+    return signature
+
+
+def band_buckets(signature):
+    """Hash each band of ROWS_PER_BAND values into a bucket id."""
+    buckets = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        buckets.append(zlib.crc32(pack(chunk)) & 0x7fffffff)
+    return buckets
+
+
+def estimate_similarity(sig_a, sig_b):
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def extract_file_text(filename, limit=MAX_INDEX_CHARS):
+    """Return up to `limit` characters of plain text from an uploaded .txt or .docx file, or ''."""
+    if not filename:
+        return ''
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+    ext = os.path.splitext(filename)[1].lower()
+    try:
+        if ext == '.txt':
+            with open(path, 'rb') as f:
+                return f.read(limit * 4).decode('utf-8', errors='ignore')[:limit]
+        if ext == '.docx':
+            with zipfile.ZipFile(path) as docx:
+                root = ElementTree.fromstring(docx.read('word/document.xml'))
+            paragraphs = []
+            size = 0
+            for para in root.iter(f'{_DOCX_NS}p'):
+                paragraphs.append(''.join(node.text or '' for node in para.iter(f'{_DOCX_NS}t')))
+                size += len(paragraphs[-1]) + 1
+                if size >= limit:
+                    break
+            return '\n'.join(paragraphs)[:limit]
+    except (OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+        current_app.logger.warning('Could not extract text from %s', filename)
+    return ''
+
+
+def unindex_statements(submission_id):
+    """DELETEs dropping a submission's signature and buckets; `submission_id` may be a SQL expression."""
+    return [
+        delete(SubmissionBand).where(SubmissionBand.submission_id == submission_id),
+        delete(SubmissionSignature).where(SubmissionSignature.submission_id == submission_id),
+    ]
+
+
+def unindex_submission(submission_id):
+    """Drop a submission's signature and buckets, marking it for the indexer. Caller commits."""
+    for stmt in unindex_statements(submission_id):
+        db.session.execute(stmt.execution_options(synchronize_session=False))
+
+
+def index_submission(submission):
+    """(Re)compute a submission's signature and LSH buckets. Caller commits.
+
+    Text without a single shingle gets an empty signature and no buckets,
+    so it is never a candidate but doesn't stay pending either.
+    """
+    unindex_submission(submission.id)
+    text = '\n'.join(filter(None, [submission.submission_text, extract_file_text(submission.file_path)]))
+    hashes = shingles(text[:MAX_INDEX_CHARS])
+    signature = minhash(hashes) if hashes else array('I')
+    db.session.add(SubmissionSignature(
+        submission_id=submission.id,
+        assignment_id=submission.assignment_id,
+        signature=pack(signature)
+    ))
+    if hashes:
+        db.session.execute(db.insert(SubmissionBand), [
+            {'submission_id': submission.id, 'assignment_id': submission.assignment_id, 'band': band, 'bucket': bucket}
+            for band, bucket in enumerate(band_buckets(signature))
+        ])
+    return signature
+
+
+def index_submissions(ids):
+    """Index the given submissions that still have no signature; commits once per call."""
+    submissions = Submission.query.filter(
+        Submission.id.in_(ids),
+        ~exists().where(SubmissionSignature.submission_id == Submission.id),
+    ).all()
+    try:
+        for submission in submissions:
+            index_submission(submission)
+        db.session.commit()
+    except IntegrityError:
+        # Another indexer got to one of them first, or a submission went away mid-batch;
+        # retry one by one so only that submission is skipped
+        db.session.rollback()
+        if len(ids) == 1:
+            return 0
+        return sum(index_submissions([submission_id]) for submission_id in ids)
+    return len(submissions)
+
+
+def index_pending():
+    """Index every submission without a signature (new, resubmitted or from before indexing existed)."""
+    indexed = 0
+    after = 0
+    while True:
+        ids = db.session.execute(
+            select(Submission.id)
+            .where(Submission.id > after, ~exists().where(SubmissionSignature.submission_id == Submission.id))
+            .order_by(Submission.id).limit(INDEX_BATCH)
+        ).scalars().all()
+        if not ids:
+            break
+        indexed += index_submissions(ids)
+        after = ids[-1]
+    return indexed
+
+
+@click.command('index-similarity')
+@click.option('--all', 'reindex', is_flag=True, help='Recompute every signature, not just missing ones.')
+@click.option('--watch', is_flag=True, help='Keep running, indexing new and resubmitted work as it arrives.')
+@with_appcontext
+def index_similarity_command(reindex, watch):
+    """Build near-duplicate signatures for submissions that have none.
+
+    Submits only drop stale signatures; MinHash is CPU-bound pure Python, so
+    it runs here, in its own process, never in a web worker.
+    """
+    if reindex:
+        SubmissionBand.query.delete(synchronize_session=False)
+        SubmissionSignature.query.delete(synchronize_session=False)
+        db.session.commit()
+    if not watch:
+        click.echo(f'{index_pending()} submissions indexed.')
+        return
+    logger.info('Similarity indexer started', extra={'poll_seconds': INDEX_POLL})
+    while True:
+        try:
+            indexed = index_pending()
+            if indexed:
+                logger.info('Submissions indexed', extra={'count': indexed})
+        except Exception:
+            logger.exception('Similarity indexing failed')
+            db.session.rollback()
+        finally:
+            db.session.remove()
+        time.sleep(INDEX_POLL)
+
+
+def _scope_assignment_ids(assignment, scope, teacher_id=None):
+    """Assignment ids to compare against: same assignment, same class, or same course (across terms)."""
+    if scope == 'assignment':
+        return select(Assignment.id).where(Assignment.id == assignment.id)
+    query = select(Assignment.id)
+    if scope == 'class':
+        query = query.where(Assignment.class_id == assignment.class_id)
+    else:
+        query = query.join(Class, Class.id == Assignment.class_id).where(Class.course_id == assignment.class_obj.course_id)
+    if teacher_id is not None:
+        query = query.where(Assignment.teacher_id == teacher_id)
+    return query
+
+
+def similar_pairs(assignment, scope='assignment', threshold=DEFAULT_THRESHOLD, teacher_id=None):
+    """Return near-duplicate pairs involving `assignment`'s submissions, most similar first.
+
+    Candidates come from a self-join on shared LSH buckets, so only pairs that
+    collide in at least one band are compared; each candidate's similarity is
+    then estimated from the stored signatures.
+    """
+    b1 = aliased(SubmissionBand)
+    b2 = aliased(SubmissionBand)
+    candidates = db.session.execute(
+        select(b1.submission_id, b2.submission_id).distinct()
+        .join(b2, and_(b1.band == b2.band, b1.bucket == b2.bucket, b1.submission_id != b2.submission_id))
+        .where(b1.assignment_id == assignment.id,
+               b2.assignment_id.in_(_scope_assignment_ids(assignment, scope, teacher_id)))
+    ).all()
+    # Each unordered pair once; within one assignment both orders appear
+    pairs = {tuple(sorted(pair)) for pair in candidates}
+    if not pairs:
+        return []
+    ids = {sid for pair in pairs for sid in pair}
+    signatures = {
+        row.submission_id: unpack(row.signature)
+        for row in SubmissionSignature.query.filter(SubmissionSignature.submission_id.in_(ids))
+    }
+    scored = []
+    for a, b in pairs:
+        if a in signatures and b in signatures:
+            score = estimate_similarity(signatures[a], signatures[b])
+            if score >= threshold:
+                scored.append((a, b, score))
+    if not scored:
+        return []
+    rows = db.session.query(Submission.id, User.name, Assignment.id, Assignment.title).join(
+        User, User.id == Submission.student_id).join(Assignment, Assignment.id == Submission.assignment_id).filter(
+        Submission.id.in_({sid for a, b, _ in scored for sid in (a, b)})).all()
+    info = {r[0]: {'submission_id': r[0], 'student_name': r[1], 'assignment_id': r[2], 'assignment_title': r[3]} for r in rows}
+    scored.sort(key=lambda item: item[2], reverse=True)
+    return [
+        {'first': info[a], 'second': info[b], 'similarity': round(score, 3)}
+        for a, b, score in scored if a in info and b in info
+    ]
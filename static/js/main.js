@@ -623,20 +623,30 @@ function renderChatMessages(messages) {
     box.scrollTop = box.scrollHeight;
 }
 
+// JSON request for the chat; rejects with the error body on 429 (rate limited) and other failures
+function chatFetch(url, options = {}) {
+    options.headers = Object.assign({'X-Requested-With': 'XMLHttpRequest'}, options.headers);
+    return fetch(url, options).then(r => r.json().catch(() => ({})).then(data => {
+        if (!r.ok) throw data;
+        return data;
+    }));
+}
+
 function loadChatUserList() {
-    fetch('/messages/users').then(r => r.json()).then(users => {
+    // A throttled poll is simply skipped; the next one catches up
+    chatFetch('/messages/users').then(users => {
         renderChatUserList(users);
-    });
+    }).catch(() => {});
 }
 
 function loadChatMessages(userId, scroll=true) {
-    fetch(`/messages/${userId}`).then(r => r.json()).then(messages => {
+    chatFetch(`/messages/${userId}`).then(messages => {
         renderChatMessages(messages);
         if (scroll) {
             const box = document.getElementById('chatMessages');
             if (box) box.scrollTop = box.scrollHeight;
         }
-    });
+    }).catch(() => {});
     // Mark as read
     fetch(`/messages/read/${userId}`, {method: 'POST'});
 }
@@ -661,11 +671,11 @@ function sendChatMessage(e) {
     }
     const content = input.value.trim();
     if (!content) return;
-    fetch('/messages/send', {
+    chatFetch('/messages/send', {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
         body: JSON.stringify({receiver_id: chatCurrentUserId, content})
-    }).then(r => r.json()).then(data => {
+    }).then(data => {
         if (data.success) {
             input.value = '';
             loadChatMessages(chatCurrentUserId);
@@ -673,6 +683,8 @@ function sendChatMessage(e) {
         } else if (data.error) {
             showToast && showToast(data.error, 'danger');
         }
+    }).catch(data => {
+        showToast && showToast((data && data.error) || 'Message not sent. Please try again.', 'danger');
     });
 }
 
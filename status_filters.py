@@ -0,0 +1,84 @@
+from sqlalchemy import select, exists, and_
+from extension import db
+from models import User, Enrollment, Assignment, Submission
+
+# Filter name -> heading shown on the status page
+STATUS_FILTERS = {
+    'late': 'Late Submissions',
+    'missing': 'Overdue With No Submission',
+    'ungraded': 'Ungraded Past Due',
+}
+
+
+def _scoped(stmt, teacher_id=None, class_id=None, assignment_id=None):
+    if teacher_id is not None:
+        stmt = stmt.where(Assignment.teacher_id == teacher_id)
+    if class_id is not None:
+        stmt = stmt.where(Assignment.class_id == class_id)
+    if assignment_id is not None:
+        stmt = stmt.where(Assignment.id == assignment_id)
+    return stmt
+
+
+def late_submissions(**scope):
+    """Submissions made after their assignment's due date."""
+    stmt = (
+        select(Submission, Assignment, User)
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .join(User, User.id == Submission.student_id)
+        .where(Submission.is_late)
+        .order_by(Assignment.due_date.desc(), User.name)
+    )
+    return _scoped(stmt, **scope)
+
+
+def overdue_missing(**scope):
+    """(student, assignment) pairs past due where the enrolled student never submitted.
+
+    Written as an anti-join (NOT EXISTS) so it never materialises submissions.
+    """
+    submitted = exists().where(and_(
+        Submission.assignment_id == Assignment.id,
+        Submission.student_id == Enrollment.student_id,
+    ))
+    stmt = (
+        select(User, Assignment)
+        .select_from(Assignment)
+        .join(Enrollment, Enrollment.class_id == Assignment.class_id)
+        .join(User, User.id == Enrollment.student_id)
+        .where(Assignment.is_overdue, ~submitted)
+        .order_by(Assignment.due_date.desc(), User.name)
+    )
+    return _scoped(stmt, **scope)
+
+
+def ungraded_past_due(**scope):
+    """Submissions still without a score on assignments whose due date has passed."""
+    stmt = (
+        select(Submission, Assignment, User)
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .join(User, User.id == Submission.student_id)
+        .where(Assignment.is_overdue, Submission.score.is_(None))
+        .order_by(Assignment.due_date, Submission.submitted_at)
+    )
+    return _scoped(stmt, **scope)
+
+
+FILTER_QUERIES = {
+    'late': late_submissions,
+    'missing': overdue_missing,
+    'ungraded': ungraded_past_due,
+}
+
+
+def status_counts(**scope):
+    """Row counts for every filter, e.g. for dashboard badges."""
+    counts = {}
+    for name, build in FILTER_QUERIES.items():
+        stmt = build(**scope).order_by(None)
+        counts[name] = db.session.execute(select(db.func.count()).select_from(stmt.subquery())).scalar()
+    return counts
+
+
+def status_rows(name, limit=500, **scope):
+    return db.session.execute(FILTER_QUERIES[name](**scope).limit(limit)).all()
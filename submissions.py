@@ -0,0 +1,116 @@
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import select, exists, literal, literal_column, func, cast, null, union_all, update
+from sqlalchemy import Boolean, DateTime, Integer, String, Text
+from extension import db, dialect_insert
+from models import Enrollment, Submission
+
+# The row a resubmission overwrote; history keeps its text and grade
+Replaced = namedtuple('Replaced', 'submission_text file_path submitted_at score feedback graded_at graded_by')
+
+_RETURNED = (Submission.id, Submission.assignment_id, Submission.student_id,
+             Submission.submission_text, Submission.file_path, Submission.submitted_at)
+_REPLACED_TYPES = (Text, String, DateTime, Integer, Text, DateTime, Integer)
+
+
+def _values(assignment, student_id, text, file_path, now):
+    # One row when the student is enrolled in the assignment's class, none otherwise
+    enrolled = exists().where(Enrollment.student_id == student_id, Enrollment.class_id == assignment.class_id)
+    return select(
+        literal(assignment.id, Integer), literal(student_id, Integer), literal(text, Text),
+        literal(file_path, String), literal(now, DateTime),
+    ).where(enrolled)
+
+
+def _upsert(source):
+    stmt = dialect_insert(Submission).from_select(
+        ['assignment_id', 'student_id', 'submission_text', 'file_path', 'submitted_at'], source
+    )
+    # A resubmission replaces the text, keeps the old file unless a new one came, and resets the grade
+    return stmt.on_conflict_do_update(index_elements=['assignment_id', 'student_id'], set_={
+        'submission_text': stmt.excluded.submission_text,
+        'file_path': func.coalesce(stmt.excluded.file_path, Submission.file_path),
+        'submitted_at': stmt.excluded.submitted_at,
+        'score': None, 'feedback': None, 'graded_at': None, 'graded_by': None,
+    })
+
+
+def _postgres_statement(assignment, student_id, text, file_path, now):
+    # UPDATE ... FROM a locked copy of the row is the one way to get pre-update values
+    # back from a single statement; concurrent submits queue on the row lock, so each
+    # sees the state the previous one committed. The INSERT runs only when nothing was
+    # updated, and its ON CONFLICT covers two first submissions racing each other.
+    old = (
+        select(Submission.id, *(getattr(Submission, name) for name in Replaced._fields))
+        .where(Submission.assignment_id == assignment.id, Submission.student_id == student_id)
+        .with_for_update().subquery('old')
+    )
+    enrolled = exists().where(Enrollment.student_id == student_id, Enrollment.class_id == assignment.class_id)
+    updated = (
+        update(Submission).where(Submission.id == old.c.id, enrolled)
+        .values(submission_text=text, file_path=func.coalesce(file_path, Submission.file_path), submitted_at=now,
+                score=None, feedback=None, graded_at=None, graded_by=None)
+        .returning(*_RETURNED, literal(False, Boolean).label('inserted'),
+                   *(old.c[name].label(f'replaced_{name}') for name in Replaced._fields))
+        .cte('updated')
+    )
+    source = _values(assignment, student_id, text, file_path, now).where(~exists(select(updated.c.id)))
+    inserted = _upsert(source).returning(
+        *_RETURNED, literal_column('xmax = 0', Boolean).label('inserted'),
+        *(cast(null(), type_).label(f'replaced_{name}') for name, type_ in zip(Replaced._fields, _REPLACED_TYPES)),
+    ).cte('inserted')
+    return union_all(select(updated), select(inserted))
+
+
+def _run_effects(effects, submission_id):
+    notified = []
+    for stmt in effects(literal(submission_id, Integer)):
+        result = db.session.execute(stmt)
+        if stmt.exported_columns:
+            notified.extend(result.scalars())
+    return notified
+
+
+def upsert_submission(assignment, student_id, text, file_path=None, effects=None):
+    """Insert or replace a student's submission in one statement.
+
+    The enrollment check is part of the statement, so an unenrolled
+    student simply writes nothing. `effects(submission_id)` returns more
+    writes that go with the submission (notification INSERT ... SELECTs,
+    which RETURN the notified user ids, and similarity DELETEs); they take
+    the written id as a SQL expression that is NULL when nothing was
+    written. On Postgres they are data-modifying CTEs of the same
+    statement; on SQLite the replaced row is read first and the effects
+    run after the upsert. Returns (submission row, Replaced or None,
+    inserted, notified user ids), or None when the student isn't
+    enrolled. The caller commits.
+    """
+    now = datetime.utcnow()
+    if db.engine.dialect.name == 'postgresql':
+        written = _postgres_statement(assignment, student_id, text, file_path, now).cte('written')
+        stmt = select(written)
+        if effects is not None:
+            writes = effects(select(written.c.id).scalar_subquery())
+            ctes = [write.cte(f'effect_{i}') for i, write in enumerate(writes)]
+            notified = [select(cte.c[0]) for write, cte in zip(writes, ctes) if write.exported_columns]
+            stmt = stmt.add_cte(*ctes)
+            if notified:
+                notified = union_all(*notified).subquery()
+                stmt = stmt.add_columns(select(func.array_agg(notified.c[0])).scalar_subquery().label('notified'))
+        row = db.session.execute(stmt).first()
+        if row is None:
+            return None
+        replaced = Replaced(*(row._mapping[f'replaced_{name}'] for name in Replaced._fields))
+        notified = row._mapping.get('notified') or []
+        return row, (None if replaced.submitted_at is None else replaced), row.inserted, notified
+
+    replaced = db.session.execute(
+        select(*(getattr(Submission, name) for name in Replaced._fields))
+        .where(Submission.assignment_id == assignment.id, Submission.student_id == student_id)
+    ).first()
+    stmt = _upsert(_values(assignment, student_id, text, file_path, now))
+    row = db.session.execute(stmt.returning(*_RETURNED)).first()
+    if row is None:
+        return None
+    notified = _run_effects(effects, row.id) if effects is not None else []
+    return row, (Replaced(*replaced) if replaced else None), replaced is None, notified
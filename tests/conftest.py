@@ -0,0 +1,96 @@
+import os
+import pytest
+from flask import g
+from werkzeug.security import generate_password_hash
+from app import create_app
+from extension import db
+
+PASSWORD = 'test-password'
+
+
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+
+@pytest.fixture
+def database_url():
+    """Database the app fixture runs on; modules covering dialect-specific SQL override it."""
+    return 'sqlite://'
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def both_databases(request):
+    """SQLite, then Postgres when TEST_POSTGRES_URL is set; for code with a path per dialect."""
+    if request.param == 'sqlite':
+        return 'sqlite://'
+    if not POSTGRES_URL:
+        pytest.skip('TEST_POSTGRES_URL is not set')
+    return POSTGRES_URL
+
+
+@pytest.fixture
+def app(tmp_path, database_url):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'WTF_CSRF_ENABLED': False,
+        'RATE_LIMIT_ENABLED': False,
+        'UPLOAD_FOLDER': str(tmp_path),
+    })
+
+    @app.before_request
+    def forget_login():
+        # Requests share the test's app context, so drop the user Flask-Login cached in g
+        g.pop('_login_user', None)
+
+    with app.app_context():
+        from bootstrap import bootstrap
+        bootstrap()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(app):
+    from models import User
+
+    def make_user(role='student', name=None, **fields):
+        count = User.query.count()
+        user = User(email=f'{role}{count}@example.com', name=name or f'{role.title()} {count}', role=role,
+                    password_hash=generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000'), **fields)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make_user
+
+
+@pytest.fixture
+def school(app, make_user):
+    """One teacher, one class with an assignment, an enrolled and an unenrolled student."""
+    from datetime import datetime, timedelta
+    from models import Course, Class, Assignment, Enrollment
+    course = Course(name='Biology')
+    db.session.add(course)
+    db.session.commit()
+    teacher = make_user('teacher')
+    student = make_user('student', course_id=course.id)
+    outsider = make_user('student', course_id=course.id)
+    klass = Class(name='Bio 101', course_id=course.id, teacher_id=teacher.id)
+    db.session.add(klass)
+    db.session.commit()
+    assignment = Assignment(title='Essay', class_id=klass.id, teacher_id=teacher.id, max_score=10,
+                            due_date=datetime.utcnow() + timedelta(days=1))
+    db.session.add_all([assignment, Enrollment(student_id=student.id, class_id=klass.id)])
+    db.session.commit()
+    return {'course': course, 'teacher': teacher, 'student': student, 'outsider': outsider,
+            'class': klass, 'assignment': assignment}
+
+
+@pytest.fixture
+def login(app):
+    """A test client logged in as `user`."""
+    def login(user):
+        client = app.test_client()
+        client.post('/auth/login', data={'email': user.email, 'password': PASSWORD})
+        return client
+    return login
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+import pytest
+from api import ApiError, _decode_cursor, _encode_cursor
+from extension import db
+from models import Notification
+
+
+def test_cursor_round_trip():
+    moment = datetime(2024, 1, 31, 9, 30, 15, 250)
+    assert _decode_cursor(_encode_cursor(moment, 42)) == (moment, 42)
+    assert _decode_cursor(_encode_cursor(None, 7)) == (None, 7)
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(ApiError) as error:
+        _decode_cursor('not-a-cursor')
+    assert error.value.status == 400
+
+
+def _notify(user, count, null_every=0):
+    start = datetime.utcnow() - timedelta(days=1)
+    rows = [Notification(user_id=user.id, message=f'n{i}', timestamp=start + timedelta(minutes=i % 3)) for i in range(count)]
+    db.session.add_all(rows)
+    db.session.commit()
+    if null_every:
+        # The column default fills in a None given to the constructor, so clear them afterwards
+        undated = [row.id for i, row in enumerate(rows) if i % null_every == 0]
+        Notification.query.filter(Notification.id.in_(undated)).update({'timestamp': None})
+        db.session.commit()
+
+
+def _walk(client, url, limit):
+    ids, cursor = [], None
+    while True:
+        page = client.get(url, query_string={'limit': limit, **({'cursor': cursor} if cursor else {})}).get_json()
+        ids += [row['id'] for row in page['data']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 5])
+def test_pages_cover_every_row_once_with_null_sort_keys(app, make_user, login, limit):
+    user = make_user('teacher')
+    _notify(user, 11, null_every=4)
+    assert Notification.query.filter(Notification.timestamp.is_(None)).count() == 3
+    client = login(user)
+    ids = _walk(client, '/api/v1/notifications', limit)
+    # Newest first, undated rows counted as newest, ties broken by id
+    rows = Notification.query.filter_by(user_id=user.id).all()
+    expected = sorted(rows, key=lambda n: (n.timestamp is None, n.timestamp or datetime.min, n.id), reverse=True)
+    assert ids == [n.id for n in expected]
+
+
+def test_ascending_pages_put_nulls_last(app, school, login):
+    import api
+    from models import Class
+    # Classes sort ascending by created_at, which is nullable
+    extra = [Class(name=f'Extra {i}', course_id=school['course'].id, teacher_id=school['teacher'].id,
+                   created_at=datetime.utcnow() + timedelta(minutes=i)) for i in range(4)]
+    db.session.add_all(extra)
+    db.session.commit()
+    Class.query.filter(Class.id.in_([c.id for c in extra[1::2]])).update({'created_at': None})
+    db.session.commit()
+    assert Class.query.filter(Class.created_at.is_(None)).count() == 2
+    client = login(school['teacher'])
+    ids = _walk(client, '/api/v1/classes', 1)
+    rows = Class.query.filter_by(teacher_id=school['teacher'].id).all()
+    expected = sorted(rows, key=lambda c: (c.created_at is None, c.created_at or datetime.min, c.id))
+    assert ids == [c.id for c in expected]
+    assert api.CLASSES.sort.nullable
+
+
+def test_unchanged_page_answers_304(app, make_user, login):
+    user = make_user('teacher')
+    _notify(user, 3)
+    client = login(user)
+    first = client.get('/api/v1/notifications')
+    assert first.status_code == 200 and first.headers['ETag']
+    again = client.get('/api/v1/notifications', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304 and not again.data
+    _notify(user, 1)
+    changed = client.get('/api/v1/notifications', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+
+
+def test_sparse_fields_and_unknown_fields(app, make_user, login):
+    user = make_user('teacher')
+    _notify(user, 2)
+    client = login(user)
+    rows = client.get('/api/v1/notifications?fields=id,message').get_json()['data']
+    assert set(rows[0]) == {'id', 'message'}
+    assert client.get('/api/v1/notifications?fields=id,nope').status_code == 400
@@ -0,0 +1,21 @@
+from app import create_app
+from extension import db
+
+
+def test_config_overrides_apply_before_engine_options(monkeypatch):
+    # A Postgres DATABASE_URL in the environment must not leak pool options into a sqlite override
+    monkeypatch.setenv('DATABASE_URL', 'postgresql://learntrack@localhost/learntrack_db')
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS'] == {}
+    with app.app_context():
+        assert db.engine.url.drivername == 'sqlite'
+
+
+def test_explicit_engine_options_are_kept():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+                      'SQLALCHEMY_ENGINE_OPTIONS': {'echo': False}})
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS'] == {'echo': False}
+
+
+def test_login_page_renders(app):
+    assert app.test_client().get('/auth/login').status_code == 200
@@ -0,0 +1,32 @@
+import pytest
+import catalog
+from extension import db
+from fragment_cache import fragment_cache
+from models import Course
+
+
+@pytest.fixture
+def cache(app):
+    fragment_cache.local.clear()
+    fragment_cache.enabled = True
+    yield fragment_cache
+    fragment_cache.enabled = False
+    fragment_cache.local.clear()
+
+
+def test_committed_course_shows_without_an_explicit_bump(cache):
+    before = catalog.course_choices()
+    db.session.add(Course(name='Chemistry'))
+    db.session.flush()
+    # Not visible to other requests before the commit, so nothing is invalidated yet
+    assert catalog.course_choices() == before
+    db.session.commit()
+    assert [name for _, name in catalog.course_choices()][-1] == 'Chemistry'
+
+
+def test_entries_without_a_shared_store_expire_in_seconds(cache, monkeypatch):
+    ttls = []
+    monkeypatch.setattr(cache.local, 'set', lambda key, value, ttl: ttls.append(ttl))
+    catalog.course_choices()
+    assert ttls == [catalog.CATALOG_LOCAL_TTL]
+    assert catalog.CATALOG_LOCAL_TTL < 60
@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, select
+import deletion
+from extension import db
+from models import (Assignment, Class, Course, DeletionJob, Enrollment, Message, Notification, ReminderFiring,
+                    ReportRollup, Submission, SubmissionBand, SubmissionSignature, SubmissionVersion, User)
+
+MODELS = (User, Course, Class, Enrollment, Assignment, Submission, SubmissionSignature, SubmissionBand,
+          SubmissionVersion, ReminderFiring, Notification, Message, ReportRollup)
+
+
+@pytest.fixture
+def foreign_keys(app):
+    # Off by default in SQLite; on here so a step run out of order fails like it would on Postgres
+    db.session.commit()
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA foreign_keys = ON')
+        assert conn.exec_driver_sql('PRAGMA foreign_keys').scalar() == 1
+
+
+def _counts():
+    return {model.__name__: db.session.execute(select(func.count()).select_from(model)).scalar() for model in MODELS}
+
+
+def _fill(school, make_user, files):
+    """Give the school's class several students with submissions and everything that hangs off them."""
+    students = [school['student']] + [make_user('student', course_id=school['course'].id) for _ in range(4)]
+    db.session.add_all(Enrollment(student_id=s.id, class_id=school['class'].id) for s in students[1:])
+    db.session.commit()
+    for i, student in enumerate(students):
+        (files / f'upload{i}.txt').write_text('essay')
+        submission = Submission(assignment_id=school['assignment'].id, student_id=student.id, submission_text='essay',
+                                file_path=f'upload{i}.txt', score=5, graded_by=school['teacher'].id)
+        db.session.add(submission)
+        db.session.flush()
+        db.session.add_all([
+            SubmissionSignature(submission_id=submission.id, assignment_id=school['assignment'].id, signature=b'x'),
+            SubmissionBand(submission_id=submission.id, assignment_id=school['assignment'].id, band=0, bucket=i),
+            SubmissionVersion(submission_id=submission.id, version=1, text_data=b'x', graded_by=school['teacher'].id),
+            Notification(user_id=student.id, message='hi'),
+            Message(sender_id=school['teacher'].id, receiver_id=student.id, content='hello'),
+        ])
+    db.session.add_all([
+        ReminderFiring(assignment_id=school['assignment'].id, offset_minutes=60),
+        ReportRollup(grain='week', period_start=datetime.utcnow().date(), dimension='teacher',
+                     dimension_id=school['teacher'].id),
+        ReportRollup(grain='week', period_start=datetime.utcnow().date(), dimension='class',
+                     dimension_id=school['class'].id),
+        ReportRollup(grain='week', period_start=datetime.utcnow().date(), dimension='course',
+                     dimension_id=school['course'].id),
+    ])
+    db.session.commit()
+    return students
+
+
+def _job(entity_type, entity_id, **fields):
+    job = DeletionJob(entity_type=entity_type, entity_id=entity_id, **fields)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_teacher_deletion_removes_their_classes_in_batches(school, make_user, foreign_keys, tmp_path):
+    students = _fill(school, make_user, tmp_path)
+    teacher_id = school['teacher'].id
+    job = deletion.run_deletion(_job('user', teacher_id), batch_size=2, pause=0)
+    assert (job.status, job.error) == ('done', None)
+    counts = _counts()
+    for name in ('Class', 'Enrollment', 'Assignment', 'Submission', 'SubmissionSignature', 'SubmissionBand',
+                 'SubmissionVersion', 'ReminderFiring', 'Message', 'ReportRollup'):
+        assert counts[name] == (1 if name == 'ReportRollup' else 0), name
+    assert db.session.get(User, teacher_id) is None
+    # Students, their course and its rollup stay
+    assert all(db.session.get(User, s.id) for s in students) and counts['Course'] == 1
+    assert job.deleted_rows == job.total_rows and job.progress() == 100
+    assert not list(tmp_path.glob('upload*.txt'))
+
+
+def test_student_deletion_keeps_the_class(school, make_user, foreign_keys, tmp_path):
+    students = _fill(school, make_user, tmp_path)
+    before = _counts()
+    job = deletion.run_deletion(_job('user', students[0].id), batch_size=1, pause=0)
+    assert job.status == 'done'
+    after = _counts()
+    for name in ('Submission', 'SubmissionSignature', 'SubmissionBand', 'SubmissionVersion', 'Enrollment',
+                 'Notification', 'Message', 'User'):
+        assert after[name] == before[name] - 1, name
+    assert after['Class'] == after['Assignment'] == 1
+    assert not (tmp_path / 'upload0.txt').exists() and (tmp_path / 'upload1.txt').exists()
+
+
+def test_grader_deletion_clears_references_instead_of_deleting(school, make_user, foreign_keys, tmp_path):
+    _fill(school, make_user, tmp_path)
+    grader = make_user('teacher')
+    db.session.execute(Submission.__table__.update().values(graded_by=grader.id))
+    db.session.execute(SubmissionVersion.__table__.update().values(graded_by=grader.id))
+    db.session.commit()
+    assert deletion.run_deletion(_job('user', grader.id), batch_size=2, pause=0).status == 'done'
+    assert Submission.query.count() == 5
+    assert Submission.query.filter(Submission.graded_by.isnot(None)).count() == 0
+    assert SubmissionVersion.query.filter(SubmissionVersion.graded_by.isnot(None)).count() == 0
+
+
+def test_course_deletion(school, make_user, foreign_keys, tmp_path):
+    students = _fill(school, make_user, tmp_path)
+    other = Course(name='History')
+    db.session.add(other)
+    db.session.commit()
+    course_id = school['course'].id
+    assert deletion.run_deletion(_job('course', course_id), batch_size=3, pause=0).status == 'done'
+    counts = _counts()
+    assert counts['Course'] == 1 and counts['Class'] == counts['Assignment'] == counts['Submission'] == 0
+    assert counts['ReportRollup'] == 1  # the teacher's
+    assert all(db.session.get(User, s.id).course_id is None for s in students)
+    assert db.session.get(User, school['teacher'].id) is not None
+
+
+def test_interrupted_job_resumes_where_it_stopped(school, make_user, foreign_keys, tmp_path, monkeypatch):
+    _fill(school, make_user, tmp_path)
+    run_step = deletion._run_step
+    calls = []
+
+    def dying(job, step, batch_size, pause):
+        calls.append(step.name)
+        if step.name == 'submissions':
+            # One batch commits, then the worker dies
+            db.session.execute(deletion.delete(Submission).where(
+                Submission.id == db.session.execute(select(func.min(Submission.id))).scalar()))
+            job.deleted_rows += 1
+            db.session.commit()
+            raise RuntimeError('worker restarted')
+        return run_step(job, step, batch_size, pause)
+    monkeypatch.setattr(deletion, '_run_step', dying)
+    teacher_id = school['teacher'].id
+    job_id = _job('user', teacher_id)
+    job = deletion.run_deletion(job_id, batch_size=2, pause=0)
+    assert (job.status, job.step, job.error) == ('failed', 'submissions', 'worker restarted')
+    assert Submission.query.count() == 4 and Class.query.count() == 1
+
+    monkeypatch.setattr(deletion, '_run_step', run_step)
+    job = deletion.run_deletion(job_id, batch_size=2, pause=0)
+    assert job.status == 'done'
+    assert Submission.query.count() == Class.query.count() == 0
+    assert db.session.get(User, teacher_id) is None
+
+
+def test_scheduler_claims_only_stale_jobs_once(school, monkeypatch):
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=deletion.DELETION_STALE_SECONDS + 1)
+    orphaned = _job('course', 999, status='running', heartbeat_at=stale)
+    never_started = _job('course', 998, status='pending')
+    _job('course', 997, status='running', heartbeat_at=now)
+    _job('course', 996, status='failed', heartbeat_at=stale)
+    _job('course', 995, status='done', heartbeat_at=stale)
+    assert sorted(deletion.claim_stale_jobs(now)) == sorted([orphaned, never_started])
+    # Claiming refreshed their heartbeats, so nobody else takes them
+    assert deletion.claim_stale_jobs(now) == []
+
+
+def test_resume_finishes_an_orphaned_job(school, make_user, foreign_keys, tmp_path):
+    _fill(school, make_user, tmp_path)
+    stale = datetime.utcnow() - timedelta(hours=1)
+    job_id = _job('user', school['teacher'].id, status='running', step='classes', heartbeat_at=stale)
+    assert deletion.resume_stale_deletions() == 1
+    assert db.session.get(DeletionJob, job_id).status == 'done'
+    assert Class.query.count() == 0
@@ -0,0 +1,79 @@
+import csv
+import io
+import zipfile
+from datetime import datetime, timedelta
+import pytest
+from exports import _cell
+from extension import db
+from models import Submission
+
+INJECTED = '=HYPERLINK("http://evil.example","x")'
+
+
+@pytest.fixture
+def graded(school):
+    school['student'].name = INJECTED
+    school['assignment'].title = '@SUM(1+1)'
+    db.session.add(Submission(assignment_id=school['assignment'].id, student_id=school['student'].id,
+                              submission_text='answer', score=7, feedback='-2 for spelling',
+                              submitted_at=school['assignment'].due_date + timedelta(hours=1), graded_at=datetime.utcnow()))
+    db.session.commit()
+    return school
+
+
+def _csv(response):
+    assert response.status_code == 200 and response.mimetype == 'text/csv'
+    return list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+
+
+def _sheet_xml(response):
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as book:
+        return ''.join(book.read(name).decode() for name in book.namelist() if name.startswith('xl/'))
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('=1+1', "'=1+1"), ('+1', "'+1"), ('-1', "'-1"), ('@A1', "'@A1"), ('\tx', "'\tx"), ('\rx', "'\rx"),
+    ('plain', 'plain'), ('', ''), (-3, -3), (None, None),
+    (datetime(2024, 1, 31, 9, 0, 5, 99), '2024-01-31 09:00:05'),
+])
+def test_cells_that_would_be_formulas_are_quoted(value, expected):
+    assert _cell(value) == expected
+
+
+def test_gradebook_csv(graded, login):
+    rows = _csv(login(graded['teacher']).get(f'/export/class/{graded["class"].id}/gradebook.csv'))
+    assert rows[0] == ['Student', 'Email', "'@SUM(1+1)", 'Total']
+    assert rows[1] == ["'" + INJECTED, graded['student'].email, '7', '7']
+
+
+def test_submissions_csv(graded, login):
+    rows = _csv(login(graded['teacher']).get(f'/export/assignment/{graded["assignment"].id}/submissions.csv'))
+    row = dict(zip(rows[0], rows[1]))
+    assert (row['Student'], row['Late'], row['Score'], row['Feedback']) == ("'" + INJECTED, 'yes', '7', "'-2 for spelling")
+
+
+def test_xlsx_writes_no_formulas(graded, login):
+    pytest.importorskip('xlsxwriter')
+    xml = _sheet_xml(login(graded['teacher']).get(f'/export/class/{graded["class"].id}/gradebook.xlsx'))
+    assert '<f>' not in xml
+    assert '<t>\'' + INJECTED + '</t>' in xml
+
+
+def test_enrollments_are_scoped_to_the_teacher(graded, login, make_user):
+    other = make_user('teacher')
+    assert len(_csv(login(graded['teacher']).get('/export/enrollments.csv'))) == 2
+    assert len(_csv(login(other).get('/export/enrollments.csv'))) == 1
+    assert len(_csv(login(make_user('admin')).get('/export/enrollments.csv'))) == 2
+
+
+def test_export_permissions(graded, login, make_user):
+    other = login(make_user('teacher'))
+    student = login(graded['student'])
+    assert other.get(f'/export/class/{graded["class"].id}/gradebook.csv').status_code == 403
+    assert other.get(f'/export/assignment/{graded["assignment"].id}/submissions.xlsx').status_code == 403
+    assert student.get('/export/enrollments.csv').status_code == 403
+    assert login(graded['teacher']).get('/export/users.csv').status_code == 403
+    assert login(graded['teacher']).get(f'/export/class/{graded["class"].id}/gradebook.pdf').status_code == 404
+    users = _csv(login(make_user('admin')).get('/export/users.csv'))
+    assert "'" + INJECTED in [row[1] for row in users]
@@ -0,0 +1,75 @@
+from extension import db
+from fragment_cache import fragment_cache, invalidate
+from models import Notification
+
+
+def _version(user):
+    return fragment_cache.version(f'user:{user.id}')
+
+
+def test_orm_writes_bump_only_after_commit(app, make_user):
+    user = make_user()
+    before = _version(user)
+    db.session.add(Notification(user_id=user.id, message='hi'))
+    db.session.flush()
+    assert _version(user) == before
+    db.session.commit()
+    assert _version(user) == before + 1
+
+
+def test_rolled_back_writes_do_not_bump(app, make_user):
+    user = make_user()
+    before = _version(user)
+    db.session.add(Notification(user_id=user.id, message='hi'))
+    db.session.flush()
+    db.session.rollback()
+    db.session.commit()
+    assert _version(user) == before
+
+
+def test_invalidate_in_a_transaction_bumps_again_on_commit(app, make_user):
+    user = make_user()
+    before = _version(user)
+    user.name = 'Renamed'
+    db.session.flush()
+    invalidate(f'user:{user.id}')
+    assert _version(user) == before + 1
+    db.session.commit()
+    # Once for the explicit call, once for the commit (the flushed User and the call share one bump)
+    assert _version(user) == before + 2
+
+
+def test_refuses_per_process_versions_with_several_workers(monkeypatch):
+    from app import create_app
+    monkeypatch.setenv('GUNICORN_WORKERS', '4')
+    create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'FRAGMENT_CACHE_ENABLED': True})
+    assert not fragment_cache.enabled
+    monkeypatch.setenv('GUNICORN_WORKERS', '1')
+    create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'FRAGMENT_CACHE_ENABLED': True})
+    assert fragment_cache.enabled
+    fragment_cache.enabled = False
+
+
+def test_shared_store_keeps_caching_on_with_several_workers(monkeypatch):
+    from app import create_app
+    from fragment_cache import RedisStore
+    monkeypatch.setenv('GUNICORN_WORKERS', '4')
+    monkeypatch.setenv('FRAGMENT_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    try:
+        create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'FRAGMENT_CACHE_ENABLED': True})
+        assert fragment_cache.enabled and isinstance(fragment_cache.shared, RedisStore)
+    finally:
+        fragment_cache.shared = None
+        fragment_cache.enabled = False
+
+
+def test_pages_render_from_cached_fragments(school, login):
+    fragment_cache.enabled = True
+    try:
+        for user, url in [(school['teacher'], '/teacher/dashboard'), (school['student'], '/student/dashboard')]:
+            client = login(user)
+            assert client.get(url).status_code == 200
+            assert client.get(url).status_code == 200
+        assert fragment_cache.local._data
+    finally:
+        fragment_cache.enabled = False
@@ -0,0 +1,112 @@
+import pytest
+from extension import db
+from grading import MAX_GRADE_BATCH, bulk_grade
+from models import Assignment, Enrollment, Notification, Submission
+
+URL = '/teacher/submissions/grade'
+
+
+@pytest.fixture
+def batch(school, make_user):
+    """Three enrolled students with ungraded submissions, plus one for another teacher's assignment."""
+    students = [school['student']] + [make_user('student') for _ in range(2)]
+    db.session.add_all(Enrollment(student_id=s.id, class_id=school['class'].id) for s in students[1:])
+    submissions = [Submission(assignment_id=school['assignment'].id, student_id=s.id, submission_text='essay')
+                   for s in students]
+    other_teacher = make_user('teacher')
+    foreign = Assignment(title='Other', class_id=school['class'].id, teacher_id=other_teacher.id, max_score=10,
+                         due_date=school['assignment'].due_date)
+    db.session.add_all(submissions + [foreign])
+    db.session.flush()
+    stranger = Submission(assignment_id=foreign.id, student_id=students[0].id, submission_text='essay')
+    db.session.add(stranger)
+    db.session.commit()
+    return {'ids': [s.id for s in submissions], 'students': [s.id for s in students], 'foreign': stranger.id,
+            'teacher': school['teacher'], 'other_teacher': other_teacher}
+
+
+def _grades():
+    db.session.expire_all()
+    return {s.id: (s.score, s.feedback) for s in Submission.query}
+
+
+def _notified():
+    return sorted(n.user_id for n in Notification.query.filter_by(type='grade'))
+
+
+def test_grades_the_batch_and_notifies_each_student_once(batch, login):
+    client = login(batch['teacher'])
+    grades = [{'submission_id': sid, 'score': score, 'feedback': 'ok'} for sid, score in zip(batch['ids'], (10, 0, 7))]
+    response = client.post(URL, json={'grades': grades})
+    assert response.status_code == 200
+    assert sorted(response.get_json()['graded']) == sorted(batch['ids'])
+    stored = _grades()
+    assert [stored[sid] for sid in batch['ids']] == [(10, 'ok'), (0, 'ok'), (7, 'ok')]
+    assert _notified() == sorted(batch['students'])
+    submission = db.session.get(Submission, batch['ids'][0])
+    assert submission.graded_by == batch['teacher'].id and submission.graded_at is not None
+
+
+def test_unchanged_grades_are_skipped(batch):
+    teacher_id = batch['teacher'].id
+    first, second, _ = batch['ids']
+    assert bulk_grade(teacher_id, [{'submission_id': first, 'score': 5, 'feedback': 'fine'}]) == ([first], {})
+    # Same score with feedback omitted keeps the feedback, so nothing changes
+    graded, errors = bulk_grade(teacher_id, [{'submission_id': first, 'score': 5},
+                                             {'submission_id': second, 'score': 6}])
+    assert (graded, errors) == ([second], {})
+    assert bulk_grade(teacher_id, [{'submission_id': first, 'score': 5, 'feedback': 'fine'}]) == ([], {})
+    assert _grades()[first] == (5, 'fine')
+    assert len(_notified()) == 2
+
+
+def test_repeated_submission_in_one_batch_notifies_once(batch):
+    sid = batch['ids'][0]
+    graded, _ = bulk_grade(batch['teacher'].id, [{'submission_id': sid, 'score': 3}, {'submission_id': sid, 'score': 4}])
+    assert graded == [sid] and _grades()[sid][0] == 4
+    assert _notified() == [batch['students'][0]]
+
+
+@pytest.mark.parametrize('score, error', [
+    (11, 'Score must be between 0 and 10.'),
+    (-1, 'Score must be between 0 and 10.'),
+])
+def test_out_of_range_scores_reject_the_whole_batch(batch, login, score, error):
+    first, bad, last = batch['ids']
+    grades = [{'submission_id': first, 'score': 8}, {'submission_id': bad, 'score': score},
+              {'submission_id': last, 'score': 9}]
+    response = login(batch['teacher']).post(URL, json={'grades': grades})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'No grades were saved.', 'errors': {str(bad): error}}
+    assert all(score is None for score, _ in _grades().values())
+    assert _notified() == []
+
+
+def test_another_teachers_submission_rejects_the_batch(batch, login):
+    grades = [{'submission_id': batch['ids'][0], 'score': 8}, {'submission_id': batch['foreign'], 'score': 8}]
+    response = login(batch['teacher']).post(URL, json={'grades': grades})
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == {str(batch['foreign']): 'Submission not found.'}
+    assert all(score is None for score, _ in _grades().values())
+    # The owner can grade it
+    assert login(batch['other_teacher']).post(URL, json={'grades': grades[1:]}).get_json()['graded'] == [batch['foreign']]
+
+
+@pytest.mark.parametrize('item', [
+    {'score': 5}, {'submission_id': 'x', 'score': 5}, {'submission_id': 1}, {'submission_id': 1, 'score': 2.5},
+    {'submission_id': 1, 'score': True}, 'not a dict',
+])
+def test_malformed_items_reject_the_batch(batch, item):
+    graded, errors = bulk_grade(batch['teacher'].id, [{'submission_id': batch['ids'][0], 'score': 5}, item])
+    assert graded == [] and errors == {'grades[1]': 'Each grade needs an integer submission_id and score.'}
+    assert _grades()[batch['ids'][0]] == (None, None)
+
+
+def test_request_validation(batch, login, school):
+    client = login(batch['teacher'])
+    assert client.post(URL, json={}).status_code == 400
+    assert client.post(URL, json={'grades': []}).status_code == 400
+    too_many = [{'submission_id': batch['ids'][0], 'score': 1}] * (MAX_GRADE_BATCH + 1)
+    assert client.post(URL, json={'grades': too_many}).status_code == 400
+    assert login(school['student']).post(URL, json={'grades': [{'submission_id': batch['ids'][0], 'score': 1}]}).status_code == 403
+    assert _grades()[batch['ids'][0]] == (None, None)
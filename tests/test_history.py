@@ -0,0 +1,59 @@
+import pytest
+import history
+from extension import db
+from models import Submission, SubmissionVersion
+from submissions import upsert_submission
+
+
+@pytest.mark.parametrize('old, new', [
+    ('', ''),
+    ('', 'first line\nsecond'),
+    ('one\ntwo\nthree\n', 'one\n2\nthree\nfour\n'),
+    ('keep\nme\n', ''),
+    ('no trailing newline', 'no trailing newline\nadded'),
+    ('a\nb\nc\nd\n', 'd\nc\nb\na\n'),
+])
+def test_delta_round_trip(old, new):
+    assert history.apply_delta(old, history.encode_delta(old, new)) == new
+
+
+def test_delta_of_a_small_edit_is_smaller_than_the_text():
+    old = ''.join(f'line {i} of a long essay\n' for i in range(500))
+    new = old.replace('line 250 of', 'line 250, edited, of')
+    assert len(history.encode_delta(old, new)) < len(new) // 20
+
+
+def _submit(school, text):
+    row, replaced, inserted, _ = upsert_submission(school['assignment'], school['student'].id, text)
+    history.record_attempt(row, replaced, inserted)
+    db.session.commit()
+    return row.id
+
+
+def test_versions_rebuild_across_snapshots(app, school, monkeypatch):
+    monkeypatch.setattr(history, 'SNAPSHOT_EVERY', 3)
+    texts = [''.join(f'paragraph {j} draft {i}\n' if j == i else f'paragraph {j}\n' for j in range(40))
+             for i in range(8)]
+    for text in texts:
+        submission_id = _submit(school, text)
+    versions = SubmissionVersion.query.filter_by(submission_id=submission_id).order_by(SubmissionVersion.version).all()
+    assert [v.version for v in versions] == list(range(1, 9))
+    # Versions 1, 4 and 7 start a run; the rest are deltas
+    assert [v.version for v in versions if v.is_snapshot] == [1, 4, 7]
+    for number, text in enumerate(texts, 1):
+        assert history.version_text(submission_id, number) == text
+    assert [v.text for v in history.load_history(submission_id)] == texts
+    assert history.version_text(submission_id, 9) is None
+
+
+def test_resubmission_keeps_the_replaced_grade(app, school):
+    submission_id = _submit(school, 'first')
+    submission = db.session.get(Submission, submission_id)
+    submission.score = 7
+    submission.feedback = 'Good start'
+    db.session.commit()
+    _submit(school, 'second')
+    first, second = history.load_history(submission_id)
+    assert (first.text, first.score, first.feedback) == ('first', 7, 'Good start')
+    assert (second.text, second.score) == ('second', None)
+    assert db.session.get(Submission, submission_id).score is None
@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from extension import db
+
+
+def test_metrics_served_to_loopback_only_without_token(app, monkeypatch):
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.1.2.3'}).status_code == 403
+
+
+def test_metrics_token_required_when_set(app, monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 's3cret')
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 403
+    response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}, environ_base={'REMOTE_ADDR': '10.1.2.3'})
+    assert response.status_code == 200
+    assert b'learntrack_http_requests_total' in response.data
+
+
+def test_failed_query_does_not_leak_timing_stack(app):
+    with db.engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text('SELECT * FROM no_such_table'))
+        assert conn.info.get('query_started') == []
+        conn.execute(text('SELECT 1'))
+        assert conn.info['query_started'] == []
@@ -0,0 +1,44 @@
+from enrollment import notify_coalesced
+from extension import db
+from models import Enrollment, Notification
+
+
+def _notify(recipient, actor):
+    notify_coalesced([recipient.id], f'User {actor} submitted.', 'students submitted.', '/essay',
+                     type='submission', actor=actor)
+    db.session.commit()
+
+
+def _digest(recipient):
+    return Notification.query.filter_by(user_id=recipient.id).one()
+
+
+def test_repeats_by_one_actor_count_once(app, make_user):
+    teacher = make_user('teacher')
+    for _ in range(3):
+        _notify(teacher, 7)
+    assert (_digest(teacher).digest_count, _digest(teacher).message) == (1, 'User 7 submitted.')
+    _notify(teacher, 8)
+    _notify(teacher, 7)
+    _notify(teacher, 9)
+    assert (_digest(teacher).digest_count, _digest(teacher).message) == (3, '3 students submitted.')
+
+
+def test_without_an_actor_every_call_counts(app, make_user):
+    teacher = make_user('teacher')
+    for _ in range(2):
+        notify_coalesced([teacher.id], 'Reminder.', 'reminders.', '/essay')
+    db.session.commit()
+    assert _digest(teacher).message == '2 reminders.'
+
+
+def test_resubmissions_count_as_one_student(app, school, make_user, login):
+    other = make_user('student', course_id=school['course'].id)
+    db.session.add(Enrollment(student_id=other.id, class_id=school['class'].id))
+    db.session.commit()
+    url = f'/student/assignment/{school["assignment"].id}/submit'
+    for student, attempts in ((school['student'], 3), (other, 1)):
+        client = login(student)
+        for i in range(attempts):
+            assert client.post(url, data={'submission_text': f'attempt {i}'}).status_code == 302
+    assert _digest(school['teacher']).message == '2 students submitted assignment "Essay".'
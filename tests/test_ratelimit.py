@@ -0,0 +1,81 @@
+import pytest
+from app import create_app
+from flask import request
+from ratelimit import LocalBackend
+
+
+def test_denied_request_consumes_no_tokens():
+    backend = LocalBackend()
+    roomy, tight = ('roomy', 0.001, 5), ('tight', 0.001, 1)
+    assert backend.take([roomy, tight]) == 0
+    # The tight bucket is empty, so the roomy one must not be charged for the denied requests
+    for _ in range(3):
+        assert backend.take([roomy, tight]) > 0
+    assert backend.take([roomy]) == 0
+    assert backend._buckets['roomy'][0] == pytest.approx(3, abs=0.01)
+
+
+def test_bucket_refills_over_time(monkeypatch):
+    import ratelimit
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: now[0])
+    backend = LocalBackend()
+    bucket = ('k', 1.0, 2)
+    assert backend.take([bucket]) == 0
+    assert backend.take([bucket]) == 0
+    assert backend.take([bucket]) == pytest.approx(1.0)
+    now[0] += 1.0
+    assert backend.take([bucket]) == 0
+
+
+@pytest.fixture
+def limited(app):
+    app.config['RATE_LIMIT_ENABLED'] = True
+    app.extensions['rate_limit'].reset()
+    return app
+
+
+def _login(client, email, addr='10.0.0.1'):
+    return client.post('/auth/login', data={'email': email, 'password': 'wrong'},
+                       environ_base={'REMOTE_ADDR': addr}).status_code
+
+
+def test_login_limit_is_per_account_not_per_ip(limited):
+    client = limited.test_client()
+    assert [_login(client, 'a@example.com') for _ in range(10)] == [200] * 10
+    assert _login(client, 'a@example.com') == 429
+    # A classmate behind the same NAT still gets in, as does the same account from elsewhere
+    assert _login(client, 'b@example.com') == 200
+    assert _login(client, 'a@example.com', '10.0.0.2') == 200
+
+
+@pytest.mark.parametrize('proxies, expected', [('0', '127.0.0.1'), ('1', '203.0.113.7')])
+def test_forwarded_for_trusted_only_behind_configured_proxies(monkeypatch, proxies, expected):
+    monkeypatch.setenv('TRUSTED_PROXIES', proxies)
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    app.add_url_rule('/_addr', 'addr', lambda: request.remote_addr)
+    response = app.test_client().get('/_addr', headers={'X-Forwarded-For': '203.0.113.7'})
+    assert response.get_data(as_text=True) == expected
+
+
+def test_login_also_limited_per_ip_across_accounts(limited):
+    client = limited.test_client()
+    statuses = [_login(client, f'user{i}@example.com') for i in range(51)]
+    assert statuses[:50] == [200] * 50 and statuses[50] == 429
+    assert _login(client, 'fresh@example.com', '10.0.0.2') == 200
+
+
+@pytest.mark.parametrize('headers, json', [
+    ({}, False),
+    ({'Sec-Fetch-Mode': 'navigate'}, False),
+    ({'Sec-Fetch-Mode': 'cors'}, True),
+    ({'X-Requested-With': 'XMLHttpRequest'}, True),
+    ({'Accept': 'application/json'}, True),
+])
+def test_throttled_fetches_get_json(limited, make_user, login, headers, json):
+    client = login(make_user('teacher'))
+    responses = [client.get('/messages/users', headers=headers) for _ in range(11)]
+    assert responses[-1].status_code == 429 and responses[-1].headers['Retry-After']
+    assert responses[-1].is_json == json
+    if json:
+        assert responses[-1].json['error']
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+import pytest
+from extension import db
+from models import Assignment, Enrollment, Notification, ReminderFiring, Submission
+from reminders import ReminderScheduler, fire_reminder, parse_offsets
+
+HOUR = timedelta(hours=1)
+
+
+@pytest.fixture
+def due(school):
+    """A fixed clock: the school's assignment falls due 30 hours after `now`."""
+    now = datetime.utcnow().replace(microsecond=0)
+    school['assignment'].due_date = now + 30 * HOUR
+    db.session.commit()
+    return {'now': now, 'assignment_id': school['assignment'].id, 'student_id': school['student'].id}
+
+
+def _scheduler():
+    return ReminderScheduler(offsets=[1440, 60], window=6 * HOUR, poll=60)
+
+
+def _firings():
+    return sorted(db.session.execute(db.select(ReminderFiring.assignment_id, ReminderFiring.offset_minutes)).tuples())
+
+
+def _reminded():
+    return sorted(db.session.execute(db.select(Notification.user_id).where(Notification.message.like('Reminder:%'))).scalars())
+
+
+def test_parse_offsets():
+    assert parse_offsets('1h, 24h,30m,1d') == [1440, 60, 30]
+
+
+def test_fires_24h_and_1h_before_the_deadline(due):
+    scheduler, now = _scheduler(), due['now']
+    assert scheduler.tick(now) == 0
+    assert scheduler.tick(now + 6 * HOUR - timedelta(seconds=1)) == 0
+    assert scheduler.tick(now + 6 * HOUR) == 1
+    assert _firings() == [(due['assignment_id'], 1440)]
+    assert scheduler.tick(now + 29 * HOUR - timedelta(seconds=1)) == 0
+    assert scheduler.tick(now + 29 * HOUR) == 1
+    assert _firings() == [(due['assignment_id'], 60), (due['assignment_id'], 1440)]
+    assert _reminded() == [due['student_id'], due['student_id']]
+    messages = db.session.execute(db.select(Notification.message).order_by(Notification.id)).scalars().all()
+    assert messages == ['Reminder: "Essay" is due in 24 hours.', 'Reminder: "Essay" is due in 1 hour.']
+    # Nothing left once the deadline passes
+    assert scheduler.tick(now + 31 * HOUR) == 0
+
+
+def test_deadline_moved_inside_the_smaller_offset_gets_only_the_nearest_reminder(due):
+    scheduler, now = _scheduler(), due['now']
+    assert scheduler.tick(now) == 0
+    # The teacher pulls the deadline in to 30 minutes away; the edit stamps updated_at
+    db.session.get(Assignment, due['assignment_id']).due_date = now + timedelta(minutes=30)
+    db.session.commit()
+    assert scheduler.tick(now + timedelta(seconds=1), woken=True) == 1
+    assert _firings() == [(due['assignment_id'], 60)]
+    assert scheduler.tick(now + HOUR) == 0
+    assert _reminded() == [due['student_id']]
+
+
+def test_restart_does_not_fire_twice(due):
+    fire_at = due['now'] + 6 * HOUR
+    assert _scheduler().tick(fire_at) == 1
+    # A fresh scheduler (say, after a crash) sees the recorded firing and skips it
+    assert _scheduler().tick(fire_at + timedelta(minutes=5)) == 0
+    assert fire_reminder(db.session.get(Assignment, due['assignment_id']), 1440, fire_at) is None
+    assert _reminded() == [due['student_id']]
+
+
+def test_submitted_and_deleted_students_are_not_reminded(school, due, make_user):
+    submitted, deleted, waiting = (make_user('student') for _ in range(3))
+    deleted.deleted_at = due['now']
+    db.session.add_all(Enrollment(student_id=s.id, class_id=school['class'].id) for s in (submitted, deleted, waiting))
+    db.session.add(Submission(assignment_id=due['assignment_id'], student_id=submitted.id, submission_text='done'))
+    db.session.commit()
+    # Neither is the unenrolled outsider
+    expected = sorted([due['student_id'], waiting.id])
+
+    assert _scheduler().tick(due['now'] + 6 * HOUR) == 1
+    assert _reminded() == expected
+    assert db.session.execute(db.select(ReminderFiring.recipients)).scalar() == 2
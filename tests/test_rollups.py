@@ -0,0 +1,67 @@
+from datetime import date, datetime, timedelta
+import rollups
+from extension import db
+from models import ReportRollup, Submission
+
+
+def _submit(school, student, submitted_at, score=None):
+    submission = Submission(assignment_id=school['assignment'].id, student_id=student.id,
+                            submission_text='answer', submitted_at=submitted_at, score=score)
+    db.session.add(submission)
+    db.session.commit()
+    return submission
+
+
+def _week(day):
+    return ReportRollup.query.filter_by(grain='week', dimension='course', period_start=rollups.week_start(day)).one()
+
+
+def test_runs_merge_consecutive_weeks():
+    monday = date(2024, 1, 1)
+    week = timedelta(weeks=1)
+    assert rollups._runs([monday, monday + week, monday + 3 * week]) == [
+        [monday, monday + 2 * week], [monday + 3 * week, monday + 4 * week]]
+
+
+def test_regrade_rebuilds_only_its_week(app, school, make_user, monkeypatch):
+    now = datetime.utcnow()
+    old = _submit(school, school['student'], now - timedelta(weeks=30))
+    _submit(school, school['outsider'], now - timedelta(weeks=20))
+    # Keep the assignment itself out of the changed set
+    school['assignment'].updated_at = now - timedelta(weeks=40)
+    db.session.commit()
+    rollups.backfill()
+    assert _week(old.submitted_at.date()).graded == 0
+
+    rebuilt = []
+    rebuild = rollups._rebuild
+    monkeypatch.setattr(rollups, '_rebuild', lambda start, end=None: rebuilt.append((start, end)) or rebuild(start, end))
+    old.score = 8
+    old.graded_at = datetime.utcnow()
+    db.session.commit()
+    rollups.refresh_rollups()
+
+    old_week = rollups.week_start(old.submitted_at.date())
+    assert rebuilt[0] == (old_week, old_week + timedelta(weeks=1))
+    # Everything else rebuilt is the lookback window, far from week 20
+    assert all(start > rollups.week_start((now - timedelta(weeks=2)).date()) for start, _ in rebuilt[1:])
+    assert _week(old.submitted_at.date()).graded == 1
+    assert _week((now - timedelta(weeks=20)).date()).submissions == 1
+
+
+def test_refresh_commits_in_batches(app, school, monkeypatch):
+    now = datetime.utcnow()
+    submission = _submit(school, school['student'], now)
+    rollups.backfill()
+    monkeypatch.setattr(rollups, 'ROLLUP_BACKFILL_WEEKS', 1)
+    weeks, commits = [], []
+    changed = rollups._changed_weeks
+    monkeypatch.setattr(rollups, '_changed_weeks', lambda mark, until: weeks.extend(changed(mark, until)) or weeks)
+    monkeypatch.setattr(db.session, 'commit', lambda commit=db.session.commit: commits.append(1) or commit())
+    submission.score = 5
+    submission.graded_at = now
+    db.session.flush()
+    rollups.refresh_rollups()
+    # One commit per changed week, plus the one that moves the high-water mark
+    assert len(commits) == len(weeks) + 1
+    assert _week(now.date()).graded == 1
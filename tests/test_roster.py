@@ -0,0 +1,61 @@
+import io
+from models import Enrollment
+
+JSON = {'Accept': 'application/json'}
+
+
+def _upload(client, class_id, data=b'', filename='roster.csv'):
+    return client.post('/teacher/enroll-roster', headers=JSON, content_type='multipart/form-data',
+                       data={'class_id': class_id, 'roster': (io.BytesIO(data), filename)})
+
+
+def test_roster_import_enrolls_students(school, login):
+    client = login(school['teacher'])
+    response = _upload(client, school['class'].id, f'email\n{school["outsider"].email}\nnobody@example.com\n'.encode())
+    assert response.status_code == 200
+    assert response.json['enrolled'] == 1
+    assert response.json['missing'] == ['nobody@example.com']
+    assert Enrollment.query.filter_by(student_id=school['outsider'].id, class_id=school['class'].id).count() == 1
+
+
+def test_roster_rejects_disallowed_extension(school, login):
+    response = _upload(login(school['teacher']), school['class'].id, b'MZ', 'roster.exe')
+    assert response.status_code == 400
+    assert 'roster' in response.json['errors']
+
+
+def test_roster_requires_a_file(school, login):
+    response = login(school['teacher']).post('/teacher/enroll-roster', headers=JSON, data={'class_id': school['class'].id})
+    assert response.status_code == 400
+    assert 'roster' in response.json['errors']
+
+
+def test_roster_rejects_another_teachers_class(school, login, make_user):
+    response = _upload(login(make_user('teacher')), school['class'].id, b'a@example.com\n')
+    assert response.status_code == 400
+    assert 'class_id' in response.json['errors']
+
+
+def test_roster_requires_csrf_token(app, school, login):
+    client = login(school['teacher'])
+    app.config['WTF_CSRF_ENABLED'] = True
+    response = _upload(client, school['class'].id, b'a@example.com\n')
+    assert response.status_code == 400
+    assert 'csrf_token' in response.json['errors']
+
+
+def test_students_page_renders_roster_form(school, login):
+    response = login(school['teacher']).get('/teacher/students')
+    assert response.status_code == 200
+    assert b'Import Roster' in response.data
+
+
+def test_roster_handles_bom_crlf_and_large_files(school, login, make_user):
+    students = [make_user('student') for _ in range(2)]
+    # Past Werkzeug's in-memory limit, so the upload is spooled to a temporary file
+    padding = ''.join(f'"Row {i}","nobody{i}@example.com"\r\n' for i in range(20000))
+    body = '﻿name,email\r\n' + ''.join(f'"{s.name}",{s.email}\r\n' for s in students) + padding
+    response = _upload(login(school['teacher']), school['class'].id, body.encode('utf-8'))
+    assert response.status_code == 200
+    assert response.json['enrolled'] == 2
+    assert len(response.json['missing']) == 20000
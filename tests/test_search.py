@@ -0,0 +1,83 @@
+import pytest
+from extension import db
+from models import Assignment, Enrollment, Message, Submission
+from search import MARK_END, MARK_START, highlight, search
+
+
+@pytest.fixture
+def database_url(both_databases):
+    # tsvector columns on Postgres, FTS5 tables and triggers on SQLite
+    return both_databases
+
+
+@pytest.fixture
+def corpus(school, make_user):
+    other = make_user('student', course_id=school['course'].id)
+    db.session.add(Enrollment(student_id=other.id, class_id=school['class'].id))
+    titled = Assignment(title='Photosynthesis lab', description='Measure oxygen output.', class_id=school['class'].id,
+                        teacher_id=school['teacher'].id, max_score=10, due_date=school['assignment'].due_date)
+    described = Assignment(title='Plant cells', description='Relate structure to photosynthesis rates.',
+                           class_id=school['class'].id, teacher_id=school['teacher'].id, max_score=10,
+                           due_date=school['assignment'].due_date)
+    db.session.add_all([titled, described])
+    db.session.commit()
+    mine = Submission(assignment_id=titled.id, student_id=school['student'].id, submission_text='Chlorophyll absorbs light.')
+    theirs = Submission(assignment_id=titled.id, student_id=other.id, submission_text='Chlorophyll is green.')
+    db.session.add_all([mine, theirs, Message(sender_id=school['teacher'].id, receiver_id=other.id,
+                                              content='Your chlorophyll answer is good.')])
+    db.session.commit()
+    return dict(school, other=other, titled=titled, described=described, mine=mine, theirs=theirs)
+
+
+def _ids(results, kind):
+    return [row['id'] for row in results[kind]]
+
+
+def test_title_matches_rank_above_description_matches(corpus):
+    results = search(corpus['teacher'], 'photosynthesis')
+    assert _ids(results, 'assignment') == [corpus['titled'].id, corpus['described'].id]
+    assert '<mark>' in results['assignment'][1]['snippet']
+
+
+def test_students_see_only_their_own_submissions(corpus):
+    assert _ids(search(corpus['student'], 'chlorophyll'), 'submission') == [corpus['mine'].id]
+    assert _ids(search(corpus['other'], 'chlorophyll'), 'submission') == [corpus['theirs'].id]
+    assert sorted(_ids(search(corpus['teacher'], 'chlorophyll'), 'submission')) == \
+        sorted([corpus['mine'].id, corpus['theirs'].id])
+    # Messages are visible to their two participants only
+    assert search(corpus['student'], 'chlorophyll')['message'] == []
+    assert len(search(corpus['other'], 'chlorophyll')['message']) == 1
+
+
+def test_other_teachers_and_unenrolled_students_see_nothing(corpus, make_user):
+    stranger = make_user('teacher')
+    assert _ids(search(stranger, 'photosynthesis'), 'assignment') == []
+    assert _ids(search(stranger, 'chlorophyll'), 'submission') == []
+    assert _ids(search(corpus['outsider'], 'photosynthesis'), 'assignment') == []
+
+
+def test_index_follows_updates_and_deletes(corpus):
+    corpus['mine'].submission_text = 'Stomata regulate gas exchange.'
+    db.session.commit()
+    assert _ids(search(corpus['student'], 'chlorophyll'), 'submission') == []
+    assert _ids(search(corpus['student'], 'stomata'), 'submission') == [corpus['mine'].id]
+    db.session.delete(corpus['mine'])
+    db.session.commit()
+    assert _ids(search(corpus['student'], 'stomata'), 'submission') == []
+
+
+def test_operator_characters_are_searched_as_text(corpus):
+    for query in ('chloro', '"chlorophyll', 'chlorophyll OR', 'NEAR(', '-light*'):
+        search(corpus['teacher'], query)
+    assert search(corpus['teacher'], '   ') == {'assignment': [], 'submission': [], 'message': []}
+
+
+def test_snippets_are_escaped_before_highlighting():
+    assert highlight(f'<b>{MARK_START}oxygen{MARK_END}</b>') == '&lt;b&gt;<mark>oxygen</mark>&lt;/b&gt;'
+
+
+def test_search_route_renders_results(corpus, login):
+    page = login(corpus['teacher']).get('/search?q=oxygen').get_data(as_text=True)
+    assert '<mark>oxygen</mark>' in page
+    data = login(corpus['student']).get('/search?q=chlorophyll', headers={'Accept': 'application/json'}).get_json()
+    assert [row['id'] for row in data['submission']] == [corpus['mine'].id]
@@ -0,0 +1,71 @@
+import zipfile
+from extension import db
+from models import Enrollment, Submission, SubmissionSignature
+from similarity import extract_file_text, index_pending, similar_pairs, MAX_INDEX_CHARS
+
+ESSAY = ' '.join(f'word{i % 97} filler{i % 13}' for i in range(400))
+
+
+def _enrolled_students(school, make_user, count):
+    students = [make_user('student', course_id=school['course'].id) for _ in range(count)]
+    db.session.add_all(Enrollment(student_id=s.id, class_id=school['class'].id) for s in students)
+    db.session.commit()
+    return students
+
+
+def test_backfill_indexes_existing_submissions(school, make_user):
+    a, b, c = _enrolled_students(school, make_user, 3)
+    aid = school['assignment'].id
+    db.session.add_all([
+        Submission(assignment_id=aid, student_id=a.id, submission_text=ESSAY),
+        Submission(assignment_id=aid, student_id=b.id, submission_text=ESSAY + ' one changed ending'),
+        Submission(assignment_id=aid, student_id=c.id, submission_text='!!!'),  # nothing to shingle
+    ])
+    db.session.commit()
+    assert index_pending() == 3
+    assert index_pending() == 0
+    pairs = similar_pairs(school['assignment'])
+    assert [{p['first']['student_name'], p['second']['student_name']} for p in pairs] == [{a.name, b.name}]
+
+
+def test_submit_leaves_indexing_to_the_background(school, login):
+    client = login(school['student'])
+    response = client.post(f'/student/assignment/{school["assignment"].id}/submit', data={'submission_text': ESSAY})
+    assert response.status_code == 302
+    submission = Submission.query.filter_by(student_id=school['student'].id).one()
+    assert db.session.get(SubmissionSignature, submission.id) is None
+    assert index_pending() == 1
+    # A resubmission drops the stale signature so it is rebuilt from the new text
+    client.post(f'/student/assignment/{school["assignment"].id}/submit', data={'submission_text': 'new text here'})
+    db.session.expire_all()
+    assert db.session.get(SubmissionSignature, submission.id) is None
+
+
+def test_docx_text_is_capped(app, tmp_path):
+    paragraph = '<w:p><w:r><w:t>' + 'x' * 1000 + '</w:t></w:r></w:p>'
+    ns = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+    with zipfile.ZipFile(tmp_path / 'big.docx', 'w') as docx:
+        docx.writestr('word/document.xml', f'<w:document xmlns:w="{ns}"><w:body>{paragraph * 500}</w:body></w:document>')
+    assert len(extract_file_text('big.docx')) == MAX_INDEX_CHARS
+    assert len(extract_file_text('big.docx', limit=2500)) == 2500
+
+
+def test_a_conflict_skips_only_the_conflicting_submission(school, make_user, monkeypatch):
+    import similarity
+    a, b = _enrolled_students(school, make_user, 2)
+    first = Submission(assignment_id=school['assignment'].id, student_id=a.id, submission_text=ESSAY)
+    second = Submission(assignment_id=school['assignment'].id, student_id=b.id, submission_text=ESSAY)
+    db.session.add_all([first, second])
+    db.session.commit()
+    index = similarity.index_submission
+
+    def racing(submission):
+        signature = index(submission)
+        if submission.id == second.id:
+            # Stands in for another indexer's row for the same submission
+            db.session.execute(db.insert(SubmissionSignature), [{
+                'submission_id': second.id, 'assignment_id': second.assignment_id, 'signature': b''}])
+        return signature
+    monkeypatch.setattr(similarity, 'index_submission', racing)
+    assert similarity.index_submissions([first.id, second.id]) == 1
+    assert db.session.get(SubmissionSignature, first.id) is not None
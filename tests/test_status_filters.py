@@ -0,0 +1,48 @@
+from datetime import timedelta
+import pytest
+from sqlalchemy import select
+from exports import submissions_export
+from extension import db
+from models import Submission
+from status_filters import late_submissions
+
+
+@pytest.fixture
+def database_url(both_databases):
+    return both_databases
+
+
+@pytest.fixture
+def submissions(school, make_user):
+    due = school['assignment'].due_date
+    rows = {}
+    for label, submitted_at in [('early', due - timedelta(hours=1)), ('on time', due),
+                                ('late', due + timedelta(seconds=1)), ('unsubmitted', due)]:
+        student = make_user('student', label)
+        rows[label] = Submission(assignment_id=school['assignment'].id, student_id=student.id, submitted_at=submitted_at)
+        db.session.add(rows[label])
+    db.session.commit()
+    # The column default fills an explicit None, so clear it afterwards
+    rows['unsubmitted'].submitted_at = None
+    db.session.commit()
+    return rows
+
+
+def test_late_means_the_same_in_python_and_sql(submissions):
+    in_python = {label for label, row in submissions.items() if row.is_late}
+    in_sql = set(db.session.execute(select(Submission.id).where(Submission.is_late)).scalars())
+    assert in_python == {'late'}
+    assert in_sql == {submissions['late'].id}
+    assert db.session.execute(select(Submission.is_late).where(Submission.id == submissions['unsubmitted'].id)).scalar() is False
+
+
+def test_status_page_api_and_export_agree(school, submissions, login):
+    late_ids = {submission.id for submission, _, _ in db.session.execute(late_submissions(teacher_id=school['teacher'].id))}
+    assert late_ids == {submissions['late'].id}
+
+    items = login(school['teacher']).get('/api/v1/submissions?fields=id,is_late&limit=50').get_json()['data']
+    assert {item['id'] for item in items if item['is_late']} == late_ids
+    assert all(item['is_late'] is False for item in items if item['id'] not in late_ids)
+
+    _, rows = submissions_export(school['assignment'])
+    assert {row[0]: row[3] for row in rows} == {'early': 'no', 'on time': 'no', 'late': 'yes', 'unsubmitted': 'no'}
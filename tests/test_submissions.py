@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import event
+from extension import db
+from models import Notification, Submission, SubmissionSignature, User
+from submissions import upsert_submission
+
+
+@pytest.fixture
+def database_url(both_databases):
+    # The Postgres statement is a different code path, so run every test on both
+    return both_databases
+
+
+def test_uses_the_dialects_statement(app, database_url):
+    assert db.engine.dialect.name == ('postgresql' if database_url.startswith('postgresql') else 'sqlite')
+
+
+def test_first_submission_inserts(app, school):
+    row, replaced, inserted, _ = upsert_submission(school['assignment'], school['student'].id, 'first', 'a.txt')
+    db.session.commit()
+    assert inserted is True and replaced is None
+    stored = db.session.get(Submission, row.id)
+    assert (stored.student_id, stored.submission_text, stored.file_path) == (school['student'].id, 'first', 'a.txt')
+    assert row.submitted_at == stored.submitted_at
+
+
+def test_resubmission_replaces_and_returns_the_old_row(app, school):
+    first, _, _, _ = upsert_submission(school['assignment'], school['student'].id, 'first', 'a.txt')
+    db.session.commit()
+    stored = db.session.get(Submission, first.id)
+    stored.score, stored.feedback, stored.graded_by = 9, 'Nice', school['teacher'].id
+    db.session.commit()
+
+    row, replaced, inserted, _ = upsert_submission(school['assignment'], school['student'].id, 'second')
+    db.session.commit()
+    assert inserted is False and row.id == first.id
+    assert (replaced.submission_text, replaced.file_path, replaced.score, replaced.feedback, replaced.graded_by) == \
+        ('first', 'a.txt', 9, 'Nice', school['teacher'].id)
+    assert replaced.submitted_at == first.submitted_at
+    db.session.expire_all()
+    stored = db.session.get(Submission, first.id)
+    # New text, the old file kept since none came with it, and the grade reset
+    assert (stored.submission_text, stored.file_path, stored.score, stored.feedback, stored.graded_by) == \
+        ('second', 'a.txt', None, None, None)
+    assert Submission.query.count() == 1
+
+
+def test_unenrolled_student_writes_nothing(app, school):
+    assert upsert_submission(school['assignment'], school['outsider'].id, 'sneaky') is None
+    db.session.commit()
+    assert Submission.query.count() == 0
+
+
+def test_submit_route_writes_notifications_and_unindexes_with_the_upsert(app, school, make_user, login, database_url):
+    admin = make_user('admin')
+    client = login(school['student'])
+    url = f'/student/assignment/{school["assignment"].id}/submit'
+    assert client.post(url, data={'submission_text': 'first'}).status_code == 302
+    submission_id = Submission.query.one().id
+    db.session.add(SubmissionSignature(submission_id=submission_id, assignment_id=school['assignment'].id, signature=b''))
+    db.session.commit()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert client.post(url, data={'submission_text': 'second'}).status_code == 302
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    assert db.session.get(SubmissionSignature, submission_id) is None
+    admins = {user.id for user in User.query.filter_by(role='admin')}
+    message = f'{school["student"].name} submitted assignment "Essay".'
+    assert admin.id in admins
+    assert {n.user_id: n.message for n in Notification.query} == dict.fromkeys(admins | {school['teacher'].id}, message)
+    writes = [s for s in statements if 'INSERT INTO notification' in s or 'DELETE FROM submission_signature' in s]
+    if database_url.startswith('postgresql'):
+        # The upsert, both notification fan-outs and the signature drop are one statement
+        assert len(writes) == 1 and 'INSERT INTO submission ' in writes[0]
+    else:
+        assert len(writes) == 3
+    # No separate lookup of the admins
+    assert not any(s.lstrip().startswith('SELECT') and '.role = ' in s for s in statements)
+
+
+def test_unenrolled_submit_notifies_nobody(app, school, make_user, login):
+    make_user('admin')
+    response = login(school['outsider']).post(f'/student/assignment/{school["assignment"].id}/submit',
+                                              data={'submission_text': 'sneaky'})
+    assert response.status_code == 302
+    assert Submission.query.count() == Notification.query.count() == 0
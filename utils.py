@@ -1,5 +1,6 @@
 import os
 import uuid
+from datetime import datetime, timezone
 from werkzeug.utils import secure_filename
 from flask import current_app
 
@@ -34,3 +35,44 @@ def format_date(dt):
     return format_datetime(dt)
 
 
+
+def parse_iso_datetime(value):
+    """Parse an ISO 8601 string (as sent by FullCalendar) into naive UTC, or None."""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+class LazyList:
+    """List-like wrapper that runs its loader on first use.
+
+    Lets context processors offer query results that cached template
+    fragments may never touch.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._items = None
+
+    def _load(self):
+        if self._items is None:
+            self._items = list(self._loader())
+        return self._items
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
+
+    def __getitem__(self, index):
+        return self._load()[index]